@@ -1,29 +1,43 @@
+import click
 from flask import Flask
+from jinja2 import FileSystemBytecodeCache
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_mail import Mail
-from flask_migrate import Migrate
-from flask_bcrypt import Bcrypt
 from config import config
+from app.utils.database import RoutingSession
+from app.utils.hashing import PasswordHasher
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 mail = Mail()
-migrate = Migrate()
-bcrypt = Bcrypt()
+hasher = PasswordHasher()
 
 def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     config[config_name].init_app(app)
 
+    # Keep compiled templates on disk so worker boots skip recompiling them
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(
+        app.config['TEMPLATE_BYTECODE_CACHE_DIR']))
+
+    from app.utils.database import engine_options, replicas, statement_timeouts
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+
     # Initialize extensions with app
     db.init_app(app)
+    statement_timeouts.init_app(app)
+    replicas.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
-    migrate.init_app(app, db)
-    bcrypt.init_app(app)
+    if click.get_current_context(silent=True) is not None:
+        # Flask-Migrate pulls in Alembic, a large share of the import time;
+        # only the CLI (`flask db ...`, `flask deploy`) needs it
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    hasher.init_app(app)
 
     # Configure login settings
     login_manager.login_view = 'auth.login'
@@ -54,4 +68,34 @@ def create_app(config_name='default'):
     from app.analytics import analytics as analytics_blueprint
     app.register_blueprint(analytics_blueprint, url_prefix='/analytics')
 
+    from app.uploads import uploads as uploads_blueprint
+    app.register_blueprint(uploads_blueprint, url_prefix='/uploads')
+
+    from app.schedule import schedule as schedule_blueprint
+    app.register_blueprint(schedule_blueprint, url_prefix='/schedule')
+
+    from app.utils.mail_queue import mail_queue
+    mail_queue.init_app(app)
+
+    from app.schedule.reminders import reminder_scheduler
+    reminder_scheduler.init_app(app)
+
+    from app.utils.images import image_pipeline
+    image_pipeline.init_app(app)
+
+    from app.broadcast.buffer import write_buffer
+    write_buffer.init_app(app)
+
+    from app.analytics.cube import stat_cube
+    stat_cube.init_app(app)
+
+    from app.utils.profiling import query_profiler
+    query_profiler.init_app(app)
+
+    from app.utils.metrics import metrics
+    metrics.init_app(app)
+
+    from app.utils import cache
+    cache.init_app(app)
+
     return app
@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+analytics = Blueprint('analytics', __name__)
+
+from . import routes
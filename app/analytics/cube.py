@@ -0,0 +1,227 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import and_, select
+from app import db
+from app.utils.lazy import LazyModule
+from .engine import derive_metrics
+from .models import STAT_COLUMNS, StatLine, GameResult
+
+np = LazyModule('numpy')  # imported by the first stats query, not at boot
+
+# Dimensions a query can filter and group on
+DIMENSIONS = ('user_id', 'team_id', 'season')
+
+# Games finalized this close to the last refresh are loaded again, in case
+# another server's clock is behind; reloading a game is harmless
+CLOCK_SLACK = timedelta(seconds=5)
+
+# Rows fetched and encoded at a time while loading
+LOAD_PARTITION = 100000
+
+class Dictionary:
+    """Maps the distinct values of a dimension to dense integer codes."""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, values):
+        """Codes for ``values``, adding unseen ones."""
+        if not len(values):
+            return np.empty(0, dtype=np.int32)
+        # Only the distinct values go through the Python dict
+        uniques, inverse = np.unique(np.asarray(values), return_inverse=True)
+        codes = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques.tolist()):
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.values)
+                self.values.append(value)
+            codes[i] = code
+        return codes[inverse]
+
+    def lookup(self, values):
+        """Codes of the ``values`` that occur; unknown values are left out."""
+        return np.array([self.codes[v] for v in values if v in self.codes], dtype=np.int32)
+
+class Snapshot:
+    """Immutable column arrays; a refresh builds a new one and swaps it in.
+
+    The dictionaries keep growing while later refreshes encode new values,
+    so their sizes are captured here: the group keys of a query are built
+    from the sizes its codes were encoded with.
+    """
+
+    def __init__(self, columns, dictionaries):
+        self.columns = columns
+        self.size = len(columns['game_id'])
+        self.dictionaries = dictionaries
+        self.sizes = {dimension: len(dictionary) for dimension, dictionary in dictionaries.items()}
+
+class StatCube:
+    """In-memory columnar copy of finalized stat lines for ad hoc comparisons.
+
+    Every stat is a NumPy array and the player, team and season keys are
+    dictionary-encoded to dense integer codes, so filters are ``np.isin``
+    masks and group-bys are a ``np.unique`` plus one ``np.bincount`` per
+    stat. The cube loads lazily on first use and, at most every
+    ``ANALYTICS_CUBE_REFRESH`` seconds, reloads only the games finalized
+    (or corrected) since the last refresh.
+    """
+
+    def __init__(self, app=None):
+        self.refresh_interval = 30
+        self.dictionaries = {dimension: Dictionary() for dimension in DIMENSIONS}
+        self._snapshot = None
+        self._loaded_until = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.refresh_interval = app.config['ANALYTICS_CUBE_REFRESH']
+        app.extensions['stat_cube'] = self
+
+    def reset(self):
+        with self._lock:
+            self.dictionaries = {dimension: Dictionary() for dimension in DIMENSIONS}
+            self._snapshot = None
+            self._loaded_until = None
+            self._checked_at = 0.0
+
+    def snapshot(self):
+        """The current column arrays, refreshing first if they may be stale."""
+        if time.monotonic() - self._checked_at >= self.refresh_interval:
+            self.refresh()
+        return self._snapshot
+
+    def refresh(self):
+        """Load games finalized since the last refresh; returns the rows loaded."""
+        with self._lock:
+            started = datetime.utcnow()
+            changed = None
+            if self._loaded_until is not None:
+                changed = db.session.execute(
+                    select(GameResult.game_id, GameResult.team_id)
+                    .where(GameResult.finalized_at >= self._loaded_until)).all()
+
+            finalized = and_(StatLine.game_id == GameResult.game_id,
+                             StatLine.team_id == GameResult.team_id)
+            query = select(StatLine.game_id, StatLine.team_id, StatLine.user_id,
+                           StatLine.season, *[getattr(StatLine, c) for c in STAT_COLUMNS]) \
+                .join(GameResult, finalized)
+            if changed is not None:
+                if not changed:
+                    self._checked_at = time.monotonic()
+                    return 0
+                query = query.where(GameResult.finalized_at >= self._loaded_until)
+            # Plain Core rows in partitions: no ORM row processing and no
+            # list of a million tuples held at once
+            result = db.session.connection().execution_options(stream_results=True) \
+                .execute(query)
+            parts = [self._encode(rows) for rows in result.partitions(LOAD_PARTITION)]
+            columns = {name: np.concatenate([part[name] for part in parts])
+                       for name in self._encode([])}
+            loaded = len(columns['game_id'])
+            snapshot = self._snapshot
+            if snapshot is not None and changed:
+                # Corrected games replace the rows loaded for them earlier
+                keep = ~np.isin(_game_keys(snapshot.columns['game_id'],
+                                           snapshot.columns['raw_team_id']),
+                                _game_keys(*np.array(changed, dtype=np.int64).T))
+                columns = {name: np.concatenate([array[keep], columns[name]])
+                           for name, array in snapshot.columns.items()}
+            self._snapshot = Snapshot(columns, self.dictionaries)
+            self._loaded_until = started - CLOCK_SLACK
+            self._checked_at = time.monotonic()
+            return loaded
+
+    def _encode(self, rows):
+        n = len(rows)
+        fields = list(zip(*rows)) if rows else [()] * (4 + len(STAT_COLUMNS))
+        columns = {
+            'game_id': np.array(fields[0], dtype=np.int64).reshape(n),
+            'team_id': self.dictionaries['team_id'].encode(fields[1]),
+            'user_id': self.dictionaries['user_id'].encode(fields[2]),
+            'season': self.dictionaries['season'].encode(fields[3]),
+        }
+        # team_id is kept raw as well, to match corrected games
+        columns['raw_team_id'] = np.array(fields[1], dtype=np.int64).reshape(n)
+        for i, column in enumerate(STAT_COLUMNS):
+            columns[column] = np.array(fields[4 + i], dtype=np.int16).reshape(n)
+        return columns
+
+    def mask(self, snapshot, **filters):
+        """Boolean row mask for ``dimension=value`` or ``dimension=[values]`` filters."""
+        mask = np.ones(snapshot.size, dtype=bool)
+        for dimension, values in filters.items():
+            if values is None:
+                continue
+            if dimension not in DIMENSIONS:
+                raise ValueError(f'Unknown dimension {dimension!r}')
+            if isinstance(values, (str, int)):
+                values = [values]
+            codes = snapshot.dictionaries[dimension].lookup(values)
+            mask &= np.isin(snapshot.columns[dimension], codes)
+        return mask
+
+    def group_by(self, dimensions, min_sets=0, **filters):
+        """Summed stats and derived metrics per combination of ``dimensions``.
+
+        Returns a list of dicts, one per group, in key order.
+        """
+        snapshot = self.snapshot()
+        if snapshot is None or snapshot.size == 0:
+            return []
+        for dimension in dimensions:
+            if dimension not in DIMENSIONS:
+                raise ValueError(f'Unknown dimension {dimension!r}')
+        rows = self.mask(snapshot, **filters)
+        columns = snapshot.columns
+
+        # Combine the group codes into a single integer key per row
+        key = np.zeros(int(rows.sum()), dtype=np.int64)
+        for dimension in dimensions:
+            key = key * snapshot.sizes[dimension] + columns[dimension][rows]
+        groups, inverse = np.unique(key, return_inverse=True)
+        totals = {column: np.bincount(inverse, weights=columns[column][rows],
+                                      minlength=len(groups)).astype(np.int64)
+                  for column in STAT_COLUMNS}
+        games = np.bincount(inverse, minlength=len(groups))
+        derived = derive_metrics(totals)
+
+        keep = totals['sets_played'] >= min_sets
+        decoded = {}
+        remainder = groups
+        for dimension in reversed(dimensions):
+            size = snapshot.sizes[dimension]
+            decoded[dimension] = remainder % size
+            remainder = remainder // size
+
+        # Build the rows from whole columns; indexing arrays per cell is slow
+        names = list(dimensions) + ['games'] + list(STAT_COLUMNS) + list(derived)
+        values = [[snapshot.dictionaries[d].values[code] for code in decoded[d][keep].tolist()]
+                  for d in dimensions]
+        values.append(games[keep].tolist())
+        values.extend(totals[column][keep].tolist() for column in STAT_COLUMNS)
+        values.extend(array[keep].tolist() for array in derived.values())
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    def percentiles(self, metric, dimensions=('user_id',), q=(25, 50, 75, 90), min_sets=0,
+                    **filters):
+        """Percentiles of ``metric`` across the groups of ``dimensions``."""
+        groups = self.group_by(dimensions, min_sets=min_sets, **filters)
+        if not groups:
+            return {}
+        values = np.array([group[metric] for group in groups], dtype=np.float64)
+        return dict(zip(q, np.percentile(values, q).round(3).tolist()))
+
+def _game_keys(game_ids, team_ids):
+    return np.asarray(game_ids, dtype=np.int64) << 32 | np.asarray(team_ids, dtype=np.int64)
+
+stat_cube = StatCube()
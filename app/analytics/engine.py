@@ -0,0 +1,190 @@
+from datetime import datetime
+from sqlalchemy import delete, func, insert, case, and_, select
+from app import db
+from app.auth.models import TeamMember
+from app.utils.lazy import LazyModule
+from .models import (STAT_COLUMNS, StatLine, GameResult, PlayerSeasonStats,
+                     TeamSeasonStats)
+
+np = LazyModule('numpy')  # imported by the first stats query, not at boot
+
+def derive_metrics(totals):
+    """Compute derived metrics for arrays of summed stats, one element per rollup row.
+
+    ``totals`` maps every name in ``STAT_COLUMNS`` to an array. Rates are 0
+    where their denominator is 0.
+    """
+    sets = totals['sets_played'].astype(np.float64)
+    attempts = totals['attack_attempts'].astype(np.float64)
+    blocks = totals['block_solos'] + 0.5 * totals['block_assists']
+
+    def per_set(values):
+        return np.divide(values, sets, out=np.zeros_like(sets), where=sets > 0)
+
+    return {
+        'hitting_pct': np.divide(totals['kills'] - totals['attack_errors'], attempts,
+                                 out=np.zeros_like(attempts), where=attempts > 0).round(3),
+        'kills_per_set': per_set(totals['kills']).round(2),
+        'assists_per_set': per_set(totals['assists']).round(2),
+        'aces_per_set': per_set(totals['service_aces']).round(2),
+        'digs_per_set': per_set(totals['digs']).round(2),
+        'blocks_per_set': per_set(blocks).round(2),
+        'points': totals['kills'] + totals['service_aces'] + blocks,
+    }
+
+def _matrix(rows):
+    return np.array([[getattr(row, column) for column in STAT_COLUMNS] for row in rows],
+                    dtype=np.int64).reshape(len(rows), len(STAT_COLUMNS))
+
+def _apply(rollups, matrix):
+    """Store the summed stats in ``matrix`` and their derived metrics on ``rollups``."""
+    totals = {column: matrix[:, i] for i, column in enumerate(STAT_COLUMNS)}
+    derived = derive_metrics(totals)
+    for i, rollup in enumerate(rollups):
+        for column in STAT_COLUMNS:
+            setattr(rollup, column, int(totals[column][i]))
+        for column, values in derived.items():
+            setattr(rollup, column, float(values[i]))
+
+def finalize_game(game_id, team_id, sets_won, sets_lost):
+    """Count a game's stat lines in the rollups.
+
+    The first finalization adds the game to the affected player and team
+    rows in place. Finalizing again (a corrected box score) rebuilds the
+    team's season from the stat lines instead.
+    """
+    lines = StatLine.query.filter_by(game_id=game_id, team_id=team_id).all()
+    if not lines:
+        raise ValueError(f'Game {game_id} has no stat lines for team {team_id}')
+    season = lines[0].season
+
+    result = db.session.get(GameResult, (game_id, team_id))
+    if result is not None:
+        result.sets_won, result.sets_lost = sets_won, sets_lost
+        result.finalized_at = datetime.utcnow()
+        db.session.flush()
+        rebuild(season=season, team_id=team_id)
+        return
+
+    db.session.add(GameResult(game_id=game_id, team_id=team_id, season=season,
+                              sets_won=sets_won, sets_lost=sets_lost))
+    game = _matrix(lines)
+
+    existing = {row.user_id: row for row in PlayerSeasonStats.query.filter(
+        PlayerSeasonStats.team_id == team_id, PlayerSeasonStats.season == season,
+        PlayerSeasonStats.user_id.in_([line.user_id for line in lines]))}
+    players = []
+    for line in lines:
+        player = existing.get(line.user_id)
+        if player is None:
+            player = PlayerSeasonStats(user_id=line.user_id, team_id=team_id, season=season,
+                                       games=0, **dict.fromkeys(STAT_COLUMNS, 0))
+            db.session.add(player)
+        player.games += 1
+        players.append(player)
+    _apply(players, _matrix(players) + game)
+
+    team = db.session.get(TeamSeasonStats, (team_id, season))
+    if team is None:
+        team = TeamSeasonStats(team_id=team_id, season=season, games=0, wins=0, losses=0,
+                               sets_won=0, sets_lost=0, **dict.fromkeys(STAT_COLUMNS, 0))
+        db.session.add(team)
+    team.games += 1
+    team.wins += int(sets_won > sets_lost)
+    team.losses += int(sets_won < sets_lost)
+    team.sets_won += sets_won
+    team.sets_lost += sets_lost
+    # A team's sets played are the sets of the match, not the sum over players
+    team_game = game.sum(axis=0)
+    team_game[STAT_COLUMNS.index('sets_played')] = sets_won + sets_lost
+    _apply([team], _matrix([team]) + team_game)
+    db.session.commit()
+
+def rebuild(season=None, team_id=None, commit=True):
+    """Recompute rollups from finalized stat lines, optionally for one season/team.
+
+    Returns the number of (player rows, team rows) written. With
+    ``commit=False`` the work stays in the caller's transaction.
+    """
+    filters = _scope(GameResult, season, team_id)
+    db.session.execute(delete(PlayerSeasonStats).where(*_scope(PlayerSeasonStats, season, team_id)))
+    db.session.execute(delete(TeamSeasonStats).where(*_scope(TeamSeasonStats, season, team_id)))
+
+    finalized = and_(StatLine.game_id == GameResult.game_id,
+                     StatLine.team_id == GameResult.team_id)
+    sums = [func.sum(getattr(StatLine, column)) for column in STAT_COLUMNS]
+
+    player_rows = db.session.query(
+        StatLine.user_id, StatLine.team_id, StatLine.season, func.count(), *sums
+    ).join(GameResult, finalized).filter(*filters) \
+        .group_by(StatLine.user_id, StatLine.team_id, StatLine.season).all()
+    _insert_rollups(PlayerSeasonStats, ('user_id', 'team_id', 'season', 'games'), player_rows)
+
+    # Team totals: results and stat sums are each aggregated per team-season;
+    # sets_played then comes from the results (sets won + lost), since the
+    # sum over players would count every set once per player
+    team_rows = db.session.query(
+        GameResult.team_id, GameResult.season, func.count(),
+        func.sum(case((GameResult.sets_won > GameResult.sets_lost, 1), else_=0)),
+        func.sum(case((GameResult.sets_won < GameResult.sets_lost, 1), else_=0)),
+        func.sum(GameResult.sets_won), func.sum(GameResult.sets_lost),
+    ).filter(*filters).group_by(GameResult.team_id, GameResult.season).all()
+    team_sums = {(row[0], row[1]): row[2:] for row in db.session.query(
+        StatLine.team_id, StatLine.season, *sums
+    ).join(GameResult, finalized).filter(*filters)
+        .group_by(StatLine.team_id, StatLine.season)}
+    sets_index = STAT_COLUMNS.index('sets_played')
+    rows = []
+    for team, season_, games, wins, losses, sets_won, sets_lost in team_rows:
+        stats = list(team_sums.get((team, season_), (0,) * len(STAT_COLUMNS)))
+        stats[sets_index] = sets_won + sets_lost
+        rows.append((team, season_, games, wins, losses, sets_won, sets_lost, *stats))
+    _insert_rollups(TeamSeasonStats, ('team_id', 'season', 'games', 'wins', 'losses',
+                                      'sets_won', 'sets_lost'), rows)
+    if commit:
+        db.session.commit()
+    return len(player_rows), len(rows)
+
+def _scope(model, season, team_id):
+    filters = []
+    if season is not None:
+        filters.append(model.season == season)
+    if team_id is not None:
+        filters.append(model.team_id == team_id)
+    return filters
+
+def _insert_rollups(model, key_columns, rows):
+    if not rows:
+        return
+    width = len(key_columns)
+    matrix = np.array([row[width:] for row in rows], dtype=np.int64)
+    totals = {column: matrix[:, i] for i, column in enumerate(STAT_COLUMNS)}
+    derived = derive_metrics(totals)
+    values = []
+    for i, row in enumerate(rows):
+        value = dict(zip(key_columns, row[:width]))
+        value.update((column, int(totals[column][i])) for column in STAT_COLUMNS)
+        value.update((column, float(array[i])) for column, array in derived.items())
+        values.append(value)
+    db.session.execute(insert(model), values)
+
+def record_game(game_id, team_id, season, sets_won, sets_lost, lines):
+    """Store (or replace) a team's box score for a game and finalize it.
+
+    ``lines`` are dicts with a ``user_id`` and any of ``STAT_COLUMNS``.
+    Raises ``ValueError`` if a line's user is not a member of the team.
+    """
+    user_ids = {int(line['user_id']) for line in lines}
+    members = set(db.session.scalars(
+        select(TeamMember.user_id)
+        .where(TeamMember.team_id == team_id, TeamMember.user_id.in_(user_ids))))
+    if user_ids - members:
+        raise ValueError(f'user(s) {sorted(user_ids - members)} are not on team {team_id}')
+    db.session.execute(delete(StatLine).where(StatLine.game_id == game_id,
+                                              StatLine.team_id == team_id))
+    db.session.execute(insert(StatLine), [
+        dict({column: int(line.get(column) or 0) for column in STAT_COLUMNS},
+             game_id=game_id, team_id=team_id, season=season, user_id=int(line['user_id']))
+        for line in lines
+    ])
+    finalize_game(game_id, team_id, sets_won, sets_lost)
@@ -0,0 +1,342 @@
+import csv
+import hashlib
+import io
+import json
+import time
+import uuid
+from datetime import datetime
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.auth.models import User
+from app.game.models import Game
+from app.team.models import Team
+from app.utils.sql import upsert
+from .engine import rebuild
+from .models import STAT_COLUMNS, StatLine, GameResult, StatImport
+
+# Columns of a stat sheet row; sets_won/sets_lost finalize the game when given
+KEY_COLUMNS = ('game_id', 'team_id', 'user_id')
+RESULT_COLUMNS = ('sets_won', 'sets_lost')
+LINE_COLUMNS = KEY_COLUMNS + ('season',) + STAT_COLUMNS
+
+MAX_STAT_VALUE = 1000  # anything larger in a single game is a typo
+MAX_ERRORS = 50  # stop validating after this many bad rows
+CHUNK_SIZE = 5000  # rows validated and written at a time
+KEY_LENGTH = 64  # longest idempotency key
+
+class StatSheetError(ValueError):
+    """The sheet had invalid rows; nothing was written."""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} invalid row(s)')
+        self.errors = errors
+
+class ImportConflict(Exception):
+    """The idempotency key was already used for a different sheet."""
+
+class _HashingReader(io.RawIOBase):
+    """Raw stream wrapper that hashes the bytes as they are read."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.sha = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        buffer[:len(data)] = data
+        self.sha.update(data)
+        return len(data)
+
+JSON_READ_SIZE = 64 * 1024  # characters of a JSON array sheet read at a time
+
+def _json_array(text):
+    """Yield the elements of a JSON array one at a time, without loading all of it."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        data = text.read(JSON_READ_SIZE)
+        eof = not data
+        buffer, pos = buffer[pos:] + data, 0
+
+    def next_char():
+        """The next non-blank character, consumed; '' at the end of the sheet."""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                pos += 1
+                return buffer[pos - 1]
+            if eof:
+                return ''
+            fill()
+
+    if next_char() != '[':
+        raise ValueError('expected a JSON array')
+    if next_char() == ']':
+        return
+    pos -= 1
+    while True:
+        try:
+            element, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        if end == len(buffer) and not eof:
+            fill()  # a number could go on in the next read
+            continue
+        pos = end
+        yield element
+        separator = next_char()
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError("expected ',' or ']' between array elements")
+        if not next_char():
+            raise ValueError('unexpected end of the JSON array')
+        pos -= 1
+
+def _records(text, fmt):
+    """Yield (line number, dict) pairs from a CSV, JSON array or JSON Lines sheet."""
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for number, line in enumerate(text, 1):
+            if line.strip():
+                yield number, json.loads(line)
+    elif fmt == 'json':
+        for number, record in enumerate(_json_array(text), 1):
+            yield number, record
+    else:
+        raise ValueError(f'Unsupported stat sheet format {fmt!r}')
+
+def _int(record, column, required=True):
+    value = record.get(column)
+    if value is None or value == '':
+        if required:
+            raise ValueError(f'{column} is required')
+        return None
+    value = int(value)
+    if value < 0:
+        raise ValueError(f'{column} must not be negative')
+    return value
+
+def _validate(record):
+    if not isinstance(record, dict):
+        raise ValueError('expected an object')
+    row = {column: _int(record, column) for column in KEY_COLUMNS}
+    row['season'] = str(record.get('season') or '').strip()
+    if not row['season'] or len(row['season']) > 16:
+        raise ValueError('season is required (at most 16 characters)')
+    for column in STAT_COLUMNS:
+        value = _int(record, column, required=False) or 0
+        if value > MAX_STAT_VALUE:
+            raise ValueError(f'{column} is out of range')
+        row[column] = value
+    if row['kills'] + row['attack_errors'] > row['attack_attempts']:
+        raise ValueError('kills and attack errors exceed attack attempts')
+    result = tuple(_int(record, column, required=False) for column in RESULT_COLUMNS)
+    if (result[0] is None) != (result[1] is None):
+        raise ValueError('sets_won and sets_lost must be given together')
+    return row, result
+
+def _upsert(model, rows, index_elements, update_columns):
+    stmt = upsert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={column: stmt.excluded[column] for column in update_columns})
+    db.session.execute(stmt, rows)
+
+class _LineWriter:
+    """Writes validated stat lines, replacing lines already stored for the same player.
+
+    On PostgreSQL with psycopg2 the rows are streamed with ``COPY`` into a
+    temporary staging table and merged with one INSERT ... ON CONFLICT at
+    the end; elsewhere (other drivers have no ``copy_expert``) each chunk
+    is an ``executemany`` upsert.
+    """
+
+    def __init__(self):
+        dialect = db.session.get_bind().dialect
+        self.copy = dialect.name == 'postgresql' and dialect.driver == 'psycopg2'
+        self.staging = None
+
+    def write(self, rows):
+        if not self.copy:
+            _upsert(StatLine, rows, KEY_COLUMNS, LINE_COLUMNS[3:])
+            return
+        cursor = db.session.connection().connection.cursor()
+        if self.staging is None:
+            self.staging = f'stat_lines_import_{uuid.uuid4().hex[:8]}'
+            cursor.execute(f'CREATE TEMPORARY TABLE {self.staging} '
+                           f'(LIKE stat_lines INCLUDING DEFAULTS) ON COMMIT DROP')
+        data = io.StringIO()
+        writer = csv.writer(data)
+        writer.writerows([row[column] for column in LINE_COLUMNS] for row in rows)
+        data.seek(0)
+        cursor.copy_expert(f"COPY {self.staging} ({', '.join(LINE_COLUMNS)}) "
+                           f"FROM STDIN WITH (FORMAT csv)", data)
+
+    def finish(self):
+        if self.staging is None:
+            return
+        columns = ', '.join(LINE_COLUMNS)
+        updates = ', '.join(f'{column} = EXCLUDED.{column}' for column in LINE_COLUMNS[3:])
+        cursor = db.session.connection().connection.cursor()
+        cursor.execute(f'INSERT INTO stat_lines ({columns}) SELECT {columns} FROM {self.staging} '
+                       f"ON CONFLICT ({', '.join(KEY_COLUMNS)}) DO UPDATE SET {updates}")
+
+def import_stat_sheet(stream, fmt, key=None, user_id=None, team_ids=None):
+    """Validate and store a stat sheet read from the binary ``stream``.
+
+    Rows are validated as they are read and written in chunks, all in one
+    transaction: if any row is invalid, :class:`StatSheetError` lists the
+    problems and nothing is kept. Lines already stored for the same game,
+    team and player are replaced, so a re-upload never duplicates rows.
+    With an idempotency ``key`` the import is recorded; sending the same
+    sheet under the same key again returns the first result without
+    touching the data, a different sheet raises :class:`ImportConflict`.
+    Keys are scoped to ``user_id``; a key longer than ``KEY_LENGTH``
+    raises ``ValueError``.
+
+    Rows naming a game, team or user that does not exist are invalid, and
+    when ``team_ids`` is given so are rows of any other team.
+    Games whose rows carry ``sets_won``/``sets_lost`` are finalized and
+    the affected rollups rebuilt. Returns ``(StatImport, replayed, seconds)``.
+    """
+    if key is not None and len(key) > KEY_LENGTH:
+        raise ValueError(f'Idempotency keys are at most {KEY_LENGTH} characters')
+    started = time.perf_counter()
+    reader = _HashingReader(stream)
+    if key is not None:
+        previous = _previous_import(key, user_id)
+        if previous is not None:
+            return _replay(previous, reader, started)
+
+    text = io.TextIOWrapper(io.BufferedReader(reader), encoding='utf-8', newline='')
+    writer = _LineWriter()
+    known = {Game: set(), Team: set(), User: set()}
+    seen = set()
+    touched = set()
+    results = {}
+    errors = []
+    chunk = []
+    rows = 0
+
+    def flush():
+        # Checked here, a chunk at a time, rather than left to the foreign keys
+        for model, column in ((Game, 'game_id'), (Team, 'team_id'), (User, 'user_id')):
+            missing = {row[column] for row in chunk} - known[model]
+            if missing:
+                found = set(db.session.scalars(select(model.id).where(model.id.in_(missing))))
+                known[model].update(found)
+                for value in sorted(missing - found):
+                    errors.append(f'unknown {column} {value}')
+        if not errors:
+            writer.write(chunk)
+        chunk.clear()
+
+    try:
+        for number, record in _records(text, fmt):
+            try:
+                row, result = _validate(record)
+            except (ValueError, TypeError) as e:
+                errors.append(f'line {number}: {e}')
+            else:
+                line_key = (row['game_id'], row['team_id'], row['user_id'])
+                game = line_key[:2]
+                if team_ids is not None and row['team_id'] not in team_ids:
+                    errors.append(f'line {number}: not allowed to import team {row["team_id"]}')
+                elif line_key in seen:
+                    errors.append(f'line {number}: duplicate line for user {row["user_id"]}')
+                elif result[0] is not None and results.setdefault(
+                        game, (row['season'],) + result) != (row['season'],) + result:
+                    errors.append(f'line {number}: conflicting result for game {game[0]}')
+                else:
+                    seen.add(line_key)
+                    touched.add((row['season'], row['team_id']))
+                    chunk.append(row)
+                    rows += 1
+            if len(errors) >= MAX_ERRORS:
+                break
+            if len(chunk) >= CHUNK_SIZE:
+                flush()
+        if chunk:
+            flush()
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        errors.append(f'unreadable stat sheet: {e}')
+
+    if errors:
+        db.session.rollback()
+        raise StatSheetError(errors[:MAX_ERRORS])
+
+    try:
+        writer.finish()
+        games = {line_key[:2] for line_key in seen}
+        _finalize(results, touched, games)
+        record = StatImport(key=key or uuid.uuid4().hex, sha256=reader.sha.hexdigest(),
+                            user_id=user_id, rows=rows, games=len(games))
+        db.session.add(record)
+        db.session.commit()
+    except IntegrityError:
+        # The same key was imported concurrently; that import won
+        db.session.rollback()
+        previous = _previous_import(key, user_id) if key is not None else None
+        if previous is None:
+            raise  # not a key race: a row was deleted under the import
+        return _replay(previous, reader, started)
+    except Exception:
+        db.session.rollback()
+        raise
+    return record, False, time.perf_counter() - started
+
+def _previous_import(key, user_id):
+    return StatImport.query.filter_by(user_id=user_id, key=key).first()
+
+def _replay(previous, reader, started):
+    for _ in iter(lambda: reader.read(1024 * 1024), b''):
+        pass
+    if reader.sha.hexdigest() != previous.sha256:
+        raise ImportConflict(f'Idempotency key {previous.key} was used for another sheet')
+    return previous, True, time.perf_counter() - started
+
+def _finalize(results, touched, games):
+    if results:
+        _upsert(GameResult, [
+            {'game_id': game_id, 'team_id': team_id, 'season': season,
+             'sets_won': sets_won, 'sets_lost': sets_lost}
+            for (game_id, team_id), (season, sets_won, sets_lost) in results.items()
+        ], ('game_id', 'team_id'), ('season', 'sets_won', 'sets_lost'))
+
+    # Lines of games finalized earlier may have changed too, so every team
+    # in the sheet is rebuilt: whole seasons when many teams changed
+    teams_by_season = {}
+    for season, team_id in touched:
+        teams_by_season.setdefault(season, set()).add(team_id)
+    for season, teams in teams_by_season.items():
+        if len(teams) > 3:
+            rebuild(season=season, commit=False)
+        else:
+            for team_id in teams:
+                rebuild(season=season, team_id=team_id, commit=False)
+
+    # Stamped last, right before the commit, so the stat cube reloads every
+    # game of the sheet (finalized now or earlier) on its next refresh
+    now = datetime.utcnow()
+    ids = sorted({game_id for game_id, _ in games})
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        db.session.execute(update(GameResult)
+                           .where(GameResult.game_id.in_(chunk))
+                           .values(finalized_at=now)
+                           .execution_options(synchronize_session=False))
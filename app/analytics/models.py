@@ -0,0 +1,133 @@
+from datetime import datetime
+from app import db
+
+# Counting stats recorded for a player in one game, summed by the rollups
+STAT_COLUMNS = (
+    'sets_played', 'kills', 'attack_errors', 'attack_attempts', 'assists',
+    'service_aces', 'service_errors', 'digs', 'block_solos', 'block_assists',
+    'reception_errors',
+)
+
+# Metrics computed from the sums, stored on the rollups so pages never derive them
+DERIVED_COLUMNS = (
+    'hitting_pct', 'kills_per_set', 'assists_per_set', 'aces_per_set',
+    'digs_per_set', 'blocks_per_set', 'points',
+)
+
+class StatColumns:
+    """Counting stat columns shared by stat lines and rollups."""
+    sets_played = db.Column(db.Integer, nullable=False, default=0)
+    kills = db.Column(db.Integer, nullable=False, default=0)
+    attack_errors = db.Column(db.Integer, nullable=False, default=0)
+    attack_attempts = db.Column(db.Integer, nullable=False, default=0)
+    assists = db.Column(db.Integer, nullable=False, default=0)
+    service_aces = db.Column(db.Integer, nullable=False, default=0)
+    service_errors = db.Column(db.Integer, nullable=False, default=0)
+    digs = db.Column(db.Integer, nullable=False, default=0)
+    block_solos = db.Column(db.Integer, nullable=False, default=0)
+    block_assists = db.Column(db.Integer, nullable=False, default=0)
+    reception_errors = db.Column(db.Integer, nullable=False, default=0)
+
+class DerivedColumns:
+    hitting_pct = db.Column(db.Float, nullable=False, default=0.0)
+    kills_per_set = db.Column(db.Float, nullable=False, default=0.0)
+    assists_per_set = db.Column(db.Float, nullable=False, default=0.0)
+    aces_per_set = db.Column(db.Float, nullable=False, default=0.0)
+    digs_per_set = db.Column(db.Float, nullable=False, default=0.0)
+    blocks_per_set = db.Column(db.Float, nullable=False, default=0.0)
+    points = db.Column(db.Float, nullable=False, default=0.0)
+
+    def to_dict(self):
+        data = {column.name: getattr(self, column.name) for column in self.__table__.columns}
+        data.pop('updated_at', None)
+        return data
+
+class StatLine(StatColumns, db.Model):
+    """One player's box score for one game."""
+    __tablename__ = 'stat_lines'
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.Integer, nullable=False)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    season = db.Column(db.String(16), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('game_id', 'team_id', 'user_id', name='uq_stat_lines_game_player'),
+        db.Index('ix_stat_lines_team_season', 'team_id', 'season'),
+    )
+
+    def __repr__(self):
+        return f'<StatLine game={self.game_id} user={self.user_id}>'
+
+class GameResult(db.Model):
+    """Final score of a game for one team; its stat lines count once this exists."""
+    __tablename__ = 'game_results'
+    game_id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), primary_key=True)
+    season = db.Column(db.String(16), nullable=False)
+    sets_won = db.Column(db.Integer, nullable=False)
+    sets_lost = db.Column(db.Integer, nullable=False)
+    finalized_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<GameResult game={self.game_id} team={self.team_id}>'
+
+class StatImport(db.Model):
+    """A stat sheet import, remembered by its uploader's idempotency key."""
+    __tablename__ = 'stat_imports'
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    rows = db.Column(db.Integer, nullable=False)
+    games = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_stat_imports_user_key'),
+    )
+
+    def to_dict(self):
+        return {'key': self.key, 'sha256': self.sha256, 'rows': self.rows,
+                'games': self.games, 'created_at': self.created_at.isoformat()}
+
+    def __repr__(self):
+        return f'<StatImport {self.key} rows={self.rows}>'
+
+class PlayerSeasonStats(StatColumns, DerivedColumns, db.Model):
+    """Season totals of a player for one team."""
+    __tablename__ = 'player_season_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), primary_key=True)
+    season = db.Column(db.String(16), primary_key=True)
+    games = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user = db.relationship('User')
+
+    __table_args__ = (
+        db.Index('ix_player_season_stats_team_season', 'team_id', 'season', 'points'),
+        db.Index('ix_player_season_stats_season_points', 'season', 'points'),
+    )
+
+    def __repr__(self):
+        return f'<PlayerSeasonStats user={self.user_id} {self.season}>'
+
+class TeamSeasonStats(StatColumns, DerivedColumns, db.Model):
+    """Season totals and record of a team."""
+    __tablename__ = 'team_season_stats'
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), primary_key=True)
+    season = db.Column(db.String(16), primary_key=True)
+    games = db.Column(db.Integer, nullable=False, default=0)
+    wins = db.Column(db.Integer, nullable=False, default=0)
+    losses = db.Column(db.Integer, nullable=False, default=0)
+    sets_won = db.Column(db.Integer, nullable=False, default=0)
+    sets_lost = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_team_season_stats_season', 'season', 'wins'),
+    )
+
+    def __repr__(self):
+        return f'<TeamSeasonStats team={self.team_id} {self.season}>'
@@ -0,0 +1,158 @@
+from flask import render_template, jsonify, request, abort, current_app
+from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
+
+from app.utils.database import read_only, statement_timeout
+from app.utils.views import has_role, json_error, managed_team_ids, manages_team
+from . import analytics
+from .cube import stat_cube
+from .engine import record_game
+from .ingest import import_stat_sheet, StatSheetError, ImportConflict, KEY_LENGTH
+from .models import STAT_COLUMNS, DERIVED_COLUMNS, PlayerSeasonStats, TeamSeasonStats
+
+def _season():
+    return request.args.get('season') or current_app.config['CURRENT_SEASON']
+
+# Stat sheet formats by request content type
+SHEET_FORMATS = {
+    'text/csv': 'csv',
+    'application/json': 'json',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+}
+
+def _cube_filters():
+    return {
+        'user_id': request.args.getlist('user_id', type=int) or None,
+        'team_id': request.args.getlist('team_id', type=int) or None,
+        'season': request.args.getlist('season') or None,
+    }
+
+@analytics.route('/')
+@read_only
+@login_required
+def dashboard():
+    """Season leaderboard, read straight from the player rollups."""
+    season = _season()
+    leaders = PlayerSeasonStats.query.options(joinedload(PlayerSeasonStats.user)) \
+        .filter_by(season=season) \
+        .order_by(PlayerSeasonStats.points.desc()).limit(25).all()
+    return render_template('analytics/dashboard.html', title='Analytics',
+                           season=season, leaders=leaders)
+
+@analytics.route('/players/<int:user_id>')
+@read_only
+@login_required
+def player_stats(user_id):
+    """Every season of a player, for progress charts."""
+    rows = PlayerSeasonStats.query.filter_by(user_id=user_id) \
+        .order_by(PlayerSeasonStats.season).all()
+    return jsonify([row.to_dict() for row in rows])
+
+@analytics.route('/teams/<int:team_id>')
+@read_only
+@login_required
+def team_stats(team_id):
+    row = TeamSeasonStats.query.filter_by(team_id=team_id, season=_season()).first_or_404()
+    return jsonify(row.to_dict())
+
+@analytics.route('/teams/<int:team_id>/players')
+@read_only
+@login_required
+def team_player_stats(team_id):
+    """Players of a team in a season, best first, for comparisons."""
+    rows = PlayerSeasonStats.query.filter_by(team_id=team_id, season=_season()) \
+        .order_by(PlayerSeasonStats.points.desc()).all()
+    return jsonify([row.to_dict() for row in rows])
+
+@analytics.route('/games/<int:game_id>/stats', methods=['POST'])
+@login_required
+def submit_game_stats(game_id):
+    """Record a team's final box score and update the rollups."""
+    if not has_role('admin', 'coach'):
+        abort(403)
+    data = request.get_json(silent=True) or {}
+    try:
+        team_id = int(data['team_id'])
+    except (KeyError, TypeError, ValueError) as e:
+        return json_error(f'Invalid box score: {e}', 400)
+    if not manages_team(team_id):
+        abort(403)
+    try:
+        record_game(game_id, team_id, str(data.get('season') or _season()),
+                    int(data['sets_won']), int(data['sets_lost']), data['lines'])
+    except (KeyError, TypeError, ValueError) as e:
+        return json_error(f'Invalid box score: {e}', 400)
+    return '', 204
+
+@analytics.route('/stat-sheets', methods=['POST'])
+@login_required
+@statement_timeout(120)  # the merge and rollup rebuild of a season-sized sheet
+def upload_stat_sheet():
+    """Bulk import a CSV or JSON stat sheet; send an ``Idempotency-Key`` to make retries safe.
+
+    Coaches can only import lines of the teams they coach. Keys are per
+    user and at most 64 characters long.
+    """
+    if not has_role('admin', 'coach'):
+        abort(403)
+    fmt = SHEET_FORMATS.get(request.mimetype)
+    if fmt is None:
+        response = jsonify({'error': 'Send text/csv, application/json or application/x-ndjson.'})
+        response.status_code = 415
+        return response
+    key = request.headers.get('Idempotency-Key')
+    if key is not None and len(key) > KEY_LENGTH:
+        return json_error(f'Idempotency-Key is longer than {KEY_LENGTH} characters', 400)
+    try:
+        record, replayed, elapsed = import_stat_sheet(
+            request.stream, fmt, key=key,
+            user_id=current_user.id, team_ids=managed_team_ids())
+    except StatSheetError as e:
+        response = jsonify({'error': str(e), 'errors': e.errors})
+        response.status_code = 400
+        return response
+    except ImportConflict as e:
+        response = jsonify({'error': str(e)})
+        response.status_code = 409
+        return response
+    data = record.to_dict()
+    data.update(replayed=replayed, seconds=round(elapsed, 3),
+                rows_per_sec=round(record.rows / elapsed) if elapsed and not replayed else None)
+    response = jsonify(data)
+    response.status_code = 200 if replayed else 201
+    return response
+
+@analytics.route('/compare')
+@read_only
+@login_required
+def compare():
+    """Group stat lines on the fly, e.g. ``?by=user_id,season&team_id=3&sort=points``."""
+    by = tuple(name for name in request.args.get('by', 'user_id').split(',') if name)
+    try:
+        rows = stat_cube.group_by(by, min_sets=request.args.get('min_sets', 0, type=int),
+                                  **_cube_filters())
+    except ValueError as e:
+        return json_error(str(e), 400)
+    sort = request.args.get('sort')
+    if sort in STAT_COLUMNS or sort in DERIVED_COLUMNS:
+        rows.sort(key=lambda row: row[sort], reverse=True)
+    return jsonify(rows[:request.args.get('limit', 100, type=int)])
+
+@analytics.route('/percentiles')
+@read_only
+@login_required
+def percentiles():
+    """Distribution of a metric across players (or teams), e.g. for "top 10%" badges."""
+    metric = request.args.get('metric', 'hitting_pct')
+    if metric not in STAT_COLUMNS and metric not in DERIVED_COLUMNS:
+        return json_error(f'Unknown metric {metric!r}', 400)
+    by = tuple(name for name in request.args.get('by', 'user_id').split(',') if name)
+    q = request.args.getlist('q', type=int) or [25, 50, 75, 90]
+    try:
+        result = stat_cube.percentiles(metric, by, q=q,
+                                       min_sets=request.args.get('min_sets', 0, type=int),
+                                       **_cube_filters())
+    except ValueError as e:
+        return json_error(str(e), 400)
+    return jsonify({'metric': metric, 'percentiles': result})
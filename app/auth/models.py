@@ -1,7 +1,6 @@
 from datetime import datetime
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-from app import db, login_manager
+from app import db, hasher
 
 class Role(db.Model):
     __tablename__ = 'roles'
@@ -17,7 +16,7 @@ class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     username = db.Column(db.String(64), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(256))
     first_name = db.Column(db.String(64))
     last_name = db.Column(db.String(64))
     phone = db.Column(db.String(20))
@@ -45,10 +44,16 @@ class User(UserMixin, db.Model):
 
     @password.setter
     def password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
 
     def verify_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if not hasher.verify(self.password_hash, password):
+            return False
+        # Upgrade hashes made with outdated parameters while we have the
+        # plaintext; the caller's commit persists the new hash.
+        if hasher.needs_rehash(self.password_hash):
+            self.password = password
+        return True
 
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}"
@@ -60,7 +65,7 @@ class TeamMember(db.Model):
     __tablename__ = 'team_members'
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False, index=True)
     role = db.Column(db.String(20))  # 'coach', 'player', 'parent'
     joined_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -75,7 +80,3 @@ class PasswordReset(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     expires_at = db.Column(db.DateTime, nullable=False)
     used = db.Column(db.Boolean, default=False)
-
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
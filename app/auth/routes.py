@@ -2,9 +2,7 @@ from flask import render_template, redirect, url_for, flash, request, current_ap
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.urls import url_parse
 from datetime import datetime, timedelta
-import os
 import secrets
-from PIL import Image
 
 from app import db
 from . import auth
@@ -12,21 +10,12 @@ from .forms import (LoginForm, RegistrationForm, RequestPasswordResetForm,
                    ResetPasswordForm, UpdateProfileForm)
 from .models import User, Role, PasswordReset
 from app.utils.email import send_password_reset_email
+from app.utils.images import image_pipeline, profile_pic_name
 
-def save_profile_picture(form_picture):
-    """Save profile picture with random hex name and resize it."""
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    picture_path = os.path.join(current_app.root_path, 'static/profile_pics', picture_fn)
-
-    # Resize image
-    output_size = (150, 150)
-    i = Image.open(form_picture)
-    i.thumbnail(output_size)
-    i.save(picture_path)
-
-    return picture_fn
+@auth.app_template_filter('profile_pic')
+def profile_pic_filter(name, size, fmt='jpg'):
+    """Pick a size/format of a processed profile picture in templates."""
+    return profile_pic_name(name, size, fmt)
 
 @auth.route('/login', methods=['GET', 'POST'])
 def login():
@@ -99,9 +88,8 @@ def reset_password_request():
                 expires_at=datetime.utcnow() + timedelta(hours=24)
             )
             db.session.add(reset)
-            db.session.commit()
-            
             send_password_reset_email(user, token)
+            db.session.commit()
         flash('Check your email for instructions to reset your password.', 'info')
         return redirect(url_for('auth.login'))
     return render_template('auth/reset_password_request.html',
@@ -137,8 +125,8 @@ def profile():
     form = UpdateProfileForm(current_user.username, current_user.email)
     if form.validate_on_submit():
         if form.profile_image.data:
-            picture_file = save_profile_picture(form.profile_image.data)
-            current_user.profile_image = picture_file
+            # Resized in the background; the new picture shows up once processed
+            image_pipeline.submit(current_user.id, form.profile_image.data)
         
         current_user.username = form.username.data.lower()
         current_user.email = form.email.data.lower()
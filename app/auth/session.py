@@ -0,0 +1,110 @@
+from collections import namedtuple
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from app import db, login_manager
+from app.utils.cache import TTLCache, invalidate_on_commit
+from .models import User, Role, TeamMember
+
+# Columns copied into the cached snapshot of a user
+SNAPSHOT_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'phone',
+                   'is_active', 'profile_image', 'created_at', 'last_login')
+
+RoleRef = namedtuple('RoleRef', 'name')
+Membership = namedtuple('Membership', 'team_id role')
+
+user_cache = TTLCache('user_session', maxsize=4096, ttl=300)
+
+class SessionUser(UserMixin):
+    """Stand-in for :class:`User` built from a cached snapshot.
+
+    Identity, role name and team memberships are answered from the snapshot
+    without touching the database. Any other attribute, and any write, loads
+    the real row, after which the proxy defers to it entirely.
+    """
+
+    def __init__(self, snapshot):
+        object.__setattr__(self, '_snapshot', snapshot)
+        object.__setattr__(self, '_model', None)
+
+    @property
+    def model(self):
+        if self._model is None:
+            object.__setattr__(self, '_model', db.session.get(User, self._snapshot['id']))
+        return self._model
+
+    @property
+    def is_active(self):
+        if self._model is not None:
+            return self._model.is_active
+        return self._snapshot['is_active']
+
+    @property
+    def role(self):
+        if self._model is not None:
+            return self._model.role
+        name = self._snapshot['role']
+        return RoleRef(name) if name is not None else None
+
+    @property
+    def team_memberships(self):
+        return tuple(Membership(*m) for m in self._snapshot['memberships'])
+
+    def get_full_name(self):
+        return f"{self.first_name} {self.last_name}"
+
+    def __getattr__(self, name):
+        if self._model is None and name in self._snapshot:
+            return self._snapshot[name]
+        return getattr(self.model, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.model, name, value)
+
+    def __repr__(self):
+        return f'<SessionUser {self._snapshot["username"]}>'
+
+def build_snapshot(user_id):
+    """Load the compact, cacheable view of a user in a single query."""
+    row = db.session.query(User, Role.name) \
+        .outerjoin(Role, User.role_id == Role.id) \
+        .filter(User.id == user_id).first()
+    if row is None:
+        return None
+    user, role_name = row
+    snapshot = {field: getattr(user, field) for field in SNAPSHOT_FIELDS}
+    snapshot['role'] = role_name
+    snapshot['memberships'] = tuple(db.session.query(TeamMember.team_id, TeamMember.role)
+                                    .filter(TeamMember.user_id == user_id))
+    return snapshot
+
+def invalidate_user(user_id):
+    user_cache.delete(user_id)
+
+@login_manager.user_loader
+def load_user(user_id):
+    user_id = int(user_id)
+    snapshot = user_cache.get(user_id)
+    if snapshot is None:
+        snapshot = build_snapshot(user_id)
+        if snapshot is None:
+            return None
+        user_cache.set(user_id, snapshot)
+    return SessionUser(snapshot)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    invalidate_on_commit(object_session(target), user_cache, target.id)
+
+@event.listens_for(TeamMember, 'after_insert')
+@event.listens_for(TeamMember, 'after_update')
+@event.listens_for(TeamMember, 'after_delete')
+def _membership_changed(mapper, connection, target):
+    invalidate_on_commit(object_session(target), user_cache, target.user_id)
+
+@event.listens_for(Role, 'after_update')
+@event.listens_for(Role, 'after_delete')
+def _role_changed(mapper, connection, target):
+    # Role names are denormalized into every snapshot holding them
+    invalidate_on_commit(object_session(target), user_cache)
@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+broadcast = Blueprint('broadcast', __name__)
+
+from . import routes
@@ -0,0 +1,157 @@
+import atexit
+import os
+import threading
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import insert
+from app import db
+from app.utils.metrics import BROADCAST_CHAT_DROPPED
+from app.utils.sql import upsert
+from .events import publish_event
+from .models import ReactionCount, ChatMessage
+
+class WriteBehindBuffer:
+    """Aggregates reactions and chat in memory and writes them in bulk.
+
+    A tap on a reaction only increments a counter keyed by match and
+    reaction type; chat messages are appended to a list. A background
+    thread flushes every ``BROADCAST_FLUSH_INTERVAL`` seconds, or sooner
+    once ``BROADCAST_FLUSH_MAX_BATCH`` messages are waiting: the counters
+    become one multi-row upsert that adds to the stored totals, and the
+    messages one ``executemany`` INSERT. Because the upsert is additive,
+    every gunicorn worker can flush its own counters independently. Each
+    flush also pushes the reaction deltas to spectators. Failed writes are
+    merged back and retried on the next flush; while they keep failing, at
+    most ``BROADCAST_BUFFER_MAX_CHAT`` messages are kept and the oldest are
+    dropped (the counters only grow by match and reaction type). In eager
+    mode (the default under TESTING) every call flushes inline.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._reactions = Counter()
+        self._chat = []
+        self._thread_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = app.config['BROADCAST_FLUSH_INTERVAL']
+        self.max_batch = app.config['BROADCAST_FLUSH_MAX_BATCH']
+        self.max_chat = app.config['BROADCAST_BUFFER_MAX_CHAT']
+        self.eager = app.config.get('BROADCAST_BUFFER_EAGER', app.testing)
+        app.extensions['broadcast_buffer'] = self
+
+    def add_reaction(self, match_id, reaction, count=1):
+        with self._lock:
+            self._reactions[match_id, reaction] += count
+        self._wake()
+
+    def add_chat(self, match_id, user_id, body):
+        with self._lock:
+            self._chat.append({'match_id': match_id, 'user_id': user_id, 'body': body,
+                               'created_at': datetime.utcnow()})
+            self._trim_chat()
+            full = len(self._chat) >= self.max_batch
+        self._wake(full)
+
+    def pending_reactions(self, match_id):
+        """Reactions for ``match_id`` this process has not written yet."""
+        with self._lock:
+            return {reaction: count for (match, reaction), count in self._reactions.items()
+                    if match == match_id}
+
+    def flush(self):
+        """Write everything buffered so far; returns (reaction rows, chat rows)."""
+        with self._flush_lock:
+            with self._lock:
+                reactions, self._reactions = self._reactions, Counter()
+                chat, self._chat = self._chat, []
+            if not reactions and not chat:
+                return 0, 0
+            try:
+                self._write(reactions, chat)
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    self._reactions.update(reactions)
+                    self._chat[:0] = chat
+                    self._trim_chat()
+                raise
+        self._publish(reactions)
+        return len(reactions), len(chat)
+
+    def _trim_chat(self):
+        # Called with the lock held
+        excess = len(self._chat) - self.max_chat
+        if excess > 0:
+            del self._chat[:excess]
+            BROADCAST_CHAT_DROPPED.inc(excess)
+
+    def _write(self, reactions, chat):
+        now = datetime.utcnow()
+        rows = [{'match_id': match_id, 'reaction': reaction, 'count': count, 'updated_at': now}
+                for (match_id, reaction), count in sorted(reactions.items())]
+        for start in range(0, len(rows), self.max_batch):
+            db.session.execute(self._upsert(rows[start:start + self.max_batch]))
+        for start in range(0, len(chat), self.max_batch):
+            db.session.execute(insert(ChatMessage), chat[start:start + self.max_batch])
+        db.session.commit()
+
+    @staticmethod
+    def _upsert(rows):
+        stmt = upsert(ReactionCount).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=['match_id', 'reaction'],
+            set_={'count': ReactionCount.count + stmt.excluded.count,
+                  'updated_at': stmt.excluded.updated_at})
+
+    def _publish(self, reactions):
+        deltas = {}
+        for (match_id, reaction), count in reactions.items():
+            deltas.setdefault(match_id, {})[reaction] = count
+        for match_id, delta in deltas.items():
+            try:
+                publish_event(match_id, 'reactions', delta)
+            except Exception:
+                self.app.logger.exception('Could not publish reactions for match %s', match_id)
+
+    def _wake(self, now=False):
+        if self.eager:
+            self.flush()
+            return
+        self._ensure_thread()
+        if now:
+            self._wakeup.set()
+
+    def _ensure_thread(self):
+        # Threads do not survive a fork, so each gunicorn worker starts its own
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+        threading.Thread(target=self.run_flusher, daemon=True,
+                         name='broadcast-flusher').start()
+        atexit.register(self._flush_in_context)
+
+    def run_flusher(self, stop=None):
+        """Flush loop: sleep until the interval passes or a batch fills, then write."""
+        while stop is None or not stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._flush_in_context()
+
+    def _flush_in_context(self):
+        with self.app.app_context():
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('Failed to flush reactions and chat')
+            finally:
+                db.session.remove()
+
+write_buffer = WriteBehindBuffer()
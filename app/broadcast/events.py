@@ -0,0 +1,47 @@
+import json
+import threading
+from flask import current_app
+
+# Events for match 42 are published on 'broadcast:42'
+CHANNEL_PREFIX = 'broadcast:'
+
+class LocalBus:
+    """In-process stand-in for Redis pub/sub, used in development and tests.
+
+    Subscribers are asyncio loops, usually running in another thread, so
+    messages are handed over with ``call_soon_threadsafe``.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, loop, callback):
+        with self._lock:
+            self._subscribers.append((loop, callback))
+
+    def unsubscribe(self, loop, callback):
+        with self._lock:
+            self._subscribers.remove((loop, callback))
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, callback in subscribers:
+            loop.call_soon_threadsafe(callback, channel, message)
+        return len(subscribers)
+
+local_bus = LocalBus()
+
+def publish_event(match_id, event_type, data):
+    """Send an event to every spectator of ``match_id`` through the fan-out server.
+
+    Goes through the app's shared Redis client (and its socket timeout);
+    without Redis, events only reach a fan-out server in this process.
+    """
+    channel = f'{CHANNEL_PREFIX}{match_id}'
+    message = json.dumps({'type': event_type, 'data': data})
+    client = current_app.extensions.get('redis')
+    if client is not None:
+        return client.publish(channel, message)
+    return local_bus.publish(channel, message)
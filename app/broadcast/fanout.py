@@ -0,0 +1,151 @@
+"""Asynchronous fan-out server for live match updates.
+
+Spectators connect here instead of polling the Flask app:
+
+    GET /live/<match_id>/events   Server-Sent Events
+    GET /live/<match_id>/ws       WebSocket
+
+Events published with :func:`app.broadcast.events.publish_event` arrive
+over Redis pub/sub (``REDIS_URL``) and are pushed to every subscriber of
+the match. Without Redis the server listens on the in-process bus, which
+only works when it runs in the same process as the publisher.
+
+Usage: python -m app.broadcast.fanout [--host 0.0.0.0] [--port 8001]
+"""
+import argparse
+import asyncio
+import logging
+from aiohttp import web, WSMsgType
+from config import Config
+from .events import CHANNEL_PREFIX, local_bus
+from .hub import Hub
+
+log = logging.getLogger(__name__)
+
+HUB = web.AppKey('hub', Hub)
+HEARTBEAT = web.AppKey('heartbeat', float)
+REDIS_URL = web.AppKey('redis_url', str)
+LISTENER = web.AppKey('listener', asyncio.Task)
+
+async def sse_stream(request):
+    hub = request.app[HUB]
+    match_id = int(request.match_info['match_id'])
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    await response.prepare(request)
+    heartbeat = request.app[HEARTBEAT]
+    queue = hub.subscribe(match_id)
+    try:
+        while True:
+            try:
+                frame = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                await response.write(b': ping\n\n')
+                continue
+            if frame is None:
+                break
+            await response.write(frame[1])
+    except ConnectionResetError:
+        pass
+    finally:
+        hub.unsubscribe(match_id, queue)
+    return response
+
+async def websocket_stream(request):
+    hub = request.app[HUB]
+    match_id = int(request.match_info['match_id'])
+    ws = web.WebSocketResponse(heartbeat=request.app[HEARTBEAT])
+    await ws.prepare(request)
+    queue = hub.subscribe(match_id)
+
+    async def drain_client():
+        # Spectators only listen; reading is needed to notice a close
+        async for msg in ws:
+            if msg.type == WSMsgType.ERROR:
+                break
+
+    reader = asyncio.ensure_future(drain_client())
+    try:
+        while not reader.done():
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, reader}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            frame = getter.result()
+            if frame is None:
+                break
+            await ws.send_str(frame[0])
+    except ConnectionResetError:
+        pass
+    finally:
+        hub.unsubscribe(match_id, queue)
+        reader.cancel()
+        await ws.close()
+    return ws
+
+async def health(request):
+    hub = request.app[HUB]
+    return web.json_response({'status': 'ok', 'channels': len(hub.channels),
+                              'subscribers': hub.subscriber_count,
+                              'published': hub.published, 'frames': hub.frames,
+                              'dropped': hub.dropped})
+
+async def _listen_redis(app, url):
+    import redis.asyncio as aioredis
+
+    hub = app[HUB]
+    while True:
+        client = aioredis.from_url(url)
+        try:
+            pubsub = client.pubsub()
+            await pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+            async for message in pubsub.listen():
+                if message['type'] == 'pmessage':
+                    hub.handle_message(message['channel'], message['data'])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception('Lost the Redis subscription, reconnecting')
+            await asyncio.sleep(1)
+        finally:
+            await client.aclose()
+
+async def _start_listener(app):
+    if app[REDIS_URL]:
+        app[LISTENER] = asyncio.ensure_future(_listen_redis(app, app[REDIS_URL]))
+    else:
+        local_bus.subscribe(asyncio.get_running_loop(), app[HUB].handle_message)
+
+async def _stop_listener(app):
+    if app[REDIS_URL]:
+        app[LISTENER].cancel()
+    else:
+        local_bus.unsubscribe(asyncio.get_running_loop(), app[HUB].handle_message)
+
+def create_server(config=Config, redis_url=None):
+    """Build the aiohttp application; ``redis_url`` defaults to ``REDIS_URL``."""
+    app = web.Application()
+    app[HUB] = Hub(config.BROADCAST_COALESCE_INTERVAL, config.BROADCAST_SUBSCRIBER_QUEUE)
+    app[HEARTBEAT] = config.BROADCAST_HEARTBEAT
+    app[REDIS_URL] = (config.REDIS_URL if redis_url is None else redis_url) or ''
+    app.on_startup.append(_start_listener)
+    app.on_cleanup.append(_stop_listener)
+    app.router.add_get('/live/{match_id:\\d+}/events', sse_stream)
+    app.router.add_get('/live/{match_id:\\d+}/ws', websocket_stream)
+    app.router.add_get('/live/health', health)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8001)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    web.run_app(create_server(), host=args.host, port=args.port)
+
+if __name__ == '__main__':
+    main()
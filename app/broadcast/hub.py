@@ -0,0 +1,123 @@
+import asyncio
+import json
+import logging
+from .events import CHANNEL_PREFIX
+
+log = logging.getLogger(__name__)
+
+class Channel:
+    """Subscribers and coalescing state of one match."""
+
+    __slots__ = ('subscribers', 'score', 'pending', 'events', 'seq', 'flush_handle')
+
+    def __init__(self):
+        self.subscribers = set()
+        self.score = {}  # full scoreboard, sent to new subscribers
+        self.pending = {}  # score fields changed since the last flush
+        self.events = []  # chat and other events since the last flush
+        self.seq = 0
+        self.flush_handle = None
+
+class Hub:
+    """Per-match fan-out of live events to connected spectators.
+
+    Updates are not forwarded one by one: a channel collects score changes
+    and other events for ``coalesce_interval`` seconds and then sends one
+    frame holding the merged score delta and the events in order. The frame
+    is encoded once and shared by every subscriber. Each subscriber has a
+    bounded queue; one that falls ``queue_size`` frames behind is cut off
+    and receives the full scoreboard again when it reconnects.
+
+    All methods must be called from the loop the hub runs on.
+    """
+
+    def __init__(self, coalesce_interval=0.25, queue_size=64):
+        self.coalesce_interval = coalesce_interval
+        self.queue_size = queue_size
+        self.channels = {}
+        self.published = 0
+        self.frames = 0
+        self.dropped = 0
+
+    @property
+    def subscriber_count(self):
+        return sum(len(channel.subscribers) for channel in self.channels.values())
+
+    def subscribe(self, match_id):
+        """Return a queue of frames for ``match_id``, starting with a snapshot.
+
+        A frame is a ``(json_text, sse_bytes)`` tuple; ``None`` means the
+        subscriber was dropped and the connection should be closed.
+        """
+        channel = self.channels.get(match_id)
+        if channel is None:
+            channel = self.channels[match_id] = Channel()
+        queue = asyncio.Queue(self.queue_size)
+        if channel.score:
+            queue.put_nowait(self._encode('snapshot', channel.seq,
+                                          {'score': channel.score, 'events': []}))
+        channel.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, match_id, queue):
+        channel = self.channels.get(match_id)
+        if channel is None:
+            return
+        channel.subscribers.discard(queue)
+        if not channel.subscribers and not channel.score and channel.flush_handle is None:
+            del self.channels[match_id]
+
+    def publish(self, match_id, event_type, data):
+        """Queue an event for the next flush of ``match_id``."""
+        channel = self.channels.get(match_id)
+        if channel is None:
+            channel = self.channels[match_id] = Channel()
+        if event_type == 'score':
+            channel.score.update(data)
+            channel.pending.update(data)
+        else:
+            channel.events.append({'type': event_type, 'data': data})
+        self.published += 1
+        if channel.flush_handle is None:
+            loop = asyncio.get_running_loop()
+            channel.flush_handle = loop.call_later(self.coalesce_interval,
+                                                   self._flush, match_id)
+
+    def handle_message(self, channel_name, message):
+        """Publish a raw pub/sub message received on ``broadcast:<match_id>``."""
+        if isinstance(channel_name, bytes):
+            channel_name = channel_name.decode()
+        try:
+            match_id = int(channel_name[len(CHANNEL_PREFIX):])
+            event = json.loads(message)
+            self.publish(match_id, event['type'], event['data'])
+        except (ValueError, KeyError, TypeError):
+            log.warning('Ignoring malformed message on %s', channel_name)
+
+    def _flush(self, match_id):
+        channel = self.channels[match_id]
+        channel.flush_handle = None
+        channel.seq += 1
+        frame = self._encode('update', channel.seq,
+                             {'score': channel.pending, 'events': channel.events})
+        channel.pending = {}
+        channel.events = []
+
+        for queue in list(channel.subscribers):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Slow consumer: replace its backlog with a close marker
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+                channel.subscribers.discard(queue)
+                self.dropped += 1
+        self.frames += 1
+
+    @staticmethod
+    def _encode(event, seq, payload):
+        payload['type'] = event
+        payload['seq'] = seq
+        text = json.dumps(payload, separators=(',', ':'))
+        return text, f'id: {seq}\nevent: {event}\ndata: {text}\n\n'.encode()
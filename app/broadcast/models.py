@@ -0,0 +1,29 @@
+from datetime import datetime
+from app import db
+
+class ReactionCount(db.Model):
+    """Running total of one reaction type for a match."""
+    __tablename__ = 'reaction_counts'
+    match_id = db.Column(db.Integer, primary_key=True)
+    reaction = db.Column(db.String(16), primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ReactionCount {self.match_id} {self.reaction}={self.count}>'
+
+class ChatMessage(db.Model):
+    """A spectator chat message posted during a match."""
+    __tablename__ = 'chat_messages'
+    id = db.Column(db.Integer, primary_key=True)
+    match_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    body = db.Column(db.String(500), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_chat_messages_match_created', 'match_id', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<ChatMessage {self.id} match={self.match_id}>'
@@ -0,0 +1,57 @@
+from flask import jsonify, request, abort, current_app
+from flask_login import login_required, current_user
+
+from app.utils.database import read_only
+from app.utils.views import has_role, json_error
+from . import broadcast
+from .buffer import write_buffer
+from .events import publish_event
+from .models import ReactionCount
+
+MAX_CHAT_LENGTH = 500
+
+@broadcast.route('/<int:match_id>/score', methods=['POST'])
+@login_required
+def update_score(match_id):
+    """Push changed scoreboard fields, e.g. ``{"home": 12, "away": 10}``, to spectators."""
+    if not has_role('admin', 'coach'):
+        abort(403)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data or not all(
+            isinstance(value, (int, str, type(None))) for value in data.values()):
+        return json_error('Expected an object of scoreboard fields.', 400)
+    publish_event(match_id, 'score', data)
+    return '', 204
+
+@broadcast.route('/<int:match_id>/chat', methods=['POST'])
+@login_required
+def post_chat(match_id):
+    """Send a chat message to everyone watching the match."""
+    data = request.get_json(silent=True) or {}
+    message = str(data.get('message', '')).strip()
+    if not message or len(message) > MAX_CHAT_LENGTH:
+        return json_error(f'Messages must be 1 to {MAX_CHAT_LENGTH} characters.', 400)
+    write_buffer.add_chat(match_id, current_user.id, message)
+    publish_event(match_id, 'chat', {'user': current_user.username, 'message': message})
+    return '', 204
+
+@broadcast.route('/<int:match_id>/react', methods=['POST'])
+@login_required
+def react(match_id):
+    """Count a reaction; totals are written and pushed out in the next flush."""
+    reaction = (request.get_json(silent=True) or {}).get('reaction')
+    if reaction not in current_app.config['BROADCAST_REACTIONS']:
+        return json_error('Unknown reaction.', 400)
+    write_buffer.add_reaction(match_id, reaction)
+    return '', 202
+
+@broadcast.route('/<int:match_id>/reactions')
+@read_only
+def reaction_totals(match_id):
+    """Reaction totals, including taps this worker has not written yet."""
+    totals = {reaction: 0 for reaction in current_app.config['BROADCAST_REACTIONS']}
+    for row in ReactionCount.query.filter_by(match_id=match_id):
+        totals[row.reaction] = row.count
+    for reaction, count in write_buffer.pending_reactions(match_id).items():
+        totals[reaction] = totals.get(reaction, 0) + count
+    return jsonify(totals)
@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+communication = Blueprint('communication', __name__)
+
+from . import routes
@@ -0,0 +1,112 @@
+from datetime import datetime
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import joinedload
+from app import db
+from app.auth.models import User, TeamMember
+from app.utils.email import send_announcement_email
+from app.utils.lazy import LazyModule
+from app.utils.pagination import keyset_page
+from app.utils.sql import upsert
+from .models import Announcement, FeedEntry, MailboxCounter
+
+np = LazyModule('numpy')  # imported by the first fan-out or acknowledgment
+
+FANOUT_BATCH = 1000  # feed entries per INSERT
+FEED_ORDER = (FeedEntry.created_at, FeedEntry.announcement_id)
+
+def _bump_counters(user_ids):
+    stmt = upsert(MailboxCounter)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={'announcements': MailboxCounter.announcements + 1})
+    db.session.execute(stmt, [{'user_id': user_id, 'unread': 0, 'announcements': 1}
+                              for user_id in user_ids])
+
+def post_announcement(team_id, author_id, title, content, notify=True):
+    """Post an announcement and write it into the feed of every team member.
+
+    The feed entries and unread counters of all members are written in
+    bulk in the same transaction, so reading a feed or the outstanding
+    acknowledgments later never has to join the team's members. Members
+    are e-mailed unless ``notify`` is false.
+    """
+    user_ids = list(dict.fromkeys(db.session.scalars(
+        select(TeamMember.user_id)
+        .where(TeamMember.team_id == team_id, TeamMember.user_id != author_id)
+        .order_by(TeamMember.id))))
+    announcement = Announcement(
+        team_id=team_id, author_id=author_id, title=title, content=content,
+        created_at=datetime.utcnow(), recipient_count=len(user_ids),
+        recipients=np.array(user_ids, dtype='<u4').tobytes(),
+        acknowledged=bytes((len(user_ids) + 7) // 8))
+    db.session.add(announcement)
+    db.session.flush()
+    for start in range(0, len(user_ids), FANOUT_BATCH):
+        batch = user_ids[start:start + FANOUT_BATCH]
+        db.session.execute(insert(FeedEntry), [
+            {'user_id': user_id, 'announcement_id': announcement.id, 'slot': slot,
+             'created_at': announcement.created_at}
+            for slot, user_id in enumerate(batch, start)])
+        _bump_counters(batch)
+
+    if notify and user_ids:
+        recipients = User.query.join(TeamMember, TeamMember.user_id == User.id) \
+            .filter(TeamMember.team_id == team_id, User.id != author_id).distinct()
+        send_announcement_email(announcement, recipients)
+    db.session.commit()
+    return announcement
+
+def acknowledge(user_id, announcement_id):
+    """Record that the user acknowledged an announcement.
+
+    Returns False if it was already acknowledged; raises LookupError if it
+    was not delivered to the user.
+    """
+    entry = db.session.get(FeedEntry, (user_id, announcement_id))
+    if entry is None:
+        raise LookupError(f'Announcement {announcement_id} was not sent to user {user_id}')
+    claimed = db.session.execute(
+        update(FeedEntry)
+        .where(FeedEntry.user_id == user_id, FeedEntry.announcement_id == announcement_id,
+               FeedEntry.acknowledged_at.is_(None))
+        .values(acknowledged_at=datetime.utcnow())
+        .execution_options(synchronize_session='fetch')).rowcount
+    if not claimed:
+        db.session.rollback()
+        return False
+
+    # The bitmap is rewritten whole, so concurrent acknowledgments queue on the row
+    announcement = Announcement.query.filter_by(id=announcement_id) \
+        .with_for_update().populate_existing().one()
+    bits = bytearray(announcement.acknowledged)
+    bits[entry.slot >> 3] |= 1 << (entry.slot & 7)
+    announcement.acknowledged = bytes(bits)
+    announcement.acknowledged_count += 1
+    # The counter row was created by the fan-out
+    db.session.execute(update(MailboxCounter).where(MailboxCounter.user_id == user_id)
+                       .values(announcements=MailboxCounter.announcements - 1))
+    db.session.commit()
+    return True
+
+def acknowledged_mask(announcement):
+    """Boolean array over the recipients, True where acknowledged."""
+    bits = np.frombuffer(announcement.acknowledged, dtype=np.uint8)
+    return np.unpackbits(bits, count=announcement.recipient_count,
+                         bitorder='little').astype(bool)
+
+def outstanding_user_ids(announcement):
+    """Ids of the recipients who have not acknowledged, in team order."""
+    recipients = np.frombuffer(announcement.recipients, dtype='<u4')
+    return recipients[~acknowledged_mask(announcement)].tolist()
+
+def unread_announcements(user_id):
+    counter = db.session.get(MailboxCounter, user_id)
+    return counter.announcements if counter is not None else 0
+
+def feed_page(user_id, cursor=None, limit=20, unread_only=False):
+    """The user's announcements, newest first, with the announcements loaded."""
+    query = FeedEntry.query.options(joinedload(FeedEntry.announcement)) \
+        .filter(FeedEntry.user_id == user_id)
+    if unread_only:
+        query = query.filter(FeedEntry.acknowledged_at.is_(None))
+    return keyset_page(query, FEED_ORDER, cursor, limit)
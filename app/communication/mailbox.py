@@ -0,0 +1,122 @@
+from datetime import datetime
+from sqlalchemy import case, exists, func, select, update
+from sqlalchemy.orm import joinedload
+from app import db
+from app.utils.pagination import keyset_page
+from app.utils.sql import upsert
+from .models import Conversation, ConversationMember, Message, MailboxCounter
+
+# Sort keys of the paginated listings; each matches the tail of an index
+MESSAGE_ORDER = (Message.created_at, Message.id)
+CONVERSATION_ORDER = (ConversationMember.last_message_at, ConversationMember.conversation_id)
+
+def _bump_members(message, recipient_unread):
+    stmt = upsert(ConversationMember)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['conversation_id', 'user_id'],
+        set_={'last_message_id': stmt.excluded.last_message_id,
+              'last_message_at': stmt.excluded.last_message_at,
+              'unread': ConversationMember.unread + stmt.excluded.unread})
+    rows = [{'conversation_id': message.conversation_id, 'user_id': user_id,
+             'last_message_id': message.id, 'last_message_at': message.created_at,
+             'unread': unread}
+            for user_id, unread in ((message.sender_id, 0),
+                                    (message.recipient_id, recipient_unread))]
+    if message.sender_id == message.recipient_id:
+        rows = rows[1:]
+    db.session.execute(stmt, rows)
+
+def _bump_counter(user_id, delta):
+    unread = MailboxCounter.unread + delta
+    stmt = upsert(MailboxCounter).values(user_id=user_id, unread=max(delta, 0))
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id'], set_={'unread': case((unread < 0, 0), else_=unread)}))
+
+def send_message(sender_id, recipient_id, body, conversation_id=None, subject=None):
+    """Store a message and update both participants' views in one transaction.
+
+    Without ``conversation_id`` a new conversation is started. Raises
+    LookupError when sender or recipient do not take part in ``conversation_id``.
+    """
+    if conversation_id is None:
+        conversation = Conversation(subject=subject)
+        db.session.add(conversation)
+        db.session.flush()
+        conversation_id = conversation.id
+    else:
+        participants = {sender_id, recipient_id}
+        members = db.session.scalar(
+            select(func.count()).select_from(ConversationMember)
+            .where(ConversationMember.conversation_id == conversation_id,
+                   ConversationMember.user_id.in_(participants)))
+        if members != len(participants):
+            raise LookupError(f'Not a conversation between users {sorted(participants)}')
+
+    message = Message(conversation_id=conversation_id, sender_id=sender_id,
+                      recipient_id=recipient_id, body=body, created_at=datetime.utcnow())
+    db.session.add(message)
+    db.session.flush()
+    unread = int(sender_id != recipient_id)
+    _bump_members(message, unread)
+    if unread:
+        _bump_counter(recipient_id, 1)
+    db.session.execute(update(Conversation).where(Conversation.id == conversation_id)
+                       .values(last_message_at=message.created_at))
+    db.session.commit()
+    return message
+
+def mark_read(user_id, conversation_id):
+    """Mark the user's unread messages in a conversation read; returns how many."""
+    now = datetime.utcnow()
+    count = db.session.execute(
+        update(Message)
+        .where(Message.conversation_id == conversation_id,
+               Message.recipient_id == user_id, Message.read_at.is_(None))
+        .values(read_at=now)
+        .execution_options(synchronize_session=False)).rowcount
+    if count:
+        db.session.execute(
+            update(ConversationMember)
+            .where(ConversationMember.conversation_id == conversation_id,
+                   ConversationMember.user_id == user_id)
+            .values(unread=0))
+        _bump_counter(user_id, -count)
+    db.session.commit()
+    return count
+
+def unread_count(user_id):
+    counter = db.session.get(MailboxCounter, user_id)
+    return counter.unread if counter is not None else 0
+
+def inbox_page(user_id, cursor=None, limit=20):
+    """Received messages, newest first, with their senders."""
+    query = Message.query.options(joinedload(Message.sender)).filter_by(recipient_id=user_id)
+    return keyset_page(query, MESSAGE_ORDER, cursor, limit)
+
+def sent_page(user_id, cursor=None, limit=20):
+    query = Message.query.options(joinedload(Message.recipient)).filter_by(sender_id=user_id)
+    return keyset_page(query, MESSAGE_ORDER, cursor, limit)
+
+def conversations_page(user_id, cursor=None, limit=20):
+    """The user's conversations, most recently active first.
+
+    Each row carries its subject, unread count and latest message with its
+    sender, all loaded by the same query.
+    """
+    query = ConversationMember.query.options(
+        joinedload(ConversationMember.conversation),
+        joinedload(ConversationMember.last_message).joinedload(Message.sender)) \
+        .filter_by(user_id=user_id)
+    return keyset_page(query, CONVERSATION_ORDER, cursor, limit)
+
+def conversation_page(user_id, conversation_id, cursor=None, limit=20):
+    """Messages of a conversation, newest first.
+
+    Membership is checked inside the same query, so a user who is not in
+    the conversation simply gets an empty page.
+    """
+    member = exists().where(ConversationMember.conversation_id == conversation_id,
+                            ConversationMember.user_id == user_id)
+    query = Message.query.options(joinedload(Message.sender)) \
+        .filter(Message.conversation_id == conversation_id, member)
+    return keyset_page(query, MESSAGE_ORDER, cursor, limit)
@@ -0,0 +1,142 @@
+from datetime import datetime
+from app import db
+
+class Conversation(db.Model):
+    """A thread of direct messages."""
+    __tablename__ = 'conversations'
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_message_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Conversation {self.id}>'
+
+class Message(db.Model):
+    __tablename__ = 'messages'
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), nullable=False)
+    sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    recipient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    read_at = db.Column(db.DateTime)
+
+    conversation = db.relationship('Conversation')
+
+    # Every listing is a keyset page over one of these, newest first
+    __table_args__ = (
+        db.Index('ix_messages_recipient_created', 'recipient_id', 'created_at', 'id'),
+        db.Index('ix_messages_sender_created', 'sender_id', 'created_at', 'id'),
+        db.Index('ix_messages_conversation_created', 'conversation_id', 'created_at', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'conversation_id': self.conversation_id,
+            'sender_id': self.sender_id,
+            'recipient_id': self.recipient_id,
+            'body': self.body,
+            'created_at': self.created_at.isoformat(),
+            'read': self.read_at is not None
+        }
+
+    def __repr__(self):
+        return f'<Message {self.id}>'
+
+class ConversationMember(db.Model):
+    """A participant's view of a conversation, kept current as messages arrive."""
+    __tablename__ = 'conversation_members'
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    last_message_id = db.Column(db.Integer, db.ForeignKey('messages.id'))
+    last_message_at = db.Column(db.DateTime, nullable=False)
+    unread = db.Column(db.Integer, nullable=False, default=0)
+
+    conversation = db.relationship('Conversation')
+    last_message = db.relationship('Message')
+
+    __table_args__ = (
+        db.Index('ix_conversation_members_user_last', 'user_id', 'last_message_at',
+                 'conversation_id'),
+    )
+
+    def to_dict(self):
+        return {
+            'conversation_id': self.conversation_id,
+            'subject': self.conversation.subject,
+            'unread': self.unread,
+            'last_message': self.last_message.to_dict() if self.last_message else None
+        }
+
+class MailboxCounter(db.Model):
+    """Unread messages and announcements of a user, for the navigation badges."""
+    __tablename__ = 'mailbox_counters'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    unread = db.Column(db.Integer, nullable=False, default=0)
+    announcements = db.Column(db.Integer, nullable=False, default=0)
+
+class Announcement(db.Model):
+    """A team announcement and who has acknowledged it.
+
+    ``recipients`` holds the user ids the announcement was delivered to as
+    packed uint32s; bit ``i`` of ``acknowledged`` is set once recipient
+    ``i`` acknowledged it.
+    """
+    __tablename__ = 'announcements'
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    recipient_count = db.Column(db.Integer, nullable=False, default=0)
+    acknowledged_count = db.Column(db.Integer, nullable=False, default=0)
+    recipients = db.deferred(db.Column(db.LargeBinary, nullable=False, default=b''))
+    acknowledged = db.Column(db.LargeBinary, nullable=False, default=b'')
+
+    team = db.relationship('Team')
+
+    __table_args__ = (
+        db.Index('ix_announcements_team_created', 'team_id', 'created_at', 'id'),
+    )
+
+    @property
+    def outstanding_count(self):
+        return self.recipient_count - self.acknowledged_count
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'team_id': self.team_id,
+            'author_id': self.author_id,
+            'title': self.title,
+            'content': self.content,
+            'created_at': self.created_at.isoformat(),
+            'recipients': self.recipient_count,
+            'acknowledged': self.acknowledged_count
+        }
+
+    def __repr__(self):
+        return f'<Announcement {self.id}>'
+
+class FeedEntry(db.Model):
+    """An announcement delivered to a user, written when it is posted."""
+    __tablename__ = 'feed_entries'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    announcement_id = db.Column(db.Integer, db.ForeignKey('announcements.id'), primary_key=True)
+    slot = db.Column(db.Integer, nullable=False)  # bit of the user in Announcement.acknowledged
+    created_at = db.Column(db.DateTime, nullable=False)
+    acknowledged_at = db.Column(db.DateTime)
+
+    announcement = db.relationship('Announcement')
+
+    __table_args__ = (
+        db.Index('ix_feed_entries_user_created', 'user_id', 'created_at', 'announcement_id'),
+    )
+
+    def to_dict(self):
+        return dict(self.announcement.to_dict(),
+                    acknowledged_at=self.acknowledged_at.isoformat()
+                    if self.acknowledged_at else None)
@@ -0,0 +1,188 @@
+from flask import render_template, jsonify, request, abort, current_app
+from flask_login import login_required, current_user
+
+from app import db
+from app.auth.models import User
+from app.utils.views import json_error, manages_team
+from . import communication
+from .feeds import (post_announcement, acknowledge, outstanding_user_ids, unread_announcements,
+                    feed_page)
+from .mailbox import (send_message, mark_read, unread_count, inbox_page, sent_page,
+                      conversations_page, conversation_page)
+from .models import Announcement, FeedEntry
+
+def _page_args():
+    limit = request.args.get('limit', current_app.config['MESSAGES_PER_PAGE'], type=int)
+    return request.args.get('cursor'), max(1, min(limit, current_app.config['MESSAGES_MAX_PAGE']))
+
+def _page_response(items, next_cursor):
+    return jsonify({'items': [item.to_dict() for item in items], 'next_cursor': next_cursor})
+
+@communication.route('/messages')
+@login_required
+def messages():
+    """The user's conversations, most recently active first."""
+    cursor, limit = _page_args()
+    try:
+        conversations, next_cursor = conversations_page(current_user.id, cursor, limit)
+    except ValueError:
+        abort(400)
+    return render_template('communication/messages.html', title='Messages',
+                           conversations=conversations, next_cursor=next_cursor,
+                           unread=unread_count(current_user.id))
+
+@communication.route('/messages/inbox')
+@login_required
+def inbox():
+    """Received messages, newest first; pass ``next_cursor`` back as ``cursor`` for more."""
+    try:
+        return _page_response(*inbox_page(current_user.id, *_page_args()))
+    except ValueError:
+        return json_error('Invalid cursor.', 400)
+
+@communication.route('/messages/sent')
+@login_required
+def sent():
+    try:
+        return _page_response(*sent_page(current_user.id, *_page_args()))
+    except ValueError:
+        return json_error('Invalid cursor.', 400)
+
+@communication.route('/messages/unread')
+@login_required
+def unread():
+    return jsonify({'unread': unread_count(current_user.id)})
+
+@communication.route('/conversations')
+@login_required
+def conversations():
+    try:
+        return _page_response(*conversations_page(current_user.id, *_page_args()))
+    except ValueError:
+        return json_error('Invalid cursor.', 400)
+
+@communication.route('/conversations/<int:conversation_id>')
+@login_required
+def conversation(conversation_id):
+    cursor, limit = _page_args()
+    try:
+        items, next_cursor = conversation_page(current_user.id, conversation_id, cursor, limit)
+    except ValueError:
+        return json_error('Invalid cursor.', 400)
+    # Conversations start with a message, so an empty first page means no access
+    if not items and not cursor:
+        abort(404)
+    return _page_response(items, next_cursor)
+
+@communication.route('/conversations/<int:conversation_id>/read', methods=['POST'])
+@login_required
+def read_conversation(conversation_id):
+    count = mark_read(current_user.id, conversation_id)
+    return jsonify({'marked': count, 'unread': unread_count(current_user.id)})
+
+@communication.route('/messages', methods=['POST'])
+@login_required
+def send():
+    """Send ``{"recipient_id", "body"}``, with ``conversation_id`` to reply in a thread."""
+    data = request.get_json(silent=True) or {}
+    body = str(data.get('body', '')).strip()
+    max_length = current_app.config['MESSAGE_MAX_LENGTH']
+    if not body or len(body) > max_length:
+        return json_error(f'Messages must be 1 to {max_length} characters.', 400)
+    try:
+        recipient_id = int(data['recipient_id'])
+        conversation_id = data.get('conversation_id')
+        conversation_id = int(conversation_id) if conversation_id is not None else None
+    except (KeyError, TypeError, ValueError):
+        return json_error('recipient_id is required.', 400)
+    if db.session.get(User, recipient_id) is None:
+        return json_error('Unknown recipient.', 404)
+    try:
+        message = send_message(current_user.id, recipient_id, body, conversation_id,
+                               subject=data.get('subject'))
+    except LookupError:
+        abort(404)
+    response = jsonify(message.to_dict())
+    response.status_code = 201
+    return response
+
+@communication.route('/announcements')
+@login_required
+def announcements():
+    """The user's announcement feed, newest first."""
+    cursor, limit = _page_args()
+    try:
+        entries, next_cursor = feed_page(current_user.id, cursor, limit)
+    except ValueError:
+        abort(400)
+    return render_template('communication/announcements.html', title='Announcements',
+                           entries=entries, next_cursor=next_cursor,
+                           unread=unread_announcements(current_user.id))
+
+@communication.route('/announcements/feed')
+@login_required
+def announcement_feed():
+    """The feed as JSON; ``unread=1`` leaves out acknowledged announcements."""
+    try:
+        return _page_response(*feed_page(current_user.id, *_page_args(),
+                                         unread_only=request.args.get('unread', type=int) == 1))
+    except ValueError:
+        return json_error('Invalid cursor.', 400)
+
+@communication.route('/announcements', methods=['POST'])
+@login_required
+def create_announcement():
+    """Post ``{"team_id", "title", "content"}`` to every member of the team."""
+    data = request.get_json(silent=True) or {}
+    title = str(data.get('title', '')).strip()
+    content = str(data.get('content', '')).strip()
+    try:
+        team_id = int(data['team_id'])
+    except (KeyError, TypeError, ValueError):
+        return json_error('team_id is required.', 400)
+    if not title or len(title) > 200 or not content:
+        return json_error('A title of at most 200 characters and content are required.', 400)
+    if not manages_team(team_id):
+        abort(403)
+    announcement = post_announcement(team_id, current_user.id, title, content,
+                                     notify=data.get('notify', True) is not False)
+    response = jsonify(announcement.to_dict())
+    response.status_code = 201
+    return response
+
+@communication.route('/announcements/<int:announcement_id>')
+@login_required
+def view_announcement(announcement_id):
+    """An announcement; whoever manages the team also sees who has not acknowledged it."""
+    announcement = db.get_or_404(Announcement, announcement_id)
+    entry = db.session.get(FeedEntry, (current_user.id, announcement_id))
+    manages = announcement.author_id == current_user.id or manages_team(announcement.team_id)
+    if entry is None and not manages:
+        abort(404)
+    outstanding = None
+    if manages:
+        outstanding = User.query.filter(User.id.in_(outstanding_user_ids(announcement))) \
+            .order_by(User.last_name, User.first_name).all()
+    return render_template('communication/announcement.html', title=announcement.title,
+                           announcement=announcement, entry=entry, outstanding=outstanding)
+
+@communication.route('/announcements/<int:announcement_id>/acknowledge', methods=['POST'])
+@login_required
+def acknowledge_announcement(announcement_id):
+    try:
+        acknowledged = acknowledge(current_user.id, announcement_id)
+    except LookupError:
+        abort(404)
+    return jsonify({'acknowledged': acknowledged,
+                    'unread': unread_announcements(current_user.id)})
+
+@communication.route('/announcements/<int:announcement_id>/outstanding')
+@login_required
+def outstanding_acknowledgments(announcement_id):
+    """Ids of the members who have not acknowledged the announcement yet."""
+    announcement = db.get_or_404(Announcement, announcement_id)
+    if announcement.author_id != current_user.id and not manages_team(announcement.team_id):
+        abort(403)
+    return jsonify({'outstanding': outstanding_user_ids(announcement),
+                    'recipients': announcement.recipient_count,
+                    'acknowledged': announcement.acknowledged_count})
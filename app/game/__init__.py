@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+game = Blueprint('game', __name__)
+
+from . import routes
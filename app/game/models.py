@@ -0,0 +1,31 @@
+from datetime import datetime
+from app import db
+
+class Game(db.Model):
+    __tablename__ = 'games'
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    opponent = db.Column(db.String(100), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    time = db.Column(db.Time, nullable=False)
+    location = db.Column(db.String(200))
+    duration = db.Column(db.Integer, nullable=False, default=120)  # minutes
+    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'))
+    court = db.Column(db.Integer)  # 1-based court number at the venue
+    opponent_team_id = db.Column(db.Integer, db.ForeignKey('teams.id'))  # club-internal games
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    team = db.relationship('Team', foreign_keys=[team_id])
+    opponent_team = db.relationship('Team', foreign_keys=[opponent_team_id])
+    venue = db.relationship('Venue')
+
+    __table_args__ = (
+        db.Index('ix_games_team_date', 'team_id', 'date', 'time'),
+        db.Index('ix_games_opponent_date', 'opponent_team_id', 'date', 'time'),
+        db.Index('ix_games_venue_date', 'venue_id', 'date', 'time'),
+        db.Index('ix_games_date', 'date', 'time'),
+    )
+
+    def __repr__(self):
+        return f'<Game {self.title}>'
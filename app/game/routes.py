@@ -0,0 +1,29 @@
+from datetime import date
+from flask import render_template
+from flask_login import login_required, current_user
+from sqlalchemy import or_, select
+from sqlalchemy.orm import joinedload
+
+from app.auth.models import TeamMember
+from app.utils.database import read_only
+from . import game
+from .models import Game
+
+@game.route('/')
+@read_only
+@login_required
+def list_games():
+    """Upcoming games of the user's teams."""
+    team_ids = select(TeamMember.team_id).where(TeamMember.user_id == current_user.id)
+    games = Game.query.options(joinedload(Game.team)) \
+        .filter(or_(Game.team_id.in_(team_ids), Game.opponent_team_id.in_(team_ids)),
+                Game.date >= date.today()) \
+        .order_by(Game.date, Game.time).all()
+    return render_template('game/list.html', title='Games', games=games)
+
+@game.route('/<int:game_id>')
+@read_only
+@login_required
+def view_game(game_id):
+    game_ = Game.query.options(joinedload(Game.team)).filter_by(id=game_id).first_or_404()
+    return render_template('game/view.html', title=game_.title, game=game_)
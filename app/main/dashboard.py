@@ -0,0 +1,80 @@
+from datetime import date
+from sqlalchemy import event, func, or_, select
+from sqlalchemy.orm import aliased, object_session
+from app import db
+from app.auth.models import TeamMember
+from app.communication.models import Announcement
+from app.game.models import Game
+from app.practice.models import Practice
+from app.team.models import Team
+from app.utils.cache import TTLCache, invalidate_on_commit
+
+UPCOMING_LIMIT = 5  # games and practices shown
+RECENT_LIMIT = 5  # announcements shown
+
+dashboard_cache = TTLCache('dashboard', maxsize=4096, ttl=30)
+
+def get_dashboard(user_id):
+    """Return the dashboard of a user, served from cache when possible.
+
+    Games, practices and announcements added meanwhile show up once the
+    entry expires after ``DASHBOARD_CACHE_TTL`` seconds; joining or leaving
+    a team refreshes it on commit.
+    """
+    return dashboard_cache.get_or_set(user_id, lambda: load_dashboard(user_id))
+
+def load_dashboard(user_id):
+    """Gather a user's teams, next games and practices and recent announcements.
+
+    Takes four queries however many teams the user is on, one when on
+    none. Rows come back as plain dicts, so the result can be cached and
+    shared between workers.
+    """
+    teammate = aliased(TeamMember)
+    member_count = select(func.count(teammate.id)) \
+        .where(teammate.team_id == Team.id).scalar_subquery()
+    memberships = [
+        {'role': role, 'team': {'id': team_id, 'name': name, 'member_count': count}}
+        for role, team_id, name, count in db.session.execute(
+            select(TeamMember.role, Team.id, Team.name, member_count)
+            .join(Team, Team.id == TeamMember.team_id)
+            .where(TeamMember.user_id == user_id)
+            .order_by(Team.name))
+    ]
+    dashboard = {'user_teams': memberships, 'upcoming_games': [],
+                 'upcoming_practices': [], 'recent_announcements': []}
+    if not memberships:
+        return dashboard
+
+    teams = {membership['team']['id']: membership['team'] for membership in memberships}
+    today = date.today()
+    for key, model, columns, involved in (
+            ('upcoming_games', Game, ('opponent',),
+             or_(Game.team_id.in_(teams), Game.opponent_team_id.in_(teams))),
+            ('upcoming_practices', Practice, (), Practice.team_id.in_(teams))):
+        # Club-internal games are stored once, under the home team
+        rows = db.session.execute(
+            select(model.id, model.team_id, Team.name.label('team_name'), model.title,
+                   model.date, model.time, model.location,
+                   *[getattr(model, c) for c in columns])
+            .join(Team, Team.id == model.team_id)
+            .where(involved, model.date >= today)
+            .order_by(model.date, model.time).limit(UPCOMING_LIMIT))
+        dashboard[key] = [
+            dict(row._mapping, team=teams.get(row.team_id) or
+                 {'id': row.team_id, 'name': row.team_name})
+            for row in rows]
+
+    rows = db.session.execute(
+        select(Announcement.id, Announcement.team_id, Announcement.title,
+               Announcement.content, Announcement.created_at)
+        .where(Announcement.team_id.in_(teams))
+        .order_by(Announcement.created_at.desc()).limit(RECENT_LIMIT))
+    dashboard['recent_announcements'] = [dict(row._mapping, team=teams[row.team_id])
+                                         for row in rows]
+    return dashboard
+
+@event.listens_for(TeamMember, 'after_insert')
+@event.listens_for(TeamMember, 'after_delete')
+def _membership_changed(mapper, connection, target):
+    invalidate_on_commit(object_session(target), dashboard_cache, target.user_id)
@@ -0,0 +1,44 @@
+from flask import current_app
+from sqlalchemy import text
+from app import db
+from app.utils.lazy import LazyModule
+from app.utils.mail_queue import mail_queue
+
+redis = LazyModule('redis')  # optional; only used when the caches have a client
+
+def check_health():
+    """Run the readiness checks; returns ``(healthy, report)``.
+
+    The database is required. Redis and the mail queue only degrade the
+    report: the app keeps serving with process-local caches, and a
+    backed-up queue delays mail without failing requests.
+    """
+    checks = {}
+    healthy = True
+    try:
+        db.session.execute(text('SELECT 1'))
+        checks['database'] = 'ok'
+    except Exception as e:
+        db.session.rollback()
+        checks['database'] = f'error: {e.__class__.__name__}'
+        healthy = False
+
+    # The caches' client, so a probe does not open a connection of its own
+    client = current_app.extensions.get('redis')
+    if client is not None:
+        try:
+            client.ping()
+            checks['redis'] = 'ok'
+        except redis.RedisError as e:
+            checks['redis'] = f'error: {e.__class__.__name__}'
+
+    if healthy:
+        depth = mail_queue.depth()
+        checks['mail_queue'] = {'depth': depth}
+        if depth > current_app.config['HEALTH_MAIL_QUEUE_LIMIT']:
+            checks['mail_queue']['status'] = 'backlogged'
+
+    degraded = any(isinstance(v, str) and v != 'ok' for v in checks.values()) or \
+        'status' in checks.get('mail_queue', {})
+    status = 'fail' if not healthy else 'degraded' if degraded else 'ok'
+    return healthy, {'status': status, 'checks': checks}
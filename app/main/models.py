@@ -0,0 +1,12 @@
+from datetime import datetime
+from app import db
+
+class SiteStat(db.Model):
+    """Materialized site-wide counter shown on the landing page."""
+    __tablename__ = 'site_stats'
+    name = db.Column(db.String(32), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SiteStat {self.name}={self.value}>'
@@ -1,31 +1,24 @@
-from flask import render_template, redirect, url_for
+from flask import render_template, redirect, url_for, jsonify, abort
+from prometheus_client import CONTENT_TYPE_LATEST
 from flask_login import current_user, login_required
 from . import main
-from app.auth.models import User, Role
 from app import db
+from app.utils.database import read_only
+from app.utils.hashing import HashingBusy
+from app.utils.metrics import metrics
+from .dashboard import get_dashboard
+from .health import check_health
+from .stats import get_site_stats
 
 @main.route('/')
+@read_only
 def index():
     """Home page route."""
-    stats = {
-        'total_users': User.query.count(),
-        'total_teams': db.session.query(db.func.count(db.distinct(User.teams))).scalar(),
-        'total_coaches': User.query.join(Role).filter(Role.name == 'coach').count(),
-        'total_players': User.query.join(Role).filter(Role.name == 'player').count()
-    }
+    stats = get_site_stats()
     
     if current_user.is_authenticated:
-        user_teams = current_user.teams
-        upcoming_games = []  # Will be implemented with Game model
-        upcoming_practices = []  # Will be implemented with Practice model
-        recent_announcements = []  # Will be implemented with Announcement model
-        
-        return render_template('main/dashboard.html',
-                             stats=stats,
-                             user_teams=user_teams,
-                             upcoming_games=upcoming_games,
-                             upcoming_practices=upcoming_practices,
-                             recent_announcements=recent_announcements)
+        return render_template('main/dashboard.html', stats=stats,
+                               **get_dashboard(current_user.id))
     
     return render_template('main/index.html', stats=stats)
 
@@ -55,6 +48,21 @@ def terms():
     """Terms of service page route."""
     return render_template('main/terms.html')
 
+@main.route('/health')
+def health():
+    """Readiness check for load balancers and container health checks."""
+    healthy, report = check_health()
+    response = jsonify(report)
+    response.status_code = 200 if healthy else 503
+    return response
+
+@main.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint; keep it off the public network."""
+    if not metrics.enabled:
+        abort(404)
+    return metrics.render(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
 @main.app_errorhandler(404)
 def not_found_error(error):
     """404 error handler."""
@@ -70,3 +78,8 @@ def internal_error(error):
 def forbidden_error(error):
     """403 error handler."""
     return render_template('errors/403.html'), 403
+
+@main.app_errorhandler(HashingBusy)
+def service_unavailable_error(error):
+    """503 handler for requests shed while the password hasher is saturated."""
+    return render_template('errors/503.html'), 503, {'Retry-After': str(error.retry_after)}
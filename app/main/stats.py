@@ -0,0 +1,159 @@
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, func, distinct, select
+from sqlalchemy.orm import object_session
+from app import db
+from app.auth.models import User, Role, TeamMember
+from app.utils.cache import TTLCache, invalidate_on_commit
+from .models import SiteStat
+
+STAT_NAMES = ('total_users', 'total_teams', 'total_coaches', 'total_players')
+
+# Role name -> counter maintained for users holding that role
+ROLE_COUNTERS = {
+    'coach': 'total_coaches',
+    'player': 'total_players'
+}
+
+stats_cache = TTLCache('site_stats', maxsize=1, ttl=60)
+
+def get_site_stats():
+    """Return the landing page counters, served from cache when possible."""
+    return stats_cache.get_or_set('site', _load_site_stats)
+
+def invalidate_site_stats():
+    stats_cache.delete('site')
+
+def count_site_stats():
+    """Every counter counted from the source tables, without storing anything."""
+    values = dict.fromkeys(STAT_NAMES, 0)
+    values['total_users'] = db.session.query(func.count(User.id)).scalar()
+    values['total_teams'] = db.session.query(
+        func.count(distinct(TeamMember.team_id))).scalar()
+
+    role_counts = db.session.query(Role.name, func.count(User.id)) \
+        .join(User, User.role_id == Role.id) \
+        .filter(Role.name.in_(ROLE_COUNTERS)) \
+        .group_by(Role.name)
+    for role_name, count in role_counts:
+        values[ROLE_COUNTERS[role_name]] = count
+    return values
+
+def recompute_site_stats():
+    """Rebuild every counter from the source tables and store the result."""
+    values = count_site_stats()
+    now = datetime.utcnow()
+    for name, value in values.items():
+        stat = db.session.get(SiteStat, name) or SiteStat(name=name)
+        stat.value = value
+        stat.computed_at = now
+        db.session.add(stat)
+    db.session.commit()
+    invalidate_site_stats()
+    return values
+
+_recount_lock = threading.Lock()
+
+def _recompute_in_background():
+    """Start one recount in this process unless one is running.
+
+    Under TESTING the recount runs inline and its values are returned;
+    otherwise this returns None right away.
+    """
+    if current_app.testing:
+        return recompute_site_stats()
+    if not _recount_lock.acquire(blocking=False):
+        return None
+    app = current_app._get_current_object()
+
+    def recount():
+        try:
+            with app.app_context():
+                recompute_site_stats()
+        except Exception:
+            app.logger.exception('Recounting the site statistics failed')
+        finally:
+            _recount_lock.release()
+
+    threading.Thread(target=recount, daemon=True, name='site-stats-recount').start()
+    return None
+
+def _load_site_stats():
+    rows = SiteStat.query.all()
+    values = {row.name: row.value for row in rows}
+    interval = timedelta(seconds=current_app.config['STATS_RECOMPUTE_INTERVAL'])
+    stale_before = datetime.utcnow() - interval
+    if len(rows) == len(STAT_NAMES) and all(r.computed_at >= stale_before for r in rows):
+        return values
+    # The counters are kept up to date as users and members change, so a
+    # stale set is still served while one recount per process, off the
+    # request (which may be on a read replica), corrects any drift. Only
+    # before the first recount are the counts taken here, read-only.
+    recounted = _recompute_in_background()
+    if recounted is not None:
+        return recounted
+    return values if len(rows) == len(STAT_NAMES) else count_site_stats()
+
+def _adjust(connection, name, delta):
+    connection.execute(
+        SiteStat.__table__.update()
+        .where(SiteStat.name == name)
+        .values(value=SiteStat.value + delta)
+    )
+
+def _role_counter(connection, role_id):
+    if role_id is None:
+        return None
+    role_name = connection.execute(
+        select(Role.name).where(Role.id == role_id)).scalar()
+    return ROLE_COUNTERS.get(role_name)
+
+def _changed(target):
+    invalidate_on_commit(object_session(target), stats_cache, 'site')
+
+@event.listens_for(User, 'after_insert')
+def _user_inserted(mapper, connection, target):
+    _adjust(connection, 'total_users', 1)
+    counter = _role_counter(connection, target.role_id)
+    if counter:
+        _adjust(connection, counter, 1)
+    _changed(target)
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    _adjust(connection, 'total_users', -1)
+    counter = _role_counter(connection, target.role_id)
+    if counter:
+        _adjust(connection, counter, -1)
+    _changed(target)
+
+@event.listens_for(User, 'before_update')
+def _user_updated(mapper, connection, target):
+    if not db.inspect(target).attrs.role_id.history.has_changes():
+        return
+    # The previous role_id may have been expired, so read it from the row
+    # before this flush overwrites it.
+    old_role_id = connection.execute(
+        select(User.role_id).where(User.id == target.id)).scalar()
+    old_counter = _role_counter(connection, old_role_id)
+    new_counter = _role_counter(connection, target.role_id)
+    if old_counter != new_counter:
+        if old_counter:
+            _adjust(connection, old_counter, -1)
+        if new_counter:
+            _adjust(connection, new_counter, 1)
+        _changed(target)
+
+@event.listens_for(TeamMember, 'after_insert')
+@event.listens_for(TeamMember, 'after_delete')
+def _membership_changed(mapper, connection, target):
+    # A distinct count cannot be adjusted by +/-1 without knowing whether
+    # the team already had members, so refresh it with one indexed count.
+    connection.execute(
+        SiteStat.__table__.update()
+        .where(SiteStat.name == 'total_teams')
+        .values(value=select(func.count(distinct(TeamMember.team_id)))
+                .scalar_subquery())
+    )
+    _changed(target)
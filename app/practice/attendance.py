@@ -0,0 +1,135 @@
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.auth.models import TeamMember
+from app.utils.lazy import LazyModule
+from app.utils.sql import upsert
+from .models import Attendance, Roster
+
+np = LazyModule('numpy')  # imported when attendance is first taken or read
+
+def _unpack(data, count):
+    """Bitset bytes as a boolean array of ``count`` slots (bit ``i`` is slot ``i``)."""
+    bits = np.frombuffer(data, dtype=np.uint8)
+    return np.unpackbits(bits, count=count, bitorder='little').astype(bool) if count else \
+        np.zeros(0, dtype=bool)
+
+def _pack(mask):
+    return np.packbits(mask, bitorder='little').tobytes()
+
+def roster_slots(roster):
+    """User ids of every slot of a roster version, active or not."""
+    return np.frombuffer(roster.user_ids, dtype='<u4')
+
+def current_roster(team_id):
+    return Roster.query.filter_by(team_id=team_id).order_by(Roster.version.desc()).first()
+
+def sync_roster(team_id):
+    """The team's current roster version, creating a new one if its players changed.
+
+    New players are appended to the slots of the previous version and
+    players who left keep their slot with the active bit cleared, so
+    bitsets of different versions line up slot by slot.
+    """
+    players = list(dict.fromkeys(db.session.scalars(
+        select(TeamMember.user_id)
+        .where(TeamMember.team_id == team_id, TeamMember.role == 'player')
+        .order_by(TeamMember.id))))
+    latest = current_roster(team_id)
+    slots = roster_slots(latest).tolist() if latest is not None else []
+    if latest is not None and \
+            set(np.array(slots)[_unpack(latest.active, latest.size)].tolist()) == set(players):
+        return latest
+    known = set(slots)
+    slots.extend(user_id for user_id in players if user_id not in known)
+    on_team = set(players)
+    roster = Roster(team_id=team_id, version=latest.version + 1 if latest is not None else 1,
+                    size=len(slots), user_ids=np.array(slots, dtype='<u4').tobytes(),
+                    active=_pack(np.array([user_id in on_team for user_id in slots], dtype=bool)))
+    db.session.add(roster)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request created the same version first
+        db.session.rollback()
+        return current_roster(team_id)
+    return roster
+
+def record_attendance(practice, present=None, absent=None, recorded_by=None, season=None):
+    """Take attendance for a whole practice in one write.
+
+    Pass the user ids who came as ``present``, or who did not as
+    ``absent`` (everyone else on the roster came). Taking attendance again
+    replaces the earlier record. Raises ValueError for players who are
+    not on the team's roster.
+    """
+    if (present is None) == (absent is None):
+        raise ValueError('Pass either present or absent.')
+    roster = sync_roster(practice.team_id)
+    slots = roster_slots(roster)
+    active = _unpack(roster.active, roster.size)
+    given = np.array(sorted(set(present if present is not None else absent)), dtype=np.int64)
+    marked = np.isin(slots, given) & active
+    if marked.sum() != len(given):
+        unknown = sorted(set(given.tolist()) - set(slots[active].tolist()))
+        raise ValueError(f'Not on the roster of team {practice.team_id}: {unknown}')
+    mask = marked if present is not None else active & ~marked
+    values = {
+        'practice_id': practice.id, 'team_id': practice.team_id,
+        'season': season or current_app.config['CURRENT_SEASON'], 'roster_id': roster.id,
+        'present': _pack(mask), 'present_count': int(mask.sum()),
+        'recorded_by': recorded_by, 'recorded_at': datetime.utcnow(),
+    }
+    stmt = upsert(Attendance).values(values)
+    excluded = stmt.excluded  # built anew on every access
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['practice_id'],
+        set_={name: excluded[name] for name in values if name != 'practice_id'}))
+    db.session.commit()
+    return db.session.get(Attendance, practice.id, populate_existing=True)
+
+def attendees(attendance):
+    """``(present user ids, absent user ids)`` of one practice."""
+    roster = attendance.roster
+    slots = roster_slots(roster)
+    active = _unpack(roster.active, roster.size)
+    present = _unpack(attendance.present, roster.size)
+    return slots[present].tolist(), slots[active & ~present].tolist()
+
+def attendance_rates(team_id, season):
+    """Attendance of a team and each of its players over a season.
+
+    Every practice's bitset and the active bits of the roster version it
+    was taken against are stacked into two session x slot matrices, so the
+    counts for all players come from two column sums (a vectorized
+    popcount) instead of one row per player per practice. A player only
+    counts the practices they were on the roster for.
+    """
+    rows = db.session.execute(
+        select(Attendance.present, Roster.active, Roster.size, Roster.user_ids)
+        .join(Roster, Roster.id == Attendance.roster_id)
+        .where(Attendance.team_id == team_id, Attendance.season == season)).all()
+    if not rows:
+        return {'team_id': team_id, 'season': season, 'sessions': 0, 'rate': None, 'players': []}
+
+    # Slots are append-only, so the widest version names every slot in use
+    widest = max(rows, key=lambda row: row.size)
+    width, nbytes = widest.size, (widest.size + 7) // 8
+
+    def stack(column):
+        data = b''.join(row[column].ljust(nbytes, b'\0') for row in rows)
+        return np.unpackbits(np.frombuffer(data, dtype=np.uint8).reshape(len(rows), nbytes),
+                             axis=1, count=width, bitorder='little')
+
+    present, active = stack(0), stack(1)
+    attended = present.sum(axis=0, dtype=np.int64)
+    eligible = active.sum(axis=0, dtype=np.int64)
+    slots = np.frombuffer(widest.user_ids, dtype='<u4')
+    players = [{'user_id': int(slots[i]), 'attended': int(attended[i]),
+                'sessions': int(eligible[i]), 'rate': float(attended[i] / eligible[i])}
+               for i in np.flatnonzero(eligible)]
+    total = int(eligible.sum())
+    return {'team_id': team_id, 'season': season, 'sessions': len(rows),
+            'rate': float(attended.sum() / total) if total else None, 'players': players}
@@ -0,0 +1,192 @@
+from collections import defaultdict, namedtuple
+from datetime import date, timedelta
+from flask import current_app
+from sqlalchemy import and_, insert, or_, select
+from app import db
+from .models import Practice, PracticeSeries, PracticeException
+from .recurrence import Recurrence
+
+_FIELDS = 'date time duration team_id title location practice_id series_id occurrence_date'
+
+class Occurrence(namedtuple('Occurrence', _FIELDS)):
+    """One practice on a calendar; ``practice_id`` is None until it is materialized."""
+    __slots__ = ()
+
+    def to_dict(self):
+        return {
+            'id': self.practice_id,
+            'series_id': self.series_id,
+            'occurrence_date': self.occurrence_date.isoformat() if self.occurrence_date else None,
+            'team_id': self.team_id,
+            'title': self.title,
+            'date': self.date.isoformat(),
+            'time': self.time.strftime('%H:%M'),
+            'duration': self.duration,
+            'location': self.location,
+        }
+
+def _order(occurrence):
+    return occurrence.date, occurrence.time, occurrence.team_id
+
+def _occurrence(series, day, exception=None):
+    """The occurrence of ``series`` on ``day`` with ``exception`` applied, or None if cancelled."""
+    if exception is None:
+        return Occurrence(day, series.time, series.duration, series.team_id, series.title,
+                          series.location, None, series.id, day)
+    if exception.cancelled:
+        return None
+    return Occurrence(exception.date or day, exception.time or series.time, series.duration,
+                      series.team_id, series.title, exception.location or series.location,
+                      None, series.id, day)
+
+def _practice_row(series, occurrence, exception=None):
+    return {
+        'team_id': series.team_id, 'title': series.title, 'date': occurrence.date,
+        'time': occurrence.time, 'location': occurrence.location, 'duration': series.duration,
+        'venue_id': series.venue_id, 'court': series.court,
+        'notes': exception.notes if exception is not None and exception.notes else series.notes,
+        'series_id': series.id, 'occurrence_date': occurrence.occurrence_date,
+    }
+
+def create_series(team_id, title, starts_on, time, rule, **fields):
+    """Create a recurring practice and materialize its first weeks.
+
+    ``rule`` is an RRULE string; ValueError is raised if it cannot be used.
+    """
+    recurrence = Recurrence.parse(rule, starts_on)
+    series = PracticeSeries(team_id=team_id, title=title, starts_on=starts_on, time=time,
+                            rule=str(recurrence), ends_on=recurrence.last(), **fields)
+    db.session.add(series)
+    db.session.commit()
+    materialize(series_ids=[series.id])
+    return series
+
+def materialize(today=None, series_ids=None):
+    """Store the occurrences of the next ``PRACTICE_WINDOW_WEEKS`` weeks as Practice rows.
+
+    Each series remembers how far it has been materialized, so a run only
+    inserts the days that entered the window since the last one (with
+    their exceptions applied). Run it daily (``flask materialize-practices``);
+    the unique (series, occurrence date) constraint makes an overlapping
+    run fail instead of doubling practices. Returns the number of rows
+    inserted.
+    """
+    today = today or date.today()
+    horizon = today + timedelta(weeks=current_app.config['PRACTICE_WINDOW_WEEKS'])
+    behind = and_(
+        or_(PracticeSeries.materialized_through.is_(None),
+            PracticeSeries.materialized_through < horizon),
+        or_(PracticeSeries.ends_on.is_(None), PracticeSeries.materialized_through.is_(None),
+            PracticeSeries.ends_on > PracticeSeries.materialized_through),
+        PracticeSeries.starts_on <= horizon)
+    if series_ids is not None:
+        behind = and_(behind, PracticeSeries.id.in_(series_ids))
+    pending = PracticeSeries.query.filter(behind).all()
+    if not pending:
+        return 0
+
+    exceptions = {}
+    for exception in PracticeException.query.join(PracticeSeries).filter(
+            behind, PracticeException.occurrence_date <= horizon):
+        exceptions[exception.series_id, exception.occurrence_date] = exception
+    rows = []
+    for series in pending:
+        first = series.materialized_through + timedelta(days=1) \
+            if series.materialized_through else series.starts_on
+        through = min(horizon, series.ends_on) if series.ends_on else horizon
+        for day in series.recurrence.between(first, through):
+            exception = exceptions.get((series.id, day))
+            occurrence = _occurrence(series, day, exception)
+            if occurrence is not None:
+                rows.append(_practice_row(series, occurrence, exception))
+        series.materialized_through = through
+    if rows:
+        db.session.execute(insert(Practice), rows)
+    db.session.commit()
+    return len(rows)
+
+def calendar(team_ids, start, end):
+    """Practices of ``team_ids`` from ``start`` through ``end``, stored and upcoming, in order.
+
+    Stored practices come from a range scan of the (team, date) index.
+    Occurrences past a series' materialized window are generated from its
+    rule, starting at ``start`` rather than at the beginning of the series,
+    with their exceptions applied.
+    """
+    occurrences = [
+        Occurrence(*row) for row in db.session.execute(
+            select(Practice.date, Practice.time, Practice.duration, Practice.team_id,
+                   Practice.title, Practice.location, Practice.id, Practice.series_id,
+                   Practice.occurrence_date)
+            .where(Practice.team_id.in_(team_ids), Practice.date >= start, Practice.date <= end))]
+
+    # Exceptions can move an occurrence into the range from a day outside it
+    moved_in = select(PracticeException.series_id).where(
+        PracticeException.date >= start, PracticeException.date <= end)
+    series = PracticeSeries.query.filter(
+        PracticeSeries.team_id.in_(team_ids),
+        or_(and_(or_(PracticeSeries.materialized_through.is_(None),
+                     PracticeSeries.materialized_through < end),
+                 PracticeSeries.starts_on <= end,
+                 or_(PracticeSeries.ends_on.is_(None), PracticeSeries.ends_on >= start)),
+            PracticeSeries.id.in_(moved_in))).all()
+    if not series:
+        return sorted(occurrences, key=_order)
+
+    exceptions = defaultdict(dict)
+    for exception in PracticeException.query.filter(
+            PracticeException.series_id.in_([s.id for s in series]),
+            or_(and_(PracticeException.occurrence_date >= start,
+                     PracticeException.occurrence_date <= end),
+                and_(PracticeException.date >= start, PracticeException.date <= end))):
+        exceptions[exception.series_id][exception.occurrence_date] = exception
+    for s in series:
+        first = max(start, s.materialized_through + timedelta(days=1)) \
+            if s.materialized_through else start
+        changed = exceptions[s.id]
+        for day in s.recurrence.between(first, end):
+            occurrence = _occurrence(s, day, changed.get(day))
+            if occurrence is not None and start <= occurrence.date <= end:
+                occurrences.append(occurrence)
+        for day, exception in changed.items():
+            # Moved here from a day outside the range that is not materialized either
+            if first <= day <= end or (s.materialized_through and day <= s.materialized_through):
+                continue
+            if not exception.cancelled and exception.date and start <= exception.date <= end:
+                occurrences.append(_occurrence(s, day, exception))
+    return sorted(occurrences, key=_order)
+
+def change_occurrence(series, occurrence_date, cancelled=False, date=None, time=None,
+                      location=None, notes=None):
+    """Cancel, move or edit one occurrence of a series.
+
+    The change is kept as a PracticeException, so it also applies when the
+    occurrence is materialized later; a practice that is already stored is
+    updated (or deleted when cancelled) right away. Raises ValueError if
+    the series has no occurrence on ``occurrence_date``.
+    """
+    if next(series.recurrence.between(occurrence_date, occurrence_date), None) is None:
+        raise ValueError(f'{series.title} does not take place on {occurrence_date}.')
+    exception = PracticeException.query.filter_by(
+        series_id=series.id, occurrence_date=occurrence_date).first()
+    if exception is None:
+        exception = PracticeException(series_id=series.id, occurrence_date=occurrence_date)
+        db.session.add(exception)
+    exception.cancelled = cancelled
+    exception.date, exception.time = date, time
+    exception.location, exception.notes = location, notes
+
+    if series.materialized_through and occurrence_date <= series.materialized_through:
+        practice = Practice.query.filter_by(series_id=series.id,
+                                            occurrence_date=occurrence_date).first()
+        occurrence = _occurrence(series, occurrence_date, exception)
+        if occurrence is None:
+            if practice is not None:
+                db.session.delete(practice)
+        elif practice is None:
+            db.session.add(Practice(**_practice_row(series, occurrence, exception)))
+        else:
+            for name, value in _practice_row(series, occurrence, exception).items():
+                setattr(practice, name, value)
+    db.session.commit()
+    return exception
@@ -0,0 +1,140 @@
+from datetime import datetime
+from app import db
+from .recurrence import Recurrence
+
+class Practice(db.Model):
+    __tablename__ = 'practices'
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    time = db.Column(db.Time, nullable=False)
+    location = db.Column(db.String(200))
+    duration = db.Column(db.Integer, nullable=False, default=90)  # minutes
+    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'))
+    court = db.Column(db.Integer)  # 1-based court number at the venue
+    notes = db.Column(db.Text)
+    series_id = db.Column(db.Integer, db.ForeignKey('practice_series.id'))
+    occurrence_date = db.Column(db.Date)  # the date the series' rule gives, before any move
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    team = db.relationship('Team')
+    venue = db.relationship('Venue')
+    series = db.relationship('PracticeSeries', back_populates='practices')
+
+    __table_args__ = (
+        db.UniqueConstraint('series_id', 'occurrence_date', name='uq_practices_series_occurrence'),
+        db.Index('ix_practices_team_date', 'team_id', 'date', 'time'),
+        db.Index('ix_practices_venue_date', 'venue_id', 'date', 'time'),
+        db.Index('ix_practices_date', 'date', 'time'),
+    )
+
+    def __repr__(self):
+        return f'<Practice {self.title}>'
+
+class PracticeSeries(db.Model):
+    """A recurring practice, e.g. Monday and Wednesday at 6pm for the season.
+
+    Occurrences up to ``materialized_through`` exist as Practice rows (see
+    ``app.practice.calendar.materialize``); later ones are generated from
+    ``rule`` when a calendar asks for them.
+    """
+    __tablename__ = 'practice_series'
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    rule = db.Column(db.String(200), nullable=False)  # RRULE, e.g. FREQ=WEEKLY;BYDAY=MO,WE
+    starts_on = db.Column(db.Date, nullable=False)
+    ends_on = db.Column(db.Date)  # last occurrence; None for an open-ended rule
+    time = db.Column(db.Time, nullable=False)
+    duration = db.Column(db.Integer, nullable=False, default=90)  # minutes
+    location = db.Column(db.String(200))
+    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'))
+    court = db.Column(db.Integer)
+    notes = db.Column(db.Text)
+    materialized_through = db.Column(db.Date)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    team = db.relationship('Team')
+    practices = db.relationship('Practice', back_populates='series')
+    exceptions = db.relationship('PracticeException', back_populates='series',
+                                 cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.Index('ix_practice_series_team_dates', 'team_id', 'starts_on', 'ends_on'),
+        db.Index('ix_practice_series_materialized', 'materialized_through'),
+    )
+
+    @property
+    def recurrence(self):
+        return Recurrence.parse(self.rule, self.starts_on)
+
+    def __repr__(self):
+        return f'<PracticeSeries {self.title} {self.rule}>'
+
+class PracticeException(db.Model):
+    """A change to one occurrence of a series: cancelled, or moved and/or edited."""
+    __tablename__ = 'practice_exceptions'
+    id = db.Column(db.Integer, primary_key=True)
+    series_id = db.Column(db.Integer, db.ForeignKey('practice_series.id'), nullable=False)
+    occurrence_date = db.Column(db.Date, nullable=False)
+    cancelled = db.Column(db.Boolean, nullable=False, default=False)
+    # Overrides; None keeps the series' value
+    date = db.Column(db.Date)
+    time = db.Column(db.Time)
+    location = db.Column(db.String(200))
+    notes = db.Column(db.Text)
+
+    series = db.relationship('PracticeSeries', back_populates='exceptions')
+
+    __table_args__ = (
+        db.UniqueConstraint('series_id', 'occurrence_date', name='uq_practice_exceptions_occurrence'),
+        db.Index('ix_practice_exceptions_moved', 'series_id', 'date'),
+    )
+
+    def __repr__(self):
+        return f'<PracticeException {self.series_id} {self.occurrence_date}>'
+
+class Roster(db.Model):
+    """One version of a team's player roster, which attendance bitsets refer to.
+
+    ``user_ids`` holds the players as packed uint32s, one per slot. Slots
+    are never reused, so a player keeps the same slot in every later
+    version; bit ``i`` of ``active`` is set while slot ``i`` is on the team.
+    """
+    __tablename__ = 'rosters'
+    id = db.Column(db.Integer, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    size = db.Column(db.Integer, nullable=False, default=0)  # slots, active or not
+    user_ids = db.Column(db.LargeBinary, nullable=False, default=b'')
+    active = db.Column(db.LargeBinary, nullable=False, default=b'')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('team_id', 'version', name='uq_rosters_team_version'),
+    )
+
+    def __repr__(self):
+        return f'<Roster team={self.team_id} v{self.version}>'
+
+class Attendance(db.Model):
+    """Who came to one practice: bit ``i`` of ``present`` is roster slot ``i``."""
+    __tablename__ = 'practice_attendance'
+    practice_id = db.Column(db.Integer, db.ForeignKey('practices.id'), primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+    season = db.Column(db.String(16), nullable=False)
+    roster_id = db.Column(db.Integer, db.ForeignKey('rosters.id'), nullable=False)
+    present = db.Column(db.LargeBinary, nullable=False)
+    present_count = db.Column(db.Integer, nullable=False, default=0)
+    recorded_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    roster = db.relationship('Roster')
+
+    __table_args__ = (
+        db.Index('ix_practice_attendance_team_season', 'team_id', 'season'),
+    )
+
+    def __repr__(self):
+        return f'<Attendance practice={self.practice_id} {self.present_count} present>'
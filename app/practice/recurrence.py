@@ -0,0 +1,119 @@
+from datetime import date, timedelta
+
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+class Recurrence:
+    """A subset of the iCalendar RRULE: ``FREQ=DAILY|WEEKLY`` with INTERVAL, BYDAY, COUNT and UNTIL.
+
+    ``Recurrence.parse('FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=20241215', date(2024, 9, 2))``
+    is every Monday and Wednesday from 2 September to 15 December. Dates are
+    generated lazily, and ``between`` jumps straight to the period holding
+    its start, so looking at week 30 of an open-ended rule costs the same
+    as looking at week 1.
+    """
+
+    def __init__(self, dtstart, freq='WEEKLY', interval=1, byday=None, count=None, until=None):
+        if freq not in ('DAILY', 'WEEKLY'):
+            raise ValueError(f'Unsupported FREQ {freq!r}; use DAILY or WEEKLY.')
+        if interval < 1:
+            raise ValueError('INTERVAL must be at least 1.')
+        if count is not None and until is not None:
+            raise ValueError('COUNT and UNTIL cannot be combined.')
+        if count is not None and count < 1:
+            raise ValueError('COUNT must be at least 1.')
+        if byday and freq != 'WEEKLY':
+            raise ValueError('BYDAY is only supported with FREQ=WEEKLY.')
+        self.dtstart = dtstart
+        self.freq = freq
+        self.interval = interval
+        self.byday = tuple(sorted(set(byday))) if byday else (dtstart.weekday(),)
+        self.count = count
+        self.until = until
+        if until is not None and next(iter(self), None) is None:
+            raise ValueError('The rule has no occurrences before UNTIL.')
+
+    @classmethod
+    def parse(cls, text, dtstart):
+        """Build a Recurrence from an RRULE string (with or without the ``RRULE:`` prefix)."""
+        text = text.strip()
+        if text.upper().startswith('RRULE:'):
+            text = text[len('RRULE:'):]
+        options = {}
+        try:
+            for part in filter(None, text.split(';')):
+                name, value = part.split('=', 1)
+                options[name.strip().upper()] = value.strip().upper()
+            byday = [WEEKDAYS.index(day) for day in options['BYDAY'].split(',')] \
+                if 'BYDAY' in options else None
+            interval = int(options.get('INTERVAL', 1))
+            count = int(options['COUNT']) if 'COUNT' in options else None
+            until = options.get('UNTIL')
+            until = date(int(until[:4]), int(until[4:6]), int(until[6:8])) if until else None
+        except ValueError as e:
+            raise ValueError(f'Invalid recurrence rule {text!r}.') from e
+        return cls(dtstart, freq=options.get('FREQ', 'WEEKLY'), interval=interval,
+                   byday=byday, count=count, until=until)
+
+    def __str__(self):
+        parts = [f'FREQ={self.freq}']
+        if self.interval != 1:
+            parts.append(f'INTERVAL={self.interval}')
+        if self.freq == 'WEEKLY':
+            parts.append('BYDAY=' + ','.join(WEEKDAYS[day] for day in self.byday))
+        if self.count is not None:
+            parts.append(f'COUNT={self.count}')
+        if self.until is not None:
+            parts.append(f'UNTIL={self.until:%Y%m%d}')
+        return ';'.join(parts)
+
+    def __iter__(self):
+        return self.between(self.dtstart)
+
+    def _grid(self):
+        """``(first period start, period length in days, day offsets within a period)``."""
+        if self.freq == 'DAILY':
+            return self.dtstart, self.interval, (0,)
+        return self.dtstart - timedelta(days=self.dtstart.weekday()), 7 * self.interval, self.byday
+
+    def _periods(self, first):
+        """Dates of every period from number ``first`` on, in order (may precede ``dtstart``)."""
+        anchor, length, offsets = self._grid()
+        number = first
+        while True:
+            period = anchor + timedelta(days=number * length)
+            for offset in offsets:
+                yield period + timedelta(days=offset)
+            number += 1
+
+    def between(self, start, end=None):
+        """Occurrence dates from ``start`` through ``end`` (inclusive; open-ended without it)."""
+        last = self.last() if self.count is not None else self.until
+        if end is None or (last is not None and last < end):
+            end = last
+        start = max(start, self.dtstart)
+        first = 0
+        if self.count is None:
+            # Skip whole periods before ``start`` without generating them
+            anchor, length, _ = self._grid()
+            first = max(0, (start - anchor).days // length)
+        for day in self._periods(first):
+            if end is not None and day > end:
+                return
+            if day >= start:
+                yield day
+
+    def last(self):
+        """Date of the final occurrence, or None for an open-ended rule."""
+        if self.count is not None:
+            days = (day for day in self._periods(0) if day >= self.dtstart)
+            for number, day in enumerate(days, 1):
+                if number == self.count:
+                    return day
+        if self.until is None:
+            return None
+        # UNTIL itself need not be an occurrence
+        previous = None
+        for day in self.between(max(self.dtstart, self.until - timedelta(days=7 * self.interval)),
+                                self.until):
+            previous = day
+        return previous
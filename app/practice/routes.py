@@ -0,0 +1,160 @@
+from datetime import date, time, timedelta
+from flask import render_template, jsonify, request, abort, current_app
+from flask_login import login_required, current_user
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.auth.models import TeamMember
+from app.utils.database import read_only
+from app.utils.views import has_role, json_error, manages_team
+from . import practice
+from .attendance import attendance_rates, attendees, record_attendance
+from .calendar import calendar as practice_calendar, create_series, change_occurrence
+from .models import Attendance, Practice, PracticeSeries
+
+def _time(value):
+    return time.fromisoformat(value) if value else None
+
+def _date(value):
+    return date.fromisoformat(value) if value else None
+
+@practice.route('/')
+@read_only
+@login_required
+def list_practices():
+    """Upcoming practices of the user's teams."""
+    team_ids = select(TeamMember.team_id).where(TeamMember.user_id == current_user.id)
+    practices = Practice.query.options(joinedload(Practice.team)) \
+        .filter(Practice.team_id.in_(team_ids), Practice.date >= date.today()) \
+        .order_by(Practice.date, Practice.time).all()
+    return render_template('practice/list.html', title='Practices', practices=practices)
+
+@practice.route('/<int:practice_id>')
+@read_only
+@login_required
+def view_practice(practice_id):
+    practice_ = Practice.query.options(joinedload(Practice.team)) \
+        .filter_by(id=practice_id).first_or_404()
+    return render_template('practice/view.html', title=practice_.title, practice=practice_)
+
+@practice.route('/calendar')
+@read_only
+@login_required
+def calendar():
+    """Practices of the user's teams between two dates, e.g. ``?start=2024-09-01&end=2024-09-30``.
+
+    Includes occurrences of recurring practices that are not stored yet;
+    those have no ``id``. ``team_id`` narrows the calendar to some teams.
+    """
+    try:
+        start = date.fromisoformat(request.args['start'])
+        end = date.fromisoformat(request.args.get('end') or request.args['start'])
+    except (KeyError, ValueError):
+        return json_error('start (and optionally end) must be ISO dates.', 400)
+    if end < start or end - start > timedelta(days=current_app.config['PRACTICE_CALENDAR_MAX_DAYS']):
+        return json_error('The range is empty or too long.', 400)
+    team_ids = set(db.session.scalars(
+        select(TeamMember.team_id).where(TeamMember.user_id == current_user.id)))
+    requested = set(request.args.getlist('team_id', type=int))
+    if requested:
+        team_ids = requested if has_role('admin') else team_ids & requested
+    return jsonify([occurrence.to_dict()
+                    for occurrence in practice_calendar(team_ids, start, end)])
+
+@practice.route('/series', methods=['POST'])
+@login_required
+def add_series():
+    """Create a recurring practice.
+
+    Expects JSON like ``{"team_id": 3, "title": "Practice", "starts_on": "2024-09-02",
+    "time": "18:00", "rule": "FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=20241215"}``, plus
+    optional ``duration``, ``location``, ``venue_id``, ``court`` and ``notes``.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        team_id = int(data['team_id'])
+        starts_on, start_time = date.fromisoformat(data['starts_on']), time.fromisoformat(data['time'])
+        title, rule = data['title'].strip(), data['rule']
+        duration = int(data.get('duration', 90))
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return json_error('team_id, title, starts_on, time and rule are required.', 400)
+    if not manages_team(team_id):
+        abort(403)
+    try:
+        series = create_series(team_id, title, starts_on, start_time, rule, duration=duration,
+                               location=data.get('location'), venue_id=data.get('venue_id'),
+                               court=data.get('court'), notes=data.get('notes'))
+    except ValueError as e:
+        return json_error(str(e), 400)
+    response = jsonify({'id': series.id, 'rule': series.rule,
+                        'ends_on': series.ends_on.isoformat() if series.ends_on else None,
+                        'materialized_through': series.materialized_through.isoformat()
+                        if series.materialized_through else None})
+    response.status_code = 201
+    return response
+
+@practice.route('/series/<int:series_id>/occurrences/<occurrence_date>', methods=['PUT'])
+@login_required
+def update_occurrence(series_id, occurrence_date):
+    """Cancel, move or edit one occurrence of a recurring practice.
+
+    Expects JSON like ``{"cancelled": true}`` or ``{"date": "2024-09-05",
+    "time": "19:00", "location": "Gym B"}``.
+    """
+    series = db.get_or_404(PracticeSeries, series_id)
+    if not manages_team(series.team_id):
+        abort(403)
+    data = request.get_json(silent=True) or {}
+    try:
+        exception = change_occurrence(
+            series, date.fromisoformat(occurrence_date), cancelled=bool(data.get('cancelled')),
+            date=_date(data.get('date')), time=_time(data.get('time')),
+            location=data.get('location'), notes=data.get('notes'))
+    except (TypeError, ValueError) as e:
+        return json_error(str(e), 400)
+    return jsonify({'series_id': series.id,
+                    'occurrence_date': exception.occurrence_date.isoformat(),
+                    'cancelled': exception.cancelled})
+
+@practice.route('/<int:practice_id>/attendance', methods=['PUT'])
+@login_required
+def take_attendance(practice_id):
+    """Record attendance for the whole roster at once.
+
+    Expects JSON ``{"present": [user ids]}`` or ``{"absent": [user ids]}``.
+    """
+    practice_ = db.get_or_404(Practice, practice_id)
+    if not manages_team(practice_.team_id):
+        abort(403)
+    data = request.get_json(silent=True) or {}
+    try:
+        present = [int(user_id) for user_id in data['present']] if 'present' in data else None
+        absent = [int(user_id) for user_id in data['absent']] if 'absent' in data else None
+        attendance = record_attendance(practice_, present=present, absent=absent,
+                                       recorded_by=current_user.id)
+    except (TypeError, ValueError) as e:
+        return json_error(str(e), 400)
+    return jsonify({'practice_id': practice_id, 'present_count': attendance.present_count,
+                    'roster_version': attendance.roster.version})
+
+@practice.route('/<int:practice_id>/attendance')
+@read_only
+@login_required
+def view_attendance(practice_id):
+    attendance = db.get_or_404(Attendance, practice_id)
+    present, absent = attendees(attendance)
+    return jsonify({'practice_id': practice_id, 'present': present, 'absent': absent,
+                    'roster_version': attendance.roster.version})
+
+@practice.route('/attendance/teams/<int:team_id>')
+@read_only
+@login_required
+def attendance_report(team_id):
+    """Season attendance rate of a team and its players; ``user_id`` narrows the players."""
+    report = attendance_rates(team_id, request.args.get('season')
+                              or current_app.config['CURRENT_SEASON'])
+    user_ids = set(request.args.getlist('user_id', type=int))
+    if user_ids:
+        report['players'] = [row for row in report['players'] if row['user_id'] in user_ids]
+    return jsonify(report)
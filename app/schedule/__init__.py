@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+schedule = Blueprint('schedule', __name__)
+
+from . import routes
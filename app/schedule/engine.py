@@ -0,0 +1,168 @@
+import heapq
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from app import db
+from app.auth.models import TeamMember
+from app.game.models import Game
+from app.practice.models import Practice
+from .intervals import IntervalIndex
+from .models import Venue
+
+class ScheduleIndex:
+    """Interval indexes of booked events per court, per team and per coach.
+
+    A court is ``(venue_id, court number)``. An event occupies its court,
+    each of its teams and every coach of those teams, so a new event
+    conflicts with anything that overlaps it on any of them. Each check is a
+    few binary searches, regardless of how many events the club has.
+
+    Event keys are ``('game', id)``, ``('practice', id)`` or anything else
+    hashable and orderable for events that are not stored yet.
+    """
+
+    def __init__(self, venues=(), coaches_by_team=None):
+        self.venues = {venue['id']: venue for venue in venues}
+        self.coaches_by_team = coaches_by_team or {}
+        self.courts = defaultdict(IntervalIndex)
+        self.teams = defaultdict(IntervalIndex)
+        self.coaches = defaultdict(IntervalIndex)
+        self.events = {}  # key -> (start, end, court, team ids)
+
+    def __len__(self):
+        return len(self.events)
+
+    def _resources(self, court, team_ids):
+        resources = []
+        if court is not None:
+            resources.append(('court', court, self.courts[court]))
+        for team_id in team_ids:
+            resources.append(('team', team_id, self.teams[team_id]))
+        for coach_id in {coach for team_id in team_ids
+                         for coach in self.coaches_by_team.get(team_id, ())}:
+            resources.append(('coach', coach_id, self.coaches[coach_id]))
+        return resources
+
+    def add(self, key, start, end, team_ids, court=None):
+        if key in self.events:
+            raise ValueError(f'{key} is already scheduled')
+        team_ids = tuple(team_ids)
+        self.events[key] = (start, end, court, team_ids)
+        for _, _, index in self._resources(court, team_ids):
+            index.add(start, end, key)
+
+    def remove(self, key):
+        start, end, court, team_ids = self.events.pop(key)
+        for _, _, index in self._resources(court, team_ids):
+            index.remove(start, end, key)
+
+    def is_free(self, start, end, team_ids=(), court=None):
+        """Whether ``[start, end)`` is free on the court and for the teams and their coaches."""
+        return all(index.is_free(start, end) for _, _, index in self._resources(court, team_ids))
+
+    def conflicts(self, start, end, team_ids=(), court=None, ignore=None):
+        """``(kind, id, event key)`` of everything an event at ``[start, end)`` would clash with.
+
+        ``kind`` is 'court', 'team' or 'coach'. Pass the key of an event
+        being moved as ``ignore`` so it does not conflict with itself.
+        """
+        found = []
+        for kind, resource, index in self._resources(court, team_ids):
+            found.extend((kind, resource, key) for _, _, key in index.overlapping(start, end)
+                         if key != ignore)
+        return found
+
+    def courts_of(self, venue_ids=None):
+        """Every ``(venue_id, court)`` of the given venues (all venues by default)."""
+        return [(venue_id, number)
+                for venue_id in (venue_ids if venue_ids is not None else sorted(self.venues))
+                for number in range(1, self.venues[venue_id]['courts'] + 1)]
+
+    def free_slots(self, duration, after, team_ids=(), venue_ids=None, n=5, until=None,
+                   step=timedelta(minutes=15), weekdays=None):
+        """The first ``n`` ``(start, court)`` where an event of ``duration`` fits.
+
+        Slots start on a ``step`` boundary within the venue's opening hours,
+        on one of ``weekdays`` (0 is Monday; any day by default), and leave
+        the court, the teams and their coaches free. They are
+        ordered by start time across all courts, and at most one slot per gap
+        is offered on each court. Busy stretches are skipped a whole block at
+        a time, so the search does not walk the calendar step by step.
+        """
+        until = until or after + timedelta(weeks=8)
+        searches = [self._court_slots(court, duration, after, until, team_ids, step, weekdays)
+                    for court in self.courts_of(venue_ids)]
+        slots = []
+        for start, court in heapq.merge(*searches):
+            slots.append((start, court))
+            if len(slots) == n:
+                break
+        return slots
+
+    def _court_slots(self, court, duration, at, until, team_ids, step, weekdays):
+        venue = self.venues[court[0]]
+        indexes = [index for _, _, index in self._resources(court, team_ids)]
+        at = _ceil(at, step)
+        while at + duration <= until:
+            opens = datetime.combine(at.date(), venue['opens_at'])
+            closes = datetime.combine(at.date(), venue['closes_at'])
+            if at < opens:
+                at = _ceil(opens, step)
+                continue
+            if at + duration > closes or (weekdays is not None and at.weekday() not in weekdays):
+                at = _ceil(opens + timedelta(days=1), step)
+                continue
+            end = at + duration
+            blocked = [index for index in indexes if not index.is_free(at, end)]
+            if not blocked:
+                yield at, court
+                at = end
+                continue
+            # Jump past the busy block that got in the way on each resource
+            at = _ceil(max(_free_after(index, at) for index in blocked), step)
+
+def _free_after(index, at):
+    """End of the busy block holding ``at`` or, if ``at`` is free, of the next one."""
+    free = index.busy_until(at)
+    return free if free > at else index.busy_until(index.next_busy(at))
+
+def _ceil(moment, step):
+    """``moment`` rounded up to a multiple of ``step`` since midnight."""
+    midnight = datetime.combine(moment.date(), datetime.min.time())
+    remainder = (moment - midnight) % step
+    return moment + (step - remainder) if remainder else moment
+
+def event_span(event):
+    """``(start, end)`` of a Game or Practice."""
+    start = datetime.combine(event.date, event.time)
+    return start, start + timedelta(minutes=event.duration)
+
+def load_schedule(start, end):
+    """Build a ScheduleIndex of the games and practices between two dates.
+
+    Both tables are read with a range scan of their date index; coaches
+    come from team memberships.
+    """
+    venues = [dict(row._mapping) for row in db.session.execute(
+        select(Venue.id, Venue.name, Venue.courts, Venue.opens_at, Venue.closes_at))]
+    coaches = defaultdict(list)
+    for team_id, user_id in db.session.execute(
+            select(TeamMember.team_id, TeamMember.user_id).where(TeamMember.role == 'coach')):
+        coaches[team_id].append(user_id)
+    index = ScheduleIndex(venues, coaches)
+
+    # A day's margin catches events that started the evening before
+    first = start - timedelta(days=1)
+    for kind, model, extra in (('game', Game, (Game.opponent_team_id,)),
+                               ('practice', Practice, ())):
+        rows = db.session.execute(
+            select(model.id, model.team_id, model.date, model.time, model.duration,
+                   model.venue_id, model.court, *extra)
+            .where(model.date >= first, model.date <= end))
+        for row in rows:
+            event_start = datetime.combine(row.date, row.time)
+            teams = (row.team_id,) + tuple(t for t in row[7:] if t is not None)
+            court = (row.venue_id, row.court) if row.venue_id is not None and row.court else None
+            index.add((kind, row.id), event_start, event_start + timedelta(minutes=row.duration),
+                      teams, court)
+    return index
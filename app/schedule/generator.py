@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+def round_robin(team_ids):
+    """Rounds of ``(home, away)`` pairs in which every team meets every other once.
+
+    Uses the circle method: one team stays put while the others rotate, so
+    with an odd number of teams each sits out (has a bye) exactly once.
+    Home and away alternate from round to round.
+    """
+    teams = list(team_ids)
+    if len(teams) % 2:
+        teams.append(None)
+    n = len(teams)
+    rounds = []
+    for number in range(n - 1):
+        pairs = []
+        for i in range(n // 2):
+            home, away = teams[i], teams[n - 1 - i]
+            if home is None or away is None:
+                continue
+            pairs.append((away, home) if number % 2 else (home, away))
+        rounds.append(pairs)
+        teams.insert(1, teams.pop())
+    return rounds
+
+def schedule_season(index, divisions, first_day, duration, venue_ids=None, weekdays=None,
+                    round_interval=timedelta(weeks=1), step=timedelta(minutes=15)):
+    """Place a round robin for each division on courts, one round per ``round_interval``.
+
+    Every game takes the earliest slot of its round's window that leaves
+    the court, both teams and their coaches free (see
+    ``ScheduleIndex.free_slots``); placed games are added to ``index`` so
+    later ones work around them. Returns ``(fixtures, unplaced)``:
+    fixtures are ``(home, away, start, court)``, unplaced ``(home, away,
+    round number)`` for games that did not fit in their window.
+    """
+    fixtures, unplaced = [], []
+    schedules = [round_robin(teams) for teams in divisions]
+    start = datetime.combine(first_day, datetime.min.time())
+    for number in range(max((len(rounds) for rounds in schedules), default=0)):
+        window_start = start + number * round_interval
+        for rounds in schedules:
+            for home, away in rounds[number] if number < len(rounds) else ():
+                slots = index.free_slots(duration, window_start, team_ids=(home, away),
+                                         venue_ids=venue_ids, n=1, step=step,
+                                         until=window_start + round_interval, weekdays=weekdays)
+                if not slots:
+                    unplaced.append((home, away, number + 1))
+                    continue
+                slot, court = slots[0]
+                index.add(('fixture', len(fixtures)), slot, slot + duration, (home, away), court)
+                fixtures.append((home, away, slot, court))
+    return fixtures, unplaced
@@ -0,0 +1,82 @@
+from bisect import bisect_left, bisect_right, insort
+
+class IntervalIndex:
+    """Sorted half-open intervals ``[start, end)`` of one resource (a court, team or coach).
+
+    Besides the intervals themselves the index keeps their union as sorted,
+    disjoint busy blocks, so "is ``[start, end)`` free?" and "where is the
+    next gap?" are two binary searches however many events the resource
+    has, even if some of them overlap each other. Adding an interval costs
+    a binary search plus moving list items; removing one rebuilds only the
+    busy block it was part of.
+    """
+
+    def __init__(self):
+        self._intervals = []  # (start, end, key), by start
+        self._block_starts = []
+        self._block_ends = []
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def add(self, start, end, key):
+        insort(self._intervals, (start, end, key))
+        # Merge with every block the new interval touches
+        first = bisect_left(self._block_ends, start)
+        last = bisect_right(self._block_starts, end)
+        if first < last:
+            start = min(start, self._block_starts[first])
+            end = max(end, self._block_ends[last - 1])
+        self._block_starts[first:last] = [start]
+        self._block_ends[first:last] = [end]
+
+    def remove(self, start, end, key):
+        i = bisect_left(self._intervals, (start, end, key))
+        if i == len(self._intervals) or self._intervals[i] != (start, end, key):
+            raise KeyError(key)
+        del self._intervals[i]
+        block = bisect_right(self._block_starts, start) - 1
+        self._rebuild_block(block)
+
+    def _rebuild_block(self, block):
+        block_start, block_end = self._block_starts[block], self._block_ends[block]
+        lo = bisect_left(self._intervals, (block_start,))
+        hi = bisect_left(self._intervals, (block_end,))
+        starts, ends = [], []
+        for start, end, _ in self._intervals[lo:hi]:
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        self._block_starts[block:block + 1] = starts
+        self._block_ends[block:block + 1] = ends
+
+    def is_free(self, start, end):
+        """Whether nothing in the index overlaps ``[start, end)``."""
+        block = bisect_right(self._block_starts, start) - 1
+        if block >= 0 and self._block_ends[block] > start:
+            return False
+        return block + 1 >= len(self._block_starts) or self._block_starts[block + 1] >= end
+
+    def overlapping(self, start, end):
+        """``(start, end, key)`` of every interval overlapping ``[start, end)``."""
+        if self.is_free(start, end):
+            return []
+        # Anything overlapping starts inside a busy block that reaches past ``start``
+        block = bisect_right(self._block_ends, start)
+        lo = bisect_left(self._intervals, (self._block_starts[block],))
+        hi = bisect_left(self._intervals, (end,))
+        return [interval for interval in self._intervals[lo:hi] if interval[1] > start]
+
+    def busy_until(self, at):
+        """End of the busy block containing ``at``, or ``at`` itself when it is free."""
+        block = bisect_right(self._block_starts, at) - 1
+        if block >= 0 and self._block_ends[block] > at:
+            return self._block_ends[block]
+        return at
+
+    def next_busy(self, at):
+        """Start of the first busy block at or after ``at``, or None."""
+        block = bisect_left(self._block_starts, at)
+        return self._block_starts[block] if block < len(self._block_starts) else None
@@ -0,0 +1,52 @@
+from datetime import time
+from app import db
+
+class Venue(db.Model):
+    """A gym the club books; games and practices take one of its courts."""
+    __tablename__ = 'venues'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    address = db.Column(db.String(200))
+    courts = db.Column(db.Integer, nullable=False, default=1)
+    opens_at = db.Column(db.Time, nullable=False, default=time(8))
+    closes_at = db.Column(db.Time, nullable=False, default=time(22))
+
+    def __repr__(self):
+        return f'<Venue {self.name}>'
+
+class Reminder(db.Model):
+    """A reminder e-mail due for one team before a game or practice.
+
+    The pending rows ordered by ``due_at`` are the scheduler's priority
+    queue; the (status, due_at) index makes "what is due next?" one index
+    lookup however many events are booked.
+    """
+    __tablename__ = 'reminders'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # 'game' or 'practice'
+    event_id = db.Column(db.Integer, nullable=False)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
+    lead_minutes = db.Column(db.Integer, nullable=False)
+    due_at = db.Column(db.DateTime, nullable=False)  # local time, like event dates
+    status = db.Column(db.String(10), nullable=False, default='pending')  # 'pending', 'sent', 'cancelled', 'expired'
+    claim_token = db.Column(db.String(32), index=True)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'event_id', 'team_id', 'lead_minutes',
+                            name='uq_reminders_event_team_lead'),
+        db.Index('ix_reminders_status_due', 'status', 'due_at'),
+    )
+
+    def __repr__(self):
+        return f'<Reminder {self.kind} {self.event_id} team={self.team_id} {self.status}>'
+
+class SchedulerLease(db.Model):
+    """Which process may run a cluster-wide job, until when."""
+    __tablename__ = 'scheduler_leases'
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<SchedulerLease {self.name} {self.holder}>'
@@ -0,0 +1,259 @@
+import os
+import socket
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, func, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from app import db
+from app.auth.models import User, TeamMember
+from app.game.models import Game
+from app.practice.models import Practice
+from app.utils.email import send_game_reminder_email, send_practice_reminder_email
+from app.utils.metrics import REMINDER_LAG, REMINDER_LEADER, REMINDERS_DISPATCHED
+from app.utils.sql import upsert
+from .models import Reminder, SchedulerLease
+
+EVENTS = {'game': Game, 'practice': Practice}
+SENDERS = {'game': send_game_reminder_email, 'practice': send_practice_reminder_email}
+LEASE = 'reminders'
+
+def _teams(kind, row):
+    """Teams to remind of an event: a game's opponent too when it is one of ours."""
+    teams = [row.team_id]
+    if kind == 'game' and row.opponent_team_id is not None:
+        teams.append(row.opponent_team_id)
+    return teams
+
+class ReminderScheduler:
+    """Sends game and practice reminders when they fall due, from one process at a time.
+
+    Reminders are rows in a time-ordered queue (``Reminder``). Events
+    entering the ``REMINDER_LOOKAHEAD_HOURS`` horizon get theirs queued by
+    a range scan of the events' date index every ``REMINDER_REFILL_INTERVAL``
+    seconds; games and practices added, moved or deleted through the ORM
+    within the horizon update the queue in the same transaction.
+
+    Every process runs a scheduler thread, but only the holder of a lease
+    row dispatches; it sleeps until the next reminder is due or the lease
+    needs renewing, whichever comes first. A dispatch marks its batch sent
+    with one conditional UPDATE before queueing the e-mails, one bulk
+    e-mail per event and team, so a reminder goes out at most once even if
+    two processes both believe they lead. Times are local wall-clock times
+    like event dates; ``clock`` can be replaced for tests.
+    """
+
+    def __init__(self, app=None, clock=None):
+        self.app = None
+        self.clock = clock or datetime.now
+        self.holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread_pid = None
+        self._next_refill = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.leads = tuple(timedelta(minutes=m) for m in app.config['REMINDER_LEAD_MINUTES'])
+        # Never look less far ahead than the longest lead, or reminders would be late
+        self.lookahead = max(timedelta(hours=app.config['REMINDER_LOOKAHEAD_HOURS']),
+                             max(self.leads, default=timedelta(0)) +
+                             timedelta(seconds=app.config['REMINDER_REFILL_INTERVAL']))
+        self.refill_interval = timedelta(seconds=app.config['REMINDER_REFILL_INTERVAL'])
+        self.lease_duration = timedelta(seconds=app.config['REMINDER_LEASE_SECONDS'])
+        self.batch_size = app.config['REMINDER_BATCH_SIZE']
+        app.extensions['reminder_scheduler'] = self
+        if app.config['REMINDER_THREAD'] and not app.testing:
+            app.before_request(self._ensure_thread)
+
+    def _rows(self, kind, event_id, team_ids, start, now):
+        """Queue rows for one event; none once it has started or outside the horizon."""
+        if start <= now or start > now + self.lookahead:
+            return []
+        return [{'kind': kind, 'event_id': event_id, 'team_id': team_id,
+                 'lead_minutes': int(lead.total_seconds()) // 60, 'due_at': start - lead,
+                 'status': 'pending'}
+                for team_id in team_ids for lead in self.leads]
+
+    def _queue(self, connection, rows):
+        if rows:
+            connection.execute(upsert(Reminder).on_conflict_do_nothing(), rows)
+
+    def refill(self, now=None):
+        """Queue reminders for events that entered the lookahead horizon; returns how many."""
+        now = now or self.clock()
+        horizon = now + self.lookahead
+        rows = []
+        for kind, model in EVENTS.items():
+            queued = select(Reminder.id).where(Reminder.kind == kind,
+                                               Reminder.event_id == model.id)
+            columns = [model.id, model.team_id, model.date, model.time]
+            if kind == 'game':
+                columns.append(model.opponent_team_id)
+            for row in db.session.execute(
+                    select(*columns).where(model.date >= now.date(), model.date <= horizon.date(),
+                                           ~queued.exists())):
+                rows.extend(self._rows(kind, row.id, _teams(kind, row),
+                                       datetime.combine(row.date, row.time), now))
+        self._queue(db.session, rows)
+        db.session.commit()
+        return len(rows)
+
+    def next_due(self):
+        """When the earliest pending reminder falls due, or None."""
+        return db.session.scalar(select(func.min(Reminder.due_at))
+                                 .where(Reminder.status == 'pending'))
+
+    def overdue_seconds(self, now=None):
+        """How long the earliest due reminder has been waiting (0 when none is)."""
+        due = self.next_due()
+        now = now or self.clock()
+        return max(0.0, (now - due).total_seconds()) if due is not None else 0.0
+
+    def dispatch(self, now=None):
+        """Send the reminders that are due, batched per team; returns how many were sent."""
+        now = now or self.clock()
+        token = uuid.uuid4().hex
+        due = select(Reminder.id).where(Reminder.status == 'pending', Reminder.due_at <= now) \
+            .order_by(Reminder.due_at).limit(self.batch_size).with_for_update(skip_locked=True)
+        claimed = db.session.execute(
+            update(Reminder).where(Reminder.id.in_(due), Reminder.status == 'pending')
+            .values(status='sent', sent_at=now, claim_token=token)
+            .execution_options(synchronize_session=False)).rowcount
+        if not claimed:
+            db.session.rollback()
+            return 0
+        reminders = Reminder.query.filter_by(claim_token=token).all()
+
+        by_team = defaultdict(list)
+        for kind, model in EVENTS.items():
+            ids = {r.event_id for r in reminders if r.kind == kind}
+            events = {e.id: e for e in model.query.options(joinedload(model.team))
+                      .filter(model.id.in_(ids))} if ids else {}
+            for reminder in (r for r in reminders if r.kind == kind):
+                found = events.get(reminder.event_id)
+                if found is None:
+                    reminder.status = 'cancelled'
+                elif datetime.combine(found.date, found.time) <= now:
+                    reminder.status = 'expired'
+                else:
+                    by_team[reminder.team_id].append((reminder, found))
+        sent = 0
+        for team_id, batch in by_team.items():
+            recipients = User.query.join(TeamMember, TeamMember.user_id == User.id) \
+                .filter(TeamMember.team_id == team_id).distinct().all()
+            for reminder, found in batch:
+                # The e-mails are queued in the claiming transaction
+                SENDERS[reminder.kind](found, recipients)
+                REMINDER_LAG.observe((now - reminder.due_at).total_seconds())
+                sent += 1
+        for reminder in reminders:
+            REMINDERS_DISPATCHED.labels(reminder.kind, reminder.status).inc()
+        db.session.commit()
+        return sent
+
+    def acquire_lease(self, now=None):
+        """Take or renew the dispatching lease; True if this process holds it."""
+        now = now or self.clock()
+        expires = now + self.lease_duration
+        taken = db.session.execute(
+            update(SchedulerLease)
+            .where(SchedulerLease.name == LEASE,
+                   (SchedulerLease.holder == self.holder) | (SchedulerLease.expires_at < now))
+            .values(holder=self.holder, expires_at=expires)).rowcount
+        if not taken and db.session.get(SchedulerLease, LEASE) is None:
+            db.session.add(SchedulerLease(name=LEASE, holder=self.holder, expires_at=expires))
+            taken = 1
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another process created the lease first
+            db.session.rollback()
+            taken = 0
+        REMINDER_LEADER.set(1 if taken else 0)
+        return bool(taken)
+
+    def run_once(self, now=None):
+        """One scheduler step; returns ``(reminders sent, seconds until the next step)``."""
+        now = now or self.clock()
+        wait = self.lease_duration / 3
+        if not self.acquire_lease(now):
+            self._next_refill = None
+            return 0, wait.total_seconds()
+        if self._next_refill is None or now >= self._next_refill:
+            self.refill(now)
+            self._next_refill = now + self.refill_interval
+        sent = self.dispatch(now)
+        due = self.next_due()
+        if due is not None and due <= now:
+            return sent, 0.0  # more than one batch was due
+        for moment in (due, self._next_refill):
+            if moment is not None:
+                wait = min(wait, moment - now)
+        return sent, max(wait.total_seconds(), 0.0)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _ensure_thread(self):
+        # Threads do not survive a fork, so each gunicorn worker starts its own
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+        threading.Thread(target=self.run, daemon=True, name='reminder-scheduler').start()
+
+    def run(self, stop=None):
+        """Scheduler loop: a step, then sleep until something is due or the lease needs renewing."""
+        while stop is None or not stop.is_set():
+            with self.app.app_context():
+                try:
+                    _, wait = self.run_once()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('Reminder scheduler failed')
+                    wait = self.lease_duration.total_seconds() / 3
+                finally:
+                    db.session.remove()
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+reminder_scheduler = ReminderScheduler()
+
+def _event_start(target):
+    return datetime.combine(target.date, target.time)
+
+def _listen(kind, model):
+    @event.listens_for(model, 'after_insert')
+    def queue_reminders(mapper, connection, target):
+        if reminder_scheduler.app is None:
+            return
+        reminder_scheduler._queue(connection, reminder_scheduler._rows(
+            kind, target.id, _teams(kind, target), _event_start(target), reminder_scheduler.clock()))
+        reminder_scheduler.wake()
+
+    @event.listens_for(model, 'after_update')
+    def requeue_reminders(mapper, connection, target):
+        if reminder_scheduler.app is None:
+            return
+        changed = [name for name in ('date', 'time', 'team_id', 'opponent_team_id')
+                   if hasattr(target, name) and inspect(target).attrs[name].history.has_changes()]
+        if not changed:
+            return
+        # Sent reminders go too: a postponed event is reminded again for its new time
+        drop_reminders(mapper, connection, target)
+        queue_reminders(mapper, connection, target)
+
+    @event.listens_for(model, 'after_delete')
+    def drop_reminders(mapper, connection, target):
+        if reminder_scheduler.app is None:
+            return
+        connection.execute(delete(Reminder).where(
+            Reminder.kind == kind, Reminder.event_id == target.id))
+
+for _kind, _model in EVENTS.items():
+    _listen(_kind, _model)
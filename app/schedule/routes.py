@@ -0,0 +1,116 @@
+from datetime import date, datetime, timedelta
+from flask import jsonify, request, abort, current_app
+from flask_login import login_required
+
+from app import db
+from app.game.models import Game
+from app.team.models import Team
+from app.utils.database import read_only
+from app.utils.views import has_role, json_error
+from . import schedule
+from .engine import load_schedule
+from .generator import schedule_season
+from .models import Venue
+
+def _step():
+    return timedelta(minutes=current_app.config['SCHEDULE_SLOT_MINUTES'])
+
+def _ids(name):
+    return request.args.getlist(name, type=int)
+
+def _court_dict(court):
+    return None if court is None else {'venue_id': court[0], 'court': court[1]}
+
+@schedule.route('/conflicts')
+@read_only
+@login_required
+def conflicts():
+    """What an event would clash with.
+
+    E.g. ``?start=2024-09-02T18:00&duration=90&team_id=3&venue_id=1&court=2``.
+    """
+    try:
+        start = datetime.fromisoformat(request.args['start'])
+        duration = timedelta(minutes=request.args.get('duration', 90, type=int))
+    except (KeyError, ValueError):
+        return json_error('start (ISO date and time) is required.', 400)
+    venue_id = request.args.get('venue_id', type=int)
+    court = (venue_id, request.args.get('court', 1, type=int)) if venue_id else None
+    index = load_schedule(start.date(), (start + duration).date())
+    found = index.conflicts(start, start + duration, team_ids=_ids('team_id'), court=court)
+    return jsonify({
+        'free': not found,
+        'conflicts': [{'kind': kind, 'id': resource if kind != 'court' else _court_dict(resource),
+                       'event': {'type': key[0], 'id': key[1]}}
+                      for kind, resource, key in found],
+    })
+
+@schedule.route('/free-slots')
+@read_only
+@login_required
+def free_slots():
+    """The next free slots for an event, across venues, e.g. ``?duration=90&team_id=3&n=5``."""
+    try:
+        after = datetime.fromisoformat(request.args['after']) if 'after' in request.args \
+            else datetime.now().replace(second=0, microsecond=0)
+    except ValueError:
+        return json_error('after must be an ISO date and time.', 400)
+    duration = timedelta(minutes=request.args.get('duration', 90, type=int))
+    n = max(1, min(request.args.get('n', 5, type=int), current_app.config['SCHEDULE_MAX_SLOTS']))
+    until = after + timedelta(weeks=current_app.config['SCHEDULE_SEARCH_WEEKS'])
+    index = load_schedule(after.date(), until.date())
+    venue_ids = [v for v in _ids('venue_id') if v in index.venues] or None
+    slots = index.free_slots(duration, after, team_ids=_ids('team_id'), venue_ids=venue_ids,
+                             n=n, until=until, step=_step(),
+                             weekdays=set(_ids('weekday')) or None)
+    return jsonify([{'start': start.isoformat(), 'end': (start + duration).isoformat(),
+                     **_court_dict(court)} for start, court in slots])
+
+@schedule.route('/season', methods=['POST'])
+@login_required
+def generate_season():
+    """Create a round-robin season of games for one or more divisions of teams.
+
+    Expects JSON like ``{"divisions": [[1, 2, 3, 4]], "first_day": "2024-09-07",
+    "duration": 120, "venue_ids": [1], "weekdays": [5, 6]}``. Games go to the
+    earliest free court each week; games that do not fit are reported back
+    and nothing is created unless ``partial`` is true.
+    """
+    if not has_role('admin'):
+        abort(403)
+    data = request.get_json(silent=True) or {}
+    try:
+        divisions = [[int(team) for team in division] for division in data['divisions']]
+        first_day = date.fromisoformat(data['first_day'])
+        duration = timedelta(minutes=int(data.get('duration', 120)))
+        weekdays = set(map(int, data['weekdays'])) if data.get('weekdays') else None
+        venue_ids = [int(v) for v in data['venue_ids']] if data.get('venue_ids') else None
+    except (KeyError, TypeError, ValueError):
+        return json_error('divisions and first_day are required.', 400)
+    team_ids = {team for division in divisions for team in division}
+    teams = {team.id: team for team in Team.query.filter(Team.id.in_(team_ids))}
+    if len(teams) != len(team_ids):
+        return json_error(f'Unknown team(s): {sorted(team_ids - set(teams))}.', 400)
+    last_day = first_day + timedelta(weeks=max(map(len, divisions)) + 1)
+    index = load_schedule(first_day, last_day)
+    if venue_ids is not None and not set(venue_ids) <= set(index.venues):
+        return json_error('Unknown venue.', 400)
+
+    fixtures, unplaced = schedule_season(index, divisions, first_day, duration,
+                                         venue_ids=venue_ids, weekdays=weekdays, step=_step())
+    unplaced = [{'home': home, 'away': away, 'round': number} for home, away, number in unplaced]
+    if unplaced and not data.get('partial'):
+        response = jsonify({'error': 'Not every game fits in its week.', 'unplaced': unplaced})
+        response.status_code = 409
+        return response
+    venues = {venue.id: venue for venue in Venue.query}
+    db.session.add_all([
+        Game(team_id=home, opponent_team_id=away, title=f'{teams[home].name} vs {teams[away].name}',
+             opponent=teams[away].name, date=start.date(), time=start.time(),
+             duration=int(duration.total_seconds()) // 60, venue_id=venue_id, court=court,
+             location=venues[venue_id].name)
+        for home, away, start, (venue_id, court) in fixtures])
+    db.session.commit()
+    response = jsonify({'created': len(fixtures), 'unplaced': unplaced})
+    response.status_code = 201
+    return response
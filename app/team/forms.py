@@ -0,0 +1,11 @@
+from flask_wtf import FlaskForm
+from wtforms import StringField, TextAreaField, SubmitField
+from wtforms.validators import DataRequired, Length
+
+class TeamForm(FlaskForm):
+    name = StringField('Team Name', validators=[
+        DataRequired(),
+        Length(max=100)
+    ])
+    description = TextAreaField('Description')
+    submit = SubmitField('Create Team')
@@ -0,0 +1,14 @@
+from datetime import datetime
+from app import db
+
+class Team(db.Model):
+    __tablename__ = 'teams'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    members = db.relationship('TeamMember', back_populates='team')
+
+    def __repr__(self):
+        return f'<Team {self.name}>'
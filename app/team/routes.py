@@ -0,0 +1,39 @@
+from flask import render_template, redirect, url_for, flash, abort
+from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.auth.models import TeamMember
+from app.utils.views import has_role
+from . import team
+from .forms import TeamForm
+from .models import Team
+
+@team.route('/')
+@login_required
+def list_teams():
+    memberships = TeamMember.query.options(joinedload(TeamMember.team)) \
+        .filter_by(user_id=current_user.id).all()
+    return render_template('team/list.html', title='Teams', memberships=memberships)
+
+@team.route('/create', methods=['GET', 'POST'])
+@login_required
+def create_team():
+    if not has_role('admin', 'coach'):
+        abort(403)
+    form = TeamForm()
+    if form.validate_on_submit():
+        new_team = Team(name=form.name.data, description=form.description.data)
+        db.session.add(new_team)
+        db.session.add(TeamMember(team=new_team, user_id=current_user.id, role='coach'))
+        db.session.commit()
+        flash(f'{new_team.name} has been created.', 'success')
+        return redirect(url_for('team.view_team', team_id=new_team.id))
+    return render_template('team/create.html', title='Create Team', form=form)
+
+@team.route('/<int:team_id>')
+@login_required
+def view_team(team_id):
+    team_ = Team.query.options(joinedload(Team.members).joinedload(TeamMember.user)) \
+        .filter_by(id=team_id).first_or_404()
+    return render_template('team/view.html', title=team_.name, team=team_)
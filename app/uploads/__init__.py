@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+uploads = Blueprint('uploads', __name__)
+
+from . import routes
@@ -0,0 +1,35 @@
+from datetime import datetime
+from app import db
+
+class Upload(db.Model):
+    """A (possibly partial) attachment upload written straight to disk."""
+    __tablename__ = 'uploads'
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    content_type = db.Column(db.String(100))
+    length = db.Column(db.BigInteger, nullable=False)
+    offset = db.Column(db.BigInteger, nullable=False, default=0)
+    sha256 = db.Column(db.String(64), index=True)
+    storage_path = db.Column(db.String(255))  # relative to ATTACHMENT_FOLDER once complete
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+    locked_at = db.Column(db.DateTime)  # set while a PATCH request is writing
+
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'content_type': self.content_type,
+            'length': self.length,
+            'offset': self.offset,
+            'sha256': self.sha256,
+            'complete': self.is_complete
+        }
+
+    def __repr__(self):
+        return f'<Upload {self.id} {self.offset}/{self.length}>'
@@ -0,0 +1,191 @@
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta
+from flask import jsonify, request, current_app, url_for, send_file
+from flask_login import login_required, current_user
+from sqlalchemy import or_, update
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.utils import secure_filename
+
+from app import db
+from . import uploads
+from .models import Upload
+from .storage import (SNIFF_LENGTH, sniff_content_type, partial_path, stored_path,
+                      file_sha256, content_path, store)
+
+def _error(message, status, upload=None):
+    response = jsonify({'error': message})
+    response.status_code = status
+    if upload is not None:
+        response.headers['Upload-Offset'] = str(upload.offset)
+    return response
+
+def _upload_response(upload, status=200):
+    response = jsonify(upload.to_dict())
+    response.status_code = status
+    response.headers['Upload-Offset'] = str(upload.offset)
+    response.headers['Upload-Length'] = str(upload.length)
+    return response
+
+def _read_head(stream, size):
+    head = b''
+    while len(head) < size:
+        chunk = stream.read(size - len(head))
+        if not chunk:
+            break
+        head += chunk
+    return head
+
+@uploads.route('/', methods=['POST'])
+@login_required
+def create_upload():
+    """Start an upload; the body is sent afterwards with PATCH requests."""
+    filename = secure_filename(request.headers.get('Upload-Filename', ''))
+    length = request.headers.get('Upload-Length', type=int)
+    if not filename or not length or length < 0:
+        return _error('Upload-Filename and Upload-Length headers are required.', 400)
+    if length > current_app.config['ATTACHMENT_MAX_SIZE']:
+        return _error('File is too large.', 413)
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if ext not in current_app.config['ALLOWED_EXTENSIONS']:
+        return _error('File type not allowed.', 415)
+
+    upload = Upload(id=uuid.uuid4().hex, user_id=current_user.id,
+                    filename=filename, length=length)
+    db.session.add(upload)
+    db.session.commit()
+
+    response = _upload_response(upload, 201)
+    response.headers['Location'] = url_for('uploads.upload_status', upload_id=upload.id)
+    return response
+
+@uploads.route('/<upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id):
+    """Report how many bytes were received, so a client can resume (also HEAD)."""
+    upload = Upload.query.filter_by(id=upload_id, user_id=current_user.id).first_or_404()
+    return _upload_response(upload)
+
+@uploads.route('/<upload_id>', methods=['PATCH'])
+@login_required
+def append_upload(upload_id):
+    """Stream the request body to disk at ``Upload-Offset``.
+
+    The body is never buffered: it is read from the WSGI input in
+    ``UPLOAD_CHUNK_SIZE`` pieces, written to the partial file and hashed as
+    it goes. The first bytes are checked against the declared type before
+    anything else is accepted. A conditional UPDATE locks the upload at
+    its offset first, so of two requests for the same offset only one
+    writes; the lock is not a database transaction held while the body
+    streams in.
+    """
+    upload = Upload.query.filter_by(id=upload_id, user_id=current_user.id).first_or_404()
+    if upload.is_complete:
+        return _upload_response(upload)
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset != upload.offset:
+        return _error('Upload-Offset does not match the received length.', 409, upload)
+    upload_id, filename, length = upload.id, upload.filename, upload.length
+    locked_at = datetime.utcnow()
+    abandoned = locked_at - timedelta(seconds=current_app.config['UPLOAD_LOCK_TIMEOUT'])
+    locked = db.session.execute(
+        update(Upload)
+        .where(Upload.id == upload_id, Upload.offset == offset, Upload.completed_at.is_(None),
+               or_(Upload.locked_at.is_(None), Upload.locked_at < abandoned))
+        .values(locked_at=locked_at)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if not locked:
+        return _error('Another request is writing this upload.', 409, upload)
+
+    path = partial_path(upload_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    stream = request.stream
+    remaining = length - offset
+    chunk_size = current_app.config['UPLOAD_CHUNK_SIZE']
+    # The digest can only be computed on the fly when this request starts
+    # at the beginning; a resumed upload is hashed from disk at the end.
+    sha = hashlib.sha256() if offset == 0 else None
+    written = 0
+    status = None
+    rejected = False
+
+    with open(path, 'r+b' if offset else 'wb') as f:
+        f.seek(offset)
+        try:
+            if offset == 0:
+                head = _read_head(stream, min(SNIFF_LENGTH, remaining))
+                content_type = sniff_content_type(head, filename)
+                if content_type is None:
+                    status = _error('File contents do not match an allowed type.', 415)
+                    rejected = True
+                else:
+                    f.write(head)
+                    sha.update(head)
+                    written = len(head)
+
+            while status is None:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                if written + len(chunk) > remaining:
+                    status = _error('Body exceeds Upload-Length.', 413)
+                    break
+                f.write(chunk)
+                if sha is not None:
+                    sha.update(chunk)
+                written += len(chunk)
+        except ClientDisconnected:
+            # Keep what arrived; the client resumes from the recorded offset
+            status = _error('Upload interrupted.', 400)
+        f.truncate(offset + written)
+
+    # Only while this request still holds the lock
+    mine = (Upload.id == upload_id, Upload.locked_at == locked_at)
+    if rejected:
+        os.remove(path)
+        db.session.execute(Upload.__table__.delete().where(*mine))
+        db.session.commit()
+        return status
+
+    values = {'offset': offset + written, 'locked_at': None}
+    if offset == 0 and written:
+        values['content_type'] = content_type
+    if values['offset'] == length:
+        digest = sha.hexdigest() if sha is not None else file_sha256(path)
+        values.update(sha256=digest, storage_path=content_path(digest),
+                      completed_at=datetime.utcnow())
+    updated = db.session.execute(
+        update(Upload).where(*mine).values(**values)
+        .execution_options(synchronize_session=False)).rowcount
+    if not updated:
+        db.session.rollback()
+        return _error('The upload lock expired; resume from the reported offset.', 409,
+                      db.session.get(Upload, upload_id))
+    if 'sha256' in values:
+        store(upload_id, values['sha256'])
+    db.session.commit()
+    upload = db.session.get(Upload, upload_id)
+    if status is not None:
+        status.headers['Upload-Offset'] = str(upload.offset)
+        return status
+    return _upload_response(upload)
+
+@uploads.route('/<upload_id>/file')
+@login_required
+def download_upload(upload_id):
+    """Serve one of the user's finished uploads, handing the transfer to nginx when available."""
+    upload = Upload.query.filter_by(id=upload_id, user_id=current_user.id).first_or_404()
+    if not upload.is_complete:
+        return _error('Upload is not complete.', 409, upload)
+
+    if current_app.config['USE_X_ACCEL_REDIRECT']:
+        response = current_app.response_class(mimetype=upload.content_type)
+        response.headers['X-Accel-Redirect'] = \
+            f"{current_app.config['ATTACHMENT_ACCEL_PREFIX']}/{upload.storage_path}"
+        response.headers.set('Content-Disposition', 'attachment', filename=upload.filename)
+        return response
+    return send_file(stored_path(upload.storage_path), mimetype=upload.content_type,
+                     as_attachment=True, download_name=upload.filename)
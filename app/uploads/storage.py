@@ -0,0 +1,90 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import or_, select
+from app import db
+from .models import Upload
+
+# Leading bytes of every accepted attachment type, with the extensions
+# a file of that type may carry
+SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png', {'png'}),
+    (b'\xff\xd8\xff', 'image/jpeg', {'jpg', 'jpeg'}),
+    (b'GIF87a', 'image/gif', {'gif'}),
+    (b'GIF89a', 'image/gif', {'gif'}),
+    (b'%PDF-', 'application/pdf', {'pdf'}),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/msword', {'doc'}),
+    (b'PK\x03\x04', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+     {'docx'}),
+)
+
+# Enough leading bytes to identify every type above
+SNIFF_LENGTH = 8
+
+def sniff_content_type(head, filename):
+    """Return the MIME type of ``head`` if it is allowed for ``filename``, else None."""
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if ext not in current_app.config['ALLOWED_EXTENSIONS']:
+        return None
+    for magic, content_type, extensions in SIGNATURES:
+        if head.startswith(magic) and ext in extensions:
+            return content_type
+    return None
+
+def partial_path(upload_id):
+    return os.path.join(current_app.config['ATTACHMENT_FOLDER'], 'partial', upload_id)
+
+def stored_path(relative_path):
+    return os.path.join(current_app.config['ATTACHMENT_FOLDER'], relative_path)
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(current_app.config['UPLOAD_CHUNK_SIZE']), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def content_path(digest):
+    """Where a file with this SHA-256 is stored, relative to ``ATTACHMENT_FOLDER``."""
+    return os.path.join(digest[:2], digest)
+
+def store(upload_id, digest):
+    """Move a finished upload to its content-addressed location.
+
+    Returns the path relative to ``ATTACHMENT_FOLDER``. Identical files are
+    stored once; the duplicate is discarded.
+    """
+    relative_path = content_path(digest)
+    final_path = stored_path(relative_path)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    if os.path.exists(final_path):
+        os.remove(partial_path(upload_id))
+    else:
+        os.replace(partial_path(upload_id), final_path)
+    return relative_path
+
+def purge_stale_uploads(now=None):
+    """Delete uploads left unfinished for ``UPLOAD_EXPIRY`` seconds, with their partial files.
+
+    Uploads a PATCH request is writing are skipped. Returns the number deleted.
+    """
+    now = now or datetime.utcnow()
+    stale = (
+        Upload.completed_at.is_(None),
+        Upload.created_at < now - timedelta(seconds=current_app.config['UPLOAD_EXPIRY']),
+        or_(Upload.locked_at.is_(None),
+            Upload.locked_at < now - timedelta(seconds=current_app.config['UPLOAD_LOCK_TIMEOUT'])))
+    deleted = 0
+    for upload_id in db.session.scalars(select(Upload.id).where(*stale)).all():
+        # Re-checked per row, in case a client resumed it in the meantime
+        if db.session.execute(Upload.__table__.delete()
+                              .where(Upload.id == upload_id, *stale)).rowcount:
+            db.session.commit()
+            deleted += 1
+            try:
+                os.remove(partial_path(upload_id))
+            except FileNotFoundError:
+                pass
+    db.session.commit()
+    return deleted
@@ -0,0 +1,172 @@
+import importlib.util
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.utils.lazy import LazyModule
+
+# Imported once REDIS_URL is set; redis is optional and caches stay
+# process-local without it
+redis = LazyModule('redis')
+HAVE_REDIS = importlib.util.find_spec('redis') is not None
+
+# Every cache created in the application, keyed by name
+caches = {}
+
+_MISSING = object()
+
+class TTLCache:
+    """Thread-safe in-process LRU cache whose entries expire after ``ttl`` seconds.
+
+    When ``REDIS_URL`` is configured the cache gains a second, shared tier:
+    local misses fall through to Redis and writes and invalidations are
+    mirrored there so every gunicorn worker sees the same entries. Local
+    copies then live at most ``LOCAL_CACHE_TTL`` seconds, which bounds how
+    long another worker can serve an entry invalidated elsewhere.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=60):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.local_ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        caches[name] = self
+
+    def _redis_key(self, key):
+        return f'cache:{self.name}:{key}'
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        value = self._redis_get(key)
+        if value is _MISSING:
+            with self._lock:
+                self.misses += 1
+            return default
+
+        self._store(key, value)
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def get_or_set(self, key, factory):
+        """Return the cached value for ``key``, computing it with ``factory`` on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self._store(key, value)
+        if self._redis is not None:
+            try:
+                self._redis.set(self._redis_key(key), pickle.dumps(value),
+                                ex=max(int(self.ttl), 1))
+            except redis.RedisError:
+                pass
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+        if self._redis is not None:
+            try:
+                self._redis.delete(self._redis_key(key))
+            except redis.RedisError:
+                pass
+
+    def clear(self):
+        self.clear_local()
+        if self._redis is not None:
+            try:
+                keys = list(self._redis.scan_iter(self._redis_key('*')))
+                if keys:
+                    self._redis.delete(*keys)
+            except redis.RedisError:
+                pass
+
+    def clear_local(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'size': len(self._data)
+        }
+
+    def _store(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.local_ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def _redis_get(self, key):
+        if self._redis is None:
+            return _MISSING
+        try:
+            raw = self._redis.get(self._redis_key(key))
+        except redis.RedisError:
+            return _MISSING
+        return _MISSING if raw is None else pickle.loads(raw)
+
+def init_app(app):
+    """Apply per-cache TTLs from config and attach the optional Redis tier.
+
+    Must run after the blueprints are imported, since that is where caches
+    are created. A cache named ``site_stats`` reads its TTL from
+    ``SITE_STATS_CACHE_TTL``. The Redis client is shared through
+    ``app.extensions['redis']`` (None without Redis).
+    """
+    client = None
+    redis_url = app.config.get('REDIS_URL')
+    if redis_url and HAVE_REDIS and not app.testing:
+        client = redis.Redis.from_url(redis_url,
+                                      socket_timeout=app.config['REDIS_SOCKET_TIMEOUT'])
+    app.extensions['redis'] = client
+
+    for cache in caches.values():
+        cache.ttl = app.config.get(f'{cache.name.upper()}_CACHE_TTL', cache.ttl)
+        cache.local_ttl = cache.ttl
+        if client is not None:
+            cache.local_ttl = min(cache.ttl, app.config['LOCAL_CACHE_TTL'])
+        cache._redis = client
+        cache.clear_local()
+
+def invalidate_on_commit(session, cache, key=None):
+    """Drop ``key`` (or the whole cache) once ``session`` commits.
+
+    Invalidating inside a flush would let a concurrent request re-cache the
+    old rows before the transaction is visible, so it is deferred.
+    """
+    pending = session.info.setdefault('cache_invalidations', set())
+    pending.add((cache.name, key))
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    for name, key in session.info.pop('cache_invalidations', ()):
+        if key is None:
+            caches[name].clear()
+        else:
+            caches[name].delete(key)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('cache_invalidations', None)
@@ -0,0 +1,234 @@
+import itertools
+import os
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session as FlaskSQLAlchemySession
+from sqlalchemy import Select, UpdateBase, create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DisconnectionError, SQLAlchemyError, TimeoutError as PoolTimeout
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool, Pool, QueuePool
+from app.utils.metrics import DB_POOL_TIMEOUTS, DB_POOL_WAIT
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that reports how long callers wait for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+# With gunicorn's preload_app the engines are created in the master; a
+# connection it opened must not be shared with the forked workers
+@event.listens_for(Pool, 'connect')
+def _remember_pid(dbapi_connection, connection_record):
+    connection_record.info['pid'] = os.getpid()
+
+@event.listens_for(Pool, 'checkout')
+def _check_pid(dbapi_connection, connection_record, connection_proxy):
+    if connection_record.info.get('pid', os.getpid()) != os.getpid():
+        connection_record.dbapi_connection = connection_proxy.dbapi_connection = None
+        raise DisconnectionError('Connection belongs to another process')
+
+def engine_options(config, uri=None):
+    """SQLAlchemy engine options for ``uri`` (``SQLALCHEMY_DATABASE_URI`` by default).
+
+    Each gunicorn worker has its own pool, sized for its request threads
+    plus the background threads (mail, images, broadcast flushes) that
+    share it: ``DB_POOL_SIZE`` connections are kept open and up to
+    ``DB_MAX_OVERFLOW`` more are opened under bursts. Connections are
+    checked before use and replaced after ``DB_POOL_RECYCLE`` seconds so
+    restarts and idle timeouts on the server side do not surface as
+    errors. Behind PgBouncer in transaction mode (``DB_PGBOUNCER``)
+    PgBouncer does the pooling, so connections are not kept and nothing
+    is sent that would outlive a transaction.
+    """
+    url = make_url(uri or config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}  # a single shared connection; Flask-SQLAlchemy sets it up
+
+    options = {'pool_pre_ping': True}
+    if config['DB_PGBOUNCER']:
+        options['poolclass'] = NullPool
+        if url.get_driver_name() == 'psycopg':
+            # psycopg 3 prepares repeated statements on the server by default
+            options['connect_args'] = {'prepare_threshold': None}
+        return options
+
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=config['DB_POOL_SIZE'],
+        max_overflow=config['DB_MAX_OVERFLOW'],
+        pool_timeout=config['DB_POOL_TIMEOUT'],
+        pool_recycle=config['DB_POOL_RECYCLE'])
+    return options
+
+def statement_timeout(seconds):
+    """Give the queries of a view a different timeout than ``DB_STATEMENT_TIMEOUT``.
+
+    Only marks the view: the timeout is picked up before the request
+    starts, so it also covers transactions that begin in outer decorators
+    such as ``login_required``.
+    """
+    def decorator(f):
+        f.statement_timeout = seconds  # copied onto wrappers by functools.wraps
+        return f
+    return decorator
+
+class StatementTimeout:
+    """Cap how long each statement of a request may run on PostgreSQL.
+
+    The limit is set with ``SET LOCAL`` at the start of every transaction,
+    so it works through PgBouncer and never leaks into the next user of
+    the connection. Background jobs run without a limit.
+    """
+
+    def __init__(self, app=None):
+        self.timeout = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.timeout = app.config['DB_STATEMENT_TIMEOUT']
+        app.extensions['statement_timeout'] = self
+        app.before_request(self._use_view_timeout)
+
+    def _use_view_timeout(self):
+        view = current_app.view_functions.get(request.endpoint)
+        seconds = getattr(view, 'statement_timeout', None)
+        if seconds is not None:
+            g.statement_timeout = seconds
+
+    def apply(self, connection):
+        if not has_request_context() or connection.dialect.name != 'postgresql':
+            return
+        seconds = g.get('statement_timeout', self.timeout)
+        if seconds:
+            connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(seconds * 1000)}')
+
+statement_timeouts = StatementTimeout()
+
+@event.listens_for(Session, 'after_begin')
+def _set_statement_timeout(session, transaction, connection):
+    statement_timeouts.apply(connection)
+
+# Safe methods; any other request may have written something its user will
+# want to see on the next page
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+def read_only(f):
+    """Let the SELECTs of a view be answered by a read replica.
+
+    Put it directly under ``@route`` so the user loaded by
+    ``login_required`` comes from the replica too.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        g.read_only = True
+        return f(*args, **kwargs)
+    return decorated
+
+class ReplicaRouter:
+    """Sends the reads of ``read_only`` views to the ``DB_REPLICA_URLS``.
+
+    Everything else uses the primary: writes, ``SELECT ... FOR UPDATE``,
+    reads after the request has flushed changes, views that are not
+    marked, and all requests of a user for ``DB_REPLICA_STICKY_SECONDS``
+    after they sent a POST (or any other unsafe method), so they read their
+    own writes. Replicas lagging more than ``DB_REPLICA_MAX_LAG`` seconds,
+    or not answering, are skipped until the next check; with none left the
+    primary serves the request.
+    """
+
+    def __init__(self, app=None):
+        self.engines = []
+        self.sticky_seconds = 5
+        self.max_lag = 5
+        self.lag_check_interval = 5
+        self._lags = {}  # engine -> (checked at, seconds behind)
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.engines = [create_engine(url, **engine_options(app.config, url))
+                        for url in app.config['DB_REPLICA_URLS']]
+        self.sticky_seconds = app.config['DB_REPLICA_STICKY_SECONDS']
+        self.max_lag = app.config['DB_REPLICA_MAX_LAG']
+        self.lag_check_interval = app.config['DB_REPLICA_LAG_CHECK_INTERVAL']
+        app.extensions['replicas'] = self
+        app.after_request(self._stick_to_primary)
+
+    def lag(self, engine):
+        """Seconds ``engine`` is behind the primary, re-checked every ``DB_REPLICA_LAG_CHECK_INTERVAL``."""
+        now = time.monotonic()
+        with self._lock:
+            checked_at, lag = self._lags.get(engine, (None, None))
+        if checked_at is None or now - checked_at >= self.lag_check_interval:
+            try:
+                lag = self._query_lag(engine)
+            except SQLAlchemyError:
+                current_app.logger.warning('Read replica %s is unavailable', engine.url,
+                                           exc_info=True)
+                lag = float('inf')
+            with self._lock:
+                self._lags[engine] = (now, lag)
+        return lag
+
+    def _query_lag(self, engine):
+        if engine.dialect.name != 'postgresql':
+            return 0.0
+        with engine.connect() as connection:
+            return float(connection.scalar(text(
+                'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) '
+                'END')))
+
+    def replica_for(self, db_session, clause):
+        """The replica to run ``clause`` on, or None for the primary."""
+        if not self.engines or not has_request_context() or not g.get('read_only'):
+            return None
+        if not isinstance(clause, Select) or clause._for_update_arg is not None:
+            return None
+        if db_session.info.get('wrote') or session.get('_primary_until', 0) > time.time():
+            return None
+        if '_replica' not in g:
+            # One replica per request, so its reads see a single snapshot
+            start = next(self._next)
+            candidates = self.engines[start % len(self.engines):] + \
+                self.engines[:start % len(self.engines)]
+            g._replica = next((engine for engine in candidates
+                               if self.lag(engine) <= self.max_lag), None)
+        return g._replica
+
+    def _stick_to_primary(self, response):
+        if self.engines and request.method not in READ_METHODS:
+            session['_primary_until'] = time.time() + self.sticky_seconds
+        return response
+
+replicas = ReplicaRouter()
+
+class RoutingSession(FlaskSQLAlchemySession):
+    """``db.session``, sending the reads of read-only views to a replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if isinstance(clause, UpdateBase):
+            self.info['wrote'] = True
+        elif bind is None:
+            replica = replicas.replica_for(self, clause)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+# Once a request has written, its later reads must see the writes
+@event.listens_for(Session, 'after_flush')
+def _mark_written(db_session, flush_context):
+    db_session.info['wrote'] = True
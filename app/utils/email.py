@@ -1,20 +1,11 @@
-from threading import Thread
 from flask import current_app, render_template
-from flask_mail import Message
-from app import mail
-
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
+from app.utils.email_render import prepare_email
+from app.utils.mail_queue import mail_queue
 
 def send_email(subject, sender, recipients, text_body, html_body):
-    msg = Message(subject, sender=sender, recipients=recipients)
-    msg.body = text_body
-    msg.html = html_body
-    
-    # Send email asynchronously
-    Thread(target=send_async_email,
-           args=(current_app._get_current_object(), msg)).start()
+    # Queue one message per recipient in the caller's transaction; the mail
+    # queue workers deliver them once it commits
+    mail_queue.enqueue(subject, sender, recipients, text_body, html_body)
 
 def send_password_reset_email(user, token):
     send_email(
@@ -38,35 +29,40 @@ def send_team_invitation_email(user, team, token):
                                 user=user, team=team, token=token)
     )
 
+def send_bulk_email(subject, recipients, template, **context):
+    """Send a personalized copy of ``template`` to every user in ``recipients``.
+
+    The templates are rendered once; each copy only substitutes the
+    ``recipient.*`` fields, so the cost per recipient is a string replace.
+    """
+    prepared = prepare_email(template, **context)
+    sender = current_app.config['MAIL_USERNAME']
+    messages = []
+    for user in recipients:
+        text_body, html_body = prepared.personalize(user)
+        messages.append({
+            'subject': subject,
+            'sender': sender,
+            'recipient': user.email,
+            'text_body': text_body,
+            'html_body': html_body
+        })
+    mail_queue.enqueue_many(messages)
+
 def send_announcement_email(announcement, recipients):
-    send_email(
+    send_bulk_email(
         f'[Volleyball System] New Announcement: {announcement.title}',
-        sender=current_app.config['MAIL_USERNAME'],
-        recipients=[user.email for user in recipients],
-        text_body=render_template('email/announcement.txt',
-                                announcement=announcement),
-        html_body=render_template('email/announcement.html',
-                                announcement=announcement)
+        recipients, 'announcement', announcement=announcement
     )
 
 def send_practice_reminder_email(practice, recipients):
-    send_email(
+    send_bulk_email(
         f'[Volleyball System] Practice Reminder: {practice.title}',
-        sender=current_app.config['MAIL_USERNAME'],
-        recipients=[user.email for user in recipients],
-        text_body=render_template('email/practice_reminder.txt',
-                                practice=practice),
-        html_body=render_template('email/practice_reminder.html',
-                                practice=practice)
+        recipients, 'practice_reminder', practice=practice
     )
 
 def send_game_reminder_email(game, recipients):
-    send_email(
+    send_bulk_email(
         f'[Volleyball System] Game Reminder: {game.title}',
-        sender=current_app.config['MAIL_USERNAME'],
-        recipients=[user.email for user in recipients],
-        text_body=render_template('email/game_reminder.txt',
-                                game=game),
-        html_body=render_template('email/game_reminder.html',
-                                game=game)
+        recipients, 'game_reminder', game=game
     )
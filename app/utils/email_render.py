@@ -0,0 +1,41 @@
+import re
+from flask import render_template
+from markupsafe import Markup, escape
+
+# Markers are ASCII record/unit separators, which never occur in template text
+_MARKER = re.compile('\x1e([a-z_]+)\x1f')
+
+class RecipientPlaceholder:
+    """Template stand-in for the recipient of a bulk email.
+
+    ``{{ recipient.first_name }}`` renders as a marker that
+    :meth:`PreparedEmail.personalize` later swaps for the real value. Only
+    plain attribute output is supported; filters would mangle the marker.
+    """
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return Markup(f'\x1e{name}\x1f')
+
+class PreparedEmail:
+    """Text and HTML bodies rendered once, personalized per recipient."""
+
+    def __init__(self, text_body, html_body):
+        self.text_body = text_body
+        self.html_body = html_body
+        self.fields = set(_MARKER.findall(text_body)) | set(_MARKER.findall(html_body))
+
+    def personalize(self, recipient):
+        values = {field: getattr(recipient, field, '') or '' for field in self.fields}
+        text = _MARKER.sub(lambda m: str(values[m.group(1)]), self.text_body)
+        html = _MARKER.sub(lambda m: str(escape(values[m.group(1)])), self.html_body)
+        return text, html
+
+def prepare_email(template, **context):
+    """Render ``email/<template>.txt`` and ``.html`` once for a whole recipient list."""
+    context['recipient'] = RecipientPlaceholder()
+    return PreparedEmail(
+        render_template(f'email/{template}.txt', **context),
+        render_template(f'email/{template}.html', **context)
+    )
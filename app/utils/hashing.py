@@ -0,0 +1,98 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+
+class HashingBusy(Exception):
+    """Raised when every hashing slot is taken and the wait queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__('password hashing queue is full')
+        self.retry_after = retry_after
+
+class PasswordHasher:
+    """Password hashing service that keeps KDF work off the request thread.
+
+    Hashes are computed in a small process pool so a burst of logins cannot
+    pin every gunicorn thread on CPU. At most ``PASSWORD_HASH_WORKERS`` hashes
+    run at once and ``PASSWORD_HASH_QUEUE_LIMIT`` more may wait; beyond that
+    :class:`HashingBusy` is raised and the client gets a 503. With zero
+    workers hashing runs inline, which is what development and tests use.
+    """
+
+    def __init__(self, app=None):
+        self.method = 'pbkdf2:sha256:600000'
+        self.workers = 0
+        self.queue_limit = 0
+        self.timeout = None
+        self.retry_after = 1
+        self._prefix = None
+        self._slots = None
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.queue_limit = app.config['PASSWORD_HASH_QUEUE_LIMIT']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        self.retry_after = app.config['PASSWORD_HASH_RETRY_AFTER']
+        self._prefix = None
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_limit) \
+            if self.workers else None
+        app.extensions['password_hasher'] = self
+
+    def hash(self, password):
+        pwhash = self._run(generate_password_hash, password, self.method)
+        if self._prefix is None:
+            self._prefix = pwhash.split('$', 1)[0]
+        return pwhash
+
+    def verify(self, pwhash, password):
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """Whether ``pwhash`` was produced with other parameters than configured."""
+        return pwhash.split('$', 1)[0] != self.prefix
+
+    @property
+    def prefix(self):
+        """The method as werkzeug writes it into hashes, e.g. ``scrypt:32768:8:1`` for ``scrypt``.
+
+        Short method names leave the parameters to werkzeug's defaults, so
+        the prefix is taken from a real hash, once per process and only
+        when first needed rather than at startup.
+        """
+        if self._prefix is None:
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return self._prefix
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy(self.retry_after)
+        try:
+            future = self._executor().submit(func, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except TimeoutError:
+                # A pool that cannot keep up is as busy as a full queue
+                future.cancel()
+                raise HashingBusy(self.retry_after)
+        finally:
+            self._slots.release()
+
+    def _executor(self):
+        # Created on first use, and again after a fork, so that every gunicorn
+        # worker owns its pool rather than sharing the master's.
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pool_pid = os.getpid()
+            return self._pool
@@ -0,0 +1,24 @@
+import importlib
+
+class LazyModule:
+    """Stands in for a module that is imported the first time it is used.
+
+    ``np = LazyModule('numpy')`` at the top of a module keeps numpy out of
+    worker boots, CLI commands and tests that never touch it, while the code
+    keeps reading ``np.unique(...)``. The import goes through the import
+    lock, so threads racing to use it get the same fully loaded module.
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self.__dict__['_module'] = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<lazy module {self._name!r} ({state})>'
@@ -0,0 +1,329 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import or_, and_, select, update, insert, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import db, mail
+
+THROTTLE = 'smtp'
+PURGE_INTERVAL = timedelta(hours=1)
+
+class OutboundEmail(db.Model):
+    """One queued message for a single recipient."""
+    __tablename__ = 'outbound_emails'
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(120))
+    recipient = db.Column(db.String(120), nullable=False)
+    text_body = db.Column(db.Text)
+    html_body = db.Column(db.Text)
+    status = db.Column(db.String(10), nullable=False, default='queued')  # 'queued', 'sending', 'sent', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime)
+    claim_token = db.Column(db.String(32), index=True)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_outbound_emails_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    def to_message(self):
+        return _message(self)
+
+    def __repr__(self):
+        return f'<OutboundEmail {self.id} {self.status}>'
+
+def _message(row):
+    """Flask-Mail message for a queued row (or a plain row of its columns)."""
+    msg = Message(row.subject, sender=row.sender, recipients=[row.recipient])
+    msg.body = row.text_body
+    msg.html = row.html_body
+    return msg
+
+class MailThrottle(db.Model):
+    """Shared send schedule: the earliest time the next message may go out."""
+    __tablename__ = 'mail_throttle'
+    name = db.Column(db.String(32), primary_key=True)
+    next_send_at = db.Column(db.DateTime, nullable=False)
+
+class MailQueue:
+    """Durable outbound mail queue drained by a fixed pool of worker threads.
+
+    ``send_email`` stores one row per recipient and wakes the workers. Each
+    worker claims up to ``MAIL_BATCH_SIZE`` rows, sends them over a single
+    SMTP connection, and reschedules failures with exponential backoff until
+    ``MAIL_MAX_RETRIES`` is reached. Sending is throttled to
+    ``MAIL_RATE_LIMIT`` messages per second across every process and host:
+    before sending, a batch reserves its send slots on a shared
+    ``MailThrottle`` row with a compare-and-set UPDATE. With
+    ``MAIL_QUEUE_WORKERS = 0`` rows are left for ``flask mail-worker``; in
+    eager mode (the default under TESTING) the queue is drained inline.
+    Sent and failed rows are deleted after ``MAIL_RETENTION_DAYS``, by the
+    workers about once an hour or by ``flask purge-mail``.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._threads = []
+        self._threads_pid = None
+        self._purged_at = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config['MAIL_QUEUE_WORKERS']
+        self.batch_size = app.config['MAIL_BATCH_SIZE']
+        self.max_retries = app.config['MAIL_MAX_RETRIES']
+        self.retry_backoff = app.config['MAIL_RETRY_BACKOFF']
+        self.rate_limit = app.config['MAIL_RATE_LIMIT']
+        self.send_interval = timedelta(seconds=1.0 / self.rate_limit) if self.rate_limit \
+            else timedelta(0)
+        self.claim_timeout = app.config['MAIL_CLAIM_TIMEOUT']
+        self.poll_interval = app.config['MAIL_QUEUE_POLL_INTERVAL']
+        self.retention = timedelta(days=app.config['MAIL_RETENTION_DAYS'])
+        self.eager = app.config.get('MAIL_QUEUE_EAGER', app.testing)
+        app.extensions['mail_queue'] = self
+
+    def enqueue(self, subject, sender, recipients, text_body, html_body):
+        """Queue one message per recipient; see :meth:`enqueue_many`."""
+        self.enqueue_many([{
+            'subject': subject,
+            'sender': sender,
+            'recipient': recipient,
+            'text_body': text_body,
+            'html_body': html_body
+        } for recipient in recipients])
+
+    def enqueue_many(self, messages):
+        """Queue individually addressed messages with one bulk INSERT.
+
+        The rows are part of the caller's transaction: nothing is committed
+        here, and the workers are woken once the caller commits.
+        """
+        if not messages:
+            return
+        now = datetime.utcnow()
+        db.session.execute(insert(OutboundEmail), [
+            dict(message, status='queued', attempts=0, created_at=now, next_attempt_at=now)
+            for message in messages
+        ])
+        db.session.info['mail_queue_wake'] = self
+
+    def wake(self):
+        if self.eager:
+            # Called from after_commit, where the committed session can't run
+            # SQL; a fresh app context drains with a session of its own
+            with self.app.app_context():
+                self.drain()
+        elif self.workers:
+            self._ensure_workers()
+            self._wakeup.set()
+
+    def depth(self):
+        """Number of messages waiting to be sent."""
+        return OutboundEmail.query.filter(
+            OutboundEmail.status.in_(['queued', 'sending'])).count()
+
+    def drain(self, limit=None):
+        """Send batches until the queue is empty (or ``limit`` messages were sent)."""
+        sent = 0
+        while limit is None or sent < limit:
+            batch, first_slot = self._claim_batch()
+            if not batch:
+                break
+            sent += self._send_batch(batch, first_slot)
+        return sent
+
+    def purge(self, now=None):
+        """Delete sent and failed messages older than the retention period.
+
+        They hold rendered bodies, password-reset links among them, that are
+        of no use once delivery is settled. Returns the number deleted.
+        """
+        now = now or datetime.utcnow()
+        deleted = db.session.execute(
+            OutboundEmail.__table__.delete()
+            .where(OutboundEmail.status.in_(['sent', 'failed']),
+                   OutboundEmail.created_at < now - self.retention)
+        ).rowcount
+        db.session.commit()
+        self._purged_at = now
+        return deleted
+
+    def _claim_batch(self):
+        # Claim with a single conditional UPDATE so that concurrent workers
+        # never get the same row, even on databases without SKIP LOCKED.
+        now = datetime.utcnow()
+        lease_expired = now - timedelta(seconds=self.claim_timeout)
+        claimable = or_(
+            and_(OutboundEmail.status == 'queued',
+                 OutboundEmail.next_attempt_at <= now),
+            and_(OutboundEmail.status == 'sending',
+                 OutboundEmail.claimed_at < lease_expired)
+        )
+        candidates = select(OutboundEmail.id).where(claimable) \
+            .order_by(OutboundEmail.id) \
+            .limit(self.batch_size) \
+            .with_for_update(skip_locked=True)
+        while True:
+            token = uuid.uuid4().hex
+            claimed = db.session.execute(
+                update(OutboundEmail)
+                .where(OutboundEmail.id.in_(candidates), claimable)
+                .values(status='sending', claimed_at=now, claim_token=token)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not claimed:
+                db.session.rollback()
+                return [], None
+            # The send slots are reserved in the claiming transaction, so a
+            # lost race on the schedule simply releases the rows again
+            try:
+                first_slot = self._reserve(claimed)
+                if first_slot is not None:
+                    # Plain rows, read before the commit: no transaction (and
+                    # no pooled connection) stays open while the batch is sent
+                    rows = db.session.execute(
+                        select(OutboundEmail.id, OutboundEmail.subject, OutboundEmail.sender,
+                               OutboundEmail.recipient, OutboundEmail.text_body,
+                               OutboundEmail.html_body, OutboundEmail.attempts,
+                               OutboundEmail.claim_token)
+                        .where(OutboundEmail.claim_token == token)
+                        .order_by(OutboundEmail.id)).all()
+                    db.session.commit()
+            except IntegrityError:
+                first_slot = None  # another worker created the schedule row first
+            if first_slot is None:
+                db.session.rollback()
+                continue
+            return rows, first_slot
+
+    def _send_batch(self, rows, first_slot):
+        """Send claimed rows over one SMTP connection, then record the outcomes."""
+        sent_ids = []
+        failures = []
+        try:
+            with mail.connect() as conn:
+                for i, row in enumerate(rows):
+                    self._wait_until(first_slot + i * self.send_interval)
+                    try:
+                        conn.send(_message(row))
+                    except Exception as e:
+                        failures.append((row, e))
+                    else:
+                        sent_ids.append(row.id)
+        except Exception as e:
+            # Connecting (or closing) failed; nothing left in 'sending' is lost
+            done = set(sent_ids) | {row.id for row, _ in failures}
+            failures.extend((row, e) for row in rows if row.id not in done)
+
+        # One short transaction, and only for rows this batch still owns
+        token = rows[0].claim_token if rows else None
+        if sent_ids:
+            db.session.execute(
+                update(OutboundEmail)
+                .where(OutboundEmail.id.in_(sent_ids), OutboundEmail.claim_token == token)
+                .values(status='sent', sent_at=datetime.utcnow())
+                .execution_options(synchronize_session=False))
+        for row, error in failures:
+            self._retry_later(row, error)
+        db.session.commit()
+        return len(sent_ids)
+
+    def _retry_later(self, row, error):
+        attempts = row.attempts + 1
+        values = {'attempts': attempts, 'last_error': str(error)[:255]}
+        if attempts >= self.max_retries:
+            values['status'] = 'failed'
+            current_app.logger.error('Giving up on email %s to %s: %s',
+                                     row.id, row.recipient, error)
+        else:
+            delay = self.retry_backoff * 2 ** (attempts - 1)
+            values.update(status='queued',
+                          next_attempt_at=datetime.utcnow() + timedelta(seconds=delay))
+        db.session.execute(
+            update(OutboundEmail)
+            .where(OutboundEmail.id == row.id, OutboundEmail.claim_token == row.claim_token)
+            .values(**values)
+            .execution_options(synchronize_session=False))
+
+    def _reserve(self, count):
+        """Reserve ``count`` send slots on the shared schedule, without committing.
+
+        Returns the time of the first slot, or None if another worker
+        reserved slots since the schedule was read.
+        """
+        now = datetime.utcnow()
+        if not self.send_interval:
+            return now
+        current = db.session.scalar(
+            select(MailThrottle.next_send_at).where(MailThrottle.name == THROTTLE))
+        if current is None:
+            db.session.add(MailThrottle(name=THROTTLE, next_send_at=now + count * self.send_interval))
+            db.session.flush()
+            return now
+        start = max(now, current)
+        taken = db.session.execute(
+            update(MailThrottle)
+            .where(MailThrottle.name == THROTTLE, MailThrottle.next_send_at == current)
+            .values(next_send_at=start + count * self.send_interval)).rowcount
+        return start if taken else None
+
+    def _wait_until(self, slot):
+        delay = (slot - datetime.utcnow()).total_seconds()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _ensure_workers(self):
+        # Threads do not survive a fork, so each gunicorn worker starts its own
+        with self._start_lock:
+            if self._threads_pid == os.getpid():
+                return
+            self._threads = [
+                threading.Thread(target=self.run_worker, daemon=True,
+                                 name=f'mail-queue-{i}')
+                for i in range(self.workers)
+            ]
+            self._threads_pid = os.getpid()
+        for thread in self._threads:
+            thread.start()
+
+    def run_worker(self, stop=None):
+        """Worker loop: drain, then sleep until woken or the poll interval passes."""
+        with self.app.app_context():
+            while stop is None or not stop.is_set():
+                try:
+                    self.drain()
+                    if self._purged_at is None or \
+                            datetime.utcnow() - self._purged_at > PURGE_INTERVAL:
+                        self.purge()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('Mail queue worker failed')
+                finally:
+                    db.session.remove()
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+mail_queue = MailQueue()
+
+@event.listens_for(Session, 'after_commit')
+def _wake_after_commit(session):
+    queue = session.info.pop('mail_queue_wake', None)
+    if queue is not None:
+        queue.wake()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_wake(session):
+    session.info.pop('mail_queue_wake', None)
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from flask import g, request
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+                               multiprocess, REGISTRY)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+from app.utils.cache import TTLCache, caches
+
+# Under gunicorn every worker writes its samples to files in
+# PROMETHEUS_MULTIPROC_DIR (set by gunicorn.conf.py before the app is
+# imported) and a scrape of any worker aggregates them all.
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time spent handling requests',
+    ['blueprint', 'endpoint', 'method'], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter(
+    'http_requests_total', 'Requests handled', ['blueprint', 'endpoint', 'method', 'status'])
+IN_PROGRESS = Gauge(
+    'http_requests_in_progress', 'Requests being handled', ['blueprint'],
+    multiprocess_mode='livesum')
+DB_CONNECTIONS = Gauge(
+    'db_pool_connections', 'Database connections held by the pools, by state', ['state'],
+    multiprocess_mode='livesum')
+DB_POOL_WAIT = Histogram(
+    'db_pool_wait_seconds', 'Time spent waiting for a database connection',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 10.0))
+DB_POOL_TIMEOUTS = Counter(
+    'db_pool_timeouts_total', 'Requests that gave up waiting for a database connection')
+REMINDER_LAG = Histogram(
+    'reminder_dispatch_lag_seconds', 'Time between a reminder falling due and its dispatch',
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0))
+REMINDERS_DISPATCHED = Counter(
+    'reminders_dispatched_total', 'Reminders handled by the scheduler, by kind and outcome',
+    ['kind', 'status'])
+REMINDER_LEADER = Gauge(
+    'reminder_scheduler_leader', 'Whether this process holds the reminder scheduler lease',
+    multiprocess_mode='livesum')
+BROADCAST_CHAT_DROPPED = Counter(
+    'broadcast_chat_dropped_total', 'Chat messages dropped because the write-behind buffer was full')
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache lookups, by result', ['cache', 'result'])
+
+@event.listens_for(Pool, 'connect')
+def _connected(dbapi_connection, connection_record):
+    DB_CONNECTIONS.labels('open').inc()
+
+@event.listens_for(Pool, 'close')
+def _closed(dbapi_connection, connection_record):
+    DB_CONNECTIONS.labels('open').dec()
+
+@event.listens_for(Pool, 'checkout')
+def _checked_out(dbapi_connection, connection_record, connection_proxy):
+    DB_CONNECTIONS.labels('checked_out').inc()
+
+@event.listens_for(Pool, 'checkin')
+def _checked_in(dbapi_connection, connection_record):
+    DB_CONNECTIONS.labels('checked_out').dec()
+
+# Every worker answers scrapes, so the queue counts are shared through the
+# cache (and Redis, when configured) instead of being run on each one
+queue_cache = TTLCache('queue_metrics', maxsize=1, ttl=5)
+
+class _QueueCollector:
+    """Values shared by every worker, read from the database at most every few seconds."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def collect(self):
+        from app.schedule.reminders import reminder_scheduler
+        from app.utils.mail_queue import mail_queue
+        with self.app.app_context():
+            depth, overdue = queue_cache.get_or_set('queues', lambda: (
+                mail_queue.depth(), reminder_scheduler.overdue_seconds()))
+        yield GaugeMetricFamily('mail_queue_depth', 'Messages waiting to be sent', value=depth)
+        yield GaugeMetricFamily('reminder_queue_lag_seconds',
+                                'How long the oldest due reminder has been waiting', value=overdue)
+
+class Metrics:
+    """Prometheus metrics for requests, database connections and caches.
+
+    Every request is timed into a latency histogram per blueprint and
+    endpoint and counted by status; ``render`` produces the exposition
+    text served at ``/metrics``. Cache hit counts are exported as they
+    change, so hit ratios can be computed across workers.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self._cache_counts = {}
+        self._cache_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config['METRICS_ENABLED']
+        app.extensions['metrics'] = self
+        if self.enabled:
+            app.before_request(self._start)
+            app.after_request(self._record)
+            app.teardown_request(self._teardown)
+
+    def render(self):
+        """Exposition text of every metric, aggregated over all workers when multiprocess."""
+        if MULTIPROCESS:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        shared = CollectorRegistry()
+        shared.register(_QueueCollector(self.app))
+        return generate_latest(registry) + generate_latest(shared)
+
+    def _labels(self):
+        return request.blueprint or '', request.endpoint or 'unmatched', request.method
+
+    def _start(self):
+        g._metrics_started = time.perf_counter()
+        blueprint = request.blueprint or ''
+        IN_PROGRESS.labels(blueprint).inc()
+        g._metrics_blueprint = blueprint
+
+    def _record(self, response):
+        started = g.get('_metrics_started')
+        if started is not None:
+            blueprint, endpoint, method = self._labels()
+            REQUEST_LATENCY.labels(blueprint, endpoint, method).observe(
+                time.perf_counter() - started)
+            REQUESTS.labels(blueprint, endpoint, method, str(response.status_code)).inc()
+            self._export_cache_counts()
+        return response
+
+    def _teardown(self, exc):
+        blueprint = g.pop('_metrics_blueprint', None)
+        if blueprint is not None:
+            IN_PROGRESS.labels(blueprint).dec()
+
+    def _export_cache_counts(self):
+        with self._cache_lock:
+            for name, cache in caches.items():
+                seen_hits, seen_misses = self._cache_counts.get(name, (0, 0))
+                hits, misses = cache.hits, cache.misses
+                if hits > seen_hits:
+                    CACHE_REQUESTS.labels(name, 'hit').inc(hits - seen_hits)
+                if misses > seen_misses:
+                    CACHE_REQUESTS.labels(name, 'miss').inc(misses - seen_misses)
+                self._cache_counts[name] = (hits, misses)
+
+metrics = Metrics()
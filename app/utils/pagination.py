@@ -0,0 +1,44 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import DateTime, tuple_
+
+def encode_cursor(values):
+    """Opaque cursor for the sort key ``values`` of the last row on a page."""
+    data = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, columns):
+    """Sort key values from ``cursor``; raises ValueError if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError('wrong number of values')
+        return [_cursor_value(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def _cursor_value(column, value):
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise TypeError(f'unexpected {type(value).__name__} for {column.key}')
+    return value
+
+def keyset_page(query, columns, cursor=None, limit=20):
+    """Fetch the page after ``cursor`` of ``query`` ordered by ``columns``, newest first.
+
+    Unlike OFFSET, the cost does not grow with how deep the page is: the
+    cursor becomes a ``(columns) < (values)`` range on an index that starts
+    with the query's equality filters and ends with ``columns``. The last
+    column must be unique. Returns ``(items, next_cursor)``; ``next_cursor``
+    is None on the last page.
+    """
+    if cursor:
+        query = query.filter(tuple_(*columns) < tuple_(*decode_cursor(cursor, columns)))
+    items = query.order_by(*[column.desc() for column in columns]).limit(limit + 1).all()
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor([getattr(items[-1], column.key) for column in columns])
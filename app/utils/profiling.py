@@ -0,0 +1,164 @@
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app, g, render_template, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Profile that statements run in this thread/request are recorded into
+_current = ContextVar('query_profile', default=None)
+
+# Expanded IN lists and VALUES rows vary in length; fold them so the same
+# statement with a different number of parameters counts as a repeat
+_PARAMETER_LIST = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_statement(statement):
+    """The shape of a SQL statement, for spotting the same query run over and over."""
+    return _PARAMETER_LIST.sub('(...)', _WHITESPACE.sub(' ', statement).strip())
+
+class QueryProfile:
+    """The statements run while handling one request (or inside ``capture``)."""
+
+    def __init__(self, method=None, path=None, endpoint=None):
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint
+        self.started_at = time.time()
+        self.queries = []  # (statement, seconds)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(seconds for _, seconds in self.queries)
+
+    def slowest(self, n=5):
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:n]
+
+    def repeated(self, threshold):
+        """``(statement, times run, total seconds)`` for statements run at least ``threshold`` times.
+
+        A statement repeated with only its parameters changing is the usual
+        sign of a lazy load inside a loop (N+1 queries).
+        """
+        counts = Counter()
+        seconds = Counter()
+        for statement, duration in self.queries:
+            shape = normalize_statement(statement)
+            counts[shape] += 1
+            seconds[shape] += duration
+        return [(shape, count, seconds[shape])
+                for shape, count in counts.most_common() if count >= threshold]
+
+    def describe(self, threshold):
+        lines = [f'{self.method} {self.path}: {self.count} queries in {self.total_time * 1000:.1f} ms']
+        for shape, count, _ in self.repeated(threshold):
+            lines.append(f'  {count}x {shape}')
+        return '\n'.join(lines)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    started = conn.info.get('query_started')
+    if profile is not None and started:
+        profile.queries.append((statement, time.perf_counter() - started.pop()))
+
+class QueryProfiler:
+    """Per-request SQL statistics built on SQLAlchemy engine events.
+
+    With ``SQL_PROFILING`` (on by default under DEBUG) every response
+    carries ``X-Query-Count``, ``X-Query-Time`` (ms) and
+    ``X-Query-Repeated`` headers, requests running a statement
+    ``SQL_PROFILING_REPEAT_THRESHOLD`` times or more are logged as likely
+    N+1 queries, and in debug mode the last ``SQL_PROFILING_HISTORY``
+    requests are listed at ``/debug/queries``. Otherwise requests are only
+    profiled while someone ``observe``s them, e.g. the query budget
+    pytest plugin.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.repeat_threshold = 5
+        self.recent = deque(maxlen=50)
+        self._observers = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SQL_PROFILING', app.debug)
+        self.repeat_threshold = app.config['SQL_PROFILING_REPEAT_THRESHOLD']
+        self.recent = deque(maxlen=app.config['SQL_PROFILING_HISTORY'])
+        app.extensions['query_profiler'] = self
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        if self.enabled and app.debug:
+            app.add_url_rule('/debug/queries', 'debug_queries', self._panel)
+
+    @contextmanager
+    def capture(self):
+        """Record the statements run inside the block into the yielded profile."""
+        profile = QueryProfile()
+        token = _current.set(profile)
+        try:
+            yield profile
+        finally:
+            _current.reset(token)
+
+    @contextmanager
+    def observe(self, callback):
+        """Profile every request handled inside the block and pass each profile to ``callback``."""
+        with self._lock:
+            self._observers.append(callback)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._observers.remove(callback)
+
+    def _start(self):
+        if self.enabled or self._observers:
+            profile = QueryProfile(request.method, request.path, request.endpoint)
+            g._query_profile_token = _current.set(profile)
+
+    def _finish(self, response):
+        profile = _current.get()
+        if profile is None or '_query_profile_token' not in g:
+            return response
+        repeated = profile.repeated(self.repeat_threshold)
+        if self.enabled:
+            response.headers['X-Query-Count'] = str(profile.count)
+            response.headers['X-Query-Time'] = f'{profile.total_time * 1000:.1f}'
+            response.headers['X-Query-Repeated'] = str(len(repeated))
+            if request.endpoint != 'debug_queries':
+                self.recent.append(profile)
+            if repeated:
+                current_app.logger.warning('Possible N+1 queries in %s',
+                                           profile.describe(self.repeat_threshold))
+        for callback in list(self._observers):
+            callback(profile)
+        return response
+
+    def _teardown(self, exc):
+        token = g.pop('_query_profile_token', None)
+        if token is not None:
+            _current.reset(token)
+
+    def _panel(self):
+        return render_template('debug/queries.html', title='Queries',
+                               profiles=list(reversed(self.recent)),
+                               threshold=self.repeat_threshold)
+
+query_profiler = QueryProfiler()
@@ -0,0 +1,32 @@
+"""pytest plugin that fails tests whose requests run more SQL queries than declared.
+
+Load it from conftest.py with ``pytest_plugins = ['app.utils.pytest_plugin']``
+and give a test a budget; every request the test makes must stay within it::
+
+    @pytest.mark.query_budget(4)
+    def test_dashboard(client, auth):
+        ...
+"""
+import pytest
+from .profiling import query_profiler
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'query_budget(n): fail if a request in the test runs more than n SQL queries')
+
+# Old-style hook wrapper: new-style (wrapper=True) needs pluggy 1.2, and
+# setup.py still allows pytest 6
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    marker = item.get_closest_marker('query_budget')
+    if marker is None:
+        yield
+        return
+    budget = marker.args[0]
+    profiles = []
+    with query_profiler.observe(profiles.append):
+        yield
+    over = [profile for profile in profiles if profile.count > budget]
+    if over:
+        report = '\n'.join(profile.describe(query_profiler.repeat_threshold) for profile in over)
+        pytest.fail(f'Query budget of {budget} exceeded:\n{report}', pytrace=False)
@@ -0,0 +1,15 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+
+def upsert(model):
+    """INSERT for ``model`` that supports ``on_conflict_do_update`` on the bound database.
+
+    PostgreSQL and SQLite share the ON CONFLICT syntax; other databases are
+    not supported.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(model)
+    if dialect == 'sqlite':
+        return sqlite.insert(model)
+    raise NotImplementedError(f'No upsert support for {dialect}')
@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Runs in a fresh interpreter, so nothing is imported yet
+_PROBE = '''
+import json, resource, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app(sys.argv[1])
+finished = time.perf_counter()
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"import": imported - started, "create_app": finished - imported,
+                  "total": finished - started,
+                  "rss_mb": rss / (1024 * 1024 if sys.platform == "darwin" else 1024)}))
+'''
+
+class StartupProfile:
+    """Cost of importing the app and running ``create_app`` in a fresh interpreter."""
+
+    def __init__(self, timings, modules):
+        self.import_time = timings['import']
+        self.create_app_time = timings['create_app']
+        self.total_time = timings['total']
+        self.rss_mb = timings['rss_mb']
+        self.modules = modules  # (name, self seconds, cumulative seconds)
+
+    def slowest_modules(self, n=20):
+        """Imports with the largest cumulative time, including what they import."""
+        return sorted(self.modules, key=lambda m: m[2], reverse=True)[:n]
+
+    def by_package(self):
+        """Import time per top-level package (self times summed), largest first."""
+        totals = defaultdict(float)
+        for name, own, _ in self.modules:
+            totals[name.split('.')[0]] += own
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+def profile_startup(config_name='default', env=None, importtime=True):
+    """Import the app and call ``create_app`` in a child Python.
+
+    With ``importtime`` the child runs under ``-X importtime`` to list the
+    cost of every module; that slows the import down, so leave it off when
+    only the totals matter.
+    """
+    flags = ['-X', 'importtime'] if importtime else []
+    result = subprocess.run(
+        [sys.executable, *flags, '-c', _PROBE, config_name],
+        cwd=ROOT, env=dict(os.environ, **(env or {})),
+        capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        # 'import time:  <self us> | <cumulative us> | <indented module name>'
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, label = line[len('import time:'):].split('|')
+        modules.append((label.strip(), int(own) / 1e6, int(cumulative) / 1e6))
+    return StartupProfile(json.loads(result.stdout.strip().splitlines()[-1]), modules)
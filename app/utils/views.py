@@ -0,0 +1,26 @@
+from flask import jsonify
+from flask_login import current_user
+from app.auth.models import TeamMember
+
+def json_error(message, status):
+    response = jsonify({'error': message})
+    response.status_code = status
+    return response
+
+def has_role(*names):
+    """Whether the signed-in user has one of the role ``names``."""
+    return current_user.role is not None and current_user.role.name in names
+
+def manages_team(team_id):
+    """Admins manage every team, coaches the teams they coach."""
+    if not has_role('admin', 'coach'):
+        return False
+    return has_role('admin') or TeamMember.query.filter_by(
+        team_id=team_id, user_id=current_user.id, role='coach').first() is not None
+
+def managed_team_ids():
+    """Ids of the teams a coach coaches; None for admins, who manage them all."""
+    if has_role('admin'):
+        return None
+    return {member.team_id for member in
+            TeamMember.query.filter_by(user_id=current_user.id, role='coach')}
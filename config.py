@@ -1,5 +1,15 @@
 import os
-from datetime import timedelta
+from datetime import date, timedelta
+
+def db_pool_size(request_threads):
+    """Connections one process needs: one per request thread and per background thread.
+
+    The background threads are the mail and image workers, the broadcast
+    flusher and one for the reminder scheduler or an analytics refresh.
+    gunicorn.conf.py sizes the workers' pools with this too.
+    """
+    return (request_threads + int(os.environ.get('MAIL_QUEUE_WORKERS', '2'))
+            + int(os.environ.get('IMAGE_WORKERS', '2')) + 2)
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-please-change-in-production'
@@ -7,6 +17,19 @@ class Config:
     if SQLALCHEMY_DATABASE_URI.startswith("postgres://"):
         SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace("postgres://", "postgresql://", 1)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Database connection settings (see app/utils/database.py; DB_POOL_SIZE
+    # and DB_MAX_OVERFLOW are read in init_app)
+    DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', 'false').lower() in ['true', 'on', '1']
+    DB_POOL_TIMEOUT = 10  # seconds to wait for a connection before failing the request
+    DB_POOL_RECYCLE = 1800  # seconds before a connection is replaced
+    DB_STATEMENT_TIMEOUT = float(os.environ.get('DB_STATEMENT_TIMEOUT', '15'))  # seconds, 0 for none
+
+    # Read replicas for views marked @read_only (comma-separated URLs)
+    DB_REPLICA_URLS = [url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url]
+    DB_REPLICA_MAX_LAG = 5  # seconds behind the primary before a replica is skipped
+    DB_REPLICA_LAG_CHECK_INTERVAL = 5  # seconds
+    DB_REPLICA_STICKY_SECONDS = 5  # a user reads from the primary this long after a write
     
     # Mail settings
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -14,17 +37,101 @@ class Config:
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'true').lower() in ['true', 'on', '1']
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+
+    # Outbound mail queue settings
+    MAIL_QUEUE_WORKERS = int(os.environ.get('MAIL_QUEUE_WORKERS', '2'))  # 0: use `flask mail-worker`
+    MAIL_BATCH_SIZE = 50  # messages sent per SMTP connection
+    MAIL_MAX_RETRIES = 5
+    MAIL_RETRY_BACKOFF = 30  # seconds, doubled on every attempt
+    MAIL_RATE_LIMIT = float(os.environ.get('MAIL_RATE_LIMIT', '10'))  # messages/sec across all processes, 0 for no limit
+    MAIL_CLAIM_TIMEOUT = 300  # seconds before a stuck batch is picked up again
+    MAIL_QUEUE_POLL_INTERVAL = 30  # seconds
+    MAIL_RETENTION_DAYS = int(os.environ.get('MAIL_RETENTION_DAYS', '7'))  # days sent/failed mail is kept
     
     # File upload settings
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx'}
+
+    # Attachment upload settings
+    ATTACHMENT_FOLDER = os.path.join(UPLOAD_FOLDER, 'attachments')
+    ATTACHMENT_MAX_SIZE = 50 * 1024 * 1024  # total size of a chunked upload
+    UPLOAD_CHUNK_SIZE = 64 * 1024  # bytes read from the request body at a time
+    UPLOAD_LOCK_TIMEOUT = 600  # seconds before an abandoned PATCH stops blocking a resume
+    UPLOAD_EXPIRY = 24 * 3600  # seconds an unfinished upload is kept (`flask purge-uploads`)
+    USE_X_ACCEL_REDIRECT = os.environ.get('USE_X_ACCEL_REDIRECT', 'false').lower() in ['true', 'on', '1']
+    ATTACHMENT_ACCEL_PREFIX = '/protected-uploads'  # internal nginx location
+
+    # Profile picture processing settings
+    IMAGE_SPOOL_FOLDER = os.path.join(UPLOAD_FOLDER, 'spool')
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', '2'))
+    PROFILE_IMAGE_SIZES = (40, 150, 300)  # pixels, longest side
+    PROFILE_IMAGE_DEFAULT_SIZE = 150
     
+    # Password hashing settings (werkzeug method string, e.g. 'scrypt:32768:8:1')
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '1'))
+    PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', '8'))
+    PASSWORD_HASH_TIMEOUT = 30  # seconds
+    PASSWORD_HASH_RETRY_AFTER = 2  # seconds
+
+    # Compiled template cache (None: the system temp directory)
+    TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get('TEMPLATE_BYTECODE_CACHE_DIR')
+
+    # Monitoring settings
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    HEALTH_MAIL_QUEUE_LIMIT = 10000  # queued messages reported as a backlog
+
+    # SQL profiling (SQL_PROFILING defaults to DEBUG)
+    SQL_PROFILING_REPEAT_THRESHOLD = 5  # runs of one statement in a request flagged as N+1
+    SQL_PROFILING_HISTORY = 50  # requests listed at /debug/queries
+
     # Session settings
     PERMANENT_SESSION_LIFETIME = timedelta(days=1)
     
+    # Cache settings
+    REDIS_URL = os.environ.get('REDIS_URL')
+    REDIS_SOCKET_TIMEOUT = 1.0  # seconds before a Redis call (or health probe) gives up
+    LOCAL_CACHE_TTL = 5  # seconds a worker keeps its copy when Redis is shared
+    SITE_STATS_CACHE_TTL = 60  # seconds
+    USER_SESSION_CACHE_TTL = 300  # seconds
+    DASHBOARD_CACHE_TTL = 30  # seconds
+    QUEUE_METRICS_CACHE_TTL = 5  # seconds between the mail and reminder queue counts of /metrics
+    STATS_RECOMPUTE_INTERVAL = 3600  # seconds between full recounts
+
+    # Analytics settings
+    CURRENT_SEASON = os.environ.get('CURRENT_SEASON', str(date.today().year))
+    ANALYTICS_CUBE_REFRESH = 30  # seconds between checks for newly finalized games
+
     # Broadcasting settings
-    BROADCAST_UPDATE_INTERVAL = 5  # seconds
+    BROADCAST_UPDATE_INTERVAL = 5  # seconds, for clients that cannot hold a stream open
+    BROADCAST_COALESCE_INTERVAL = 0.25  # seconds of updates merged into one frame
+    BROADCAST_SUBSCRIBER_QUEUE = 64  # frames a slow spectator may fall behind
+    BROADCAST_HEARTBEAT = 15.0  # seconds between keep-alives on idle streams
+    BROADCAST_REACTIONS = ('like', 'clap', 'fire', 'wow')
+    BROADCAST_FLUSH_INTERVAL = 1.0  # seconds between bulk writes of reactions and chat
+    BROADCAST_FLUSH_MAX_BATCH = 1000  # rows per statement; a full chat buffer flushes early
+    BROADCAST_BUFFER_MAX_CHAT = 20000  # chat messages kept while writes fail; the oldest are dropped
+
+    # Scheduling settings
+    SCHEDULE_SLOT_MINUTES = 15  # free slots start on these boundaries
+    SCHEDULE_SEARCH_WEEKS = 8  # how far ahead free slots are looked for
+    SCHEDULE_MAX_SLOTS = 50  # most free slots returned at once
+    PRACTICE_WINDOW_WEEKS = 8  # recurring practices stored as rows this far ahead
+    PRACTICE_CALENDAR_MAX_DAYS = 92  # longest range one calendar request may span
+
+    # Reminder settings
+    REMINDER_LEAD_MINUTES = (24 * 60,)  # reminders go out this long before each game and practice
+    REMINDER_LOOKAHEAD_HOURS = 48  # events this close get their reminders queued
+    REMINDER_REFILL_INTERVAL = 900  # seconds between looks for events entering the lookahead
+    REMINDER_LEASE_SECONDS = 30  # a leader that stops renewing is replaced after this
+    REMINDER_BATCH_SIZE = 500  # reminders claimed per dispatch
+    REMINDER_THREAD = os.environ.get('REMINDER_THREAD', 'true').lower() in ['true', 'on', '1']  # false: use `flask reminder-worker`
+
+    # Messaging settings
+    MESSAGES_PER_PAGE = 20
+    MESSAGES_MAX_PAGE = 100  # largest page a client may ask for
+    MESSAGE_MAX_LENGTH = 5000  # characters
     
     @staticmethod
     def init_app(app):
@@ -32,8 +139,15 @@ class Config:
         if not os.path.exists(Config.UPLOAD_FOLDER):
             os.makedirs(Config.UPLOAD_FOLDER)
 
+        # Read here, not in the class body: gunicorn.conf.py imports this
+        # module for db_pool_size and only then caps the pool sizes
+        app.config.setdefault('DB_POOL_SIZE', int(
+            os.environ.get('DB_POOL_SIZE') or db_pool_size(int(os.environ.get('GUNICORN_THREADS', '2')))))
+        app.config.setdefault('DB_MAX_OVERFLOW', int(os.environ.get('DB_MAX_OVERFLOW', '4')))  # extra connections under bursts
+
 class DevelopmentConfig(Config):
     DEBUG = True
+    PASSWORD_HASH_WORKERS = 0  # hash inline for easier debugging
     
 class ProductionConfig(Config):
     DEBUG = False
@@ -0,0 +1,101 @@
+"""gunicorn settings for the web service (``gunicorn --config gunicorn.conf.py run:app``).
+
+GUNICORN_PROFILE picks the worker model:
+
+- ``gthread`` (default): 2 x cores + 1 workers of GUNICORN_THREADS threads.
+  Requests that wait on SMTP, Redis or the database hold a thread, not a
+  whole worker.
+- ``gevent``: one worker per core, each serving up to
+  GUNICORN_WORKER_CONNECTIONS requests as greenlets. Use it for many
+  slow, mostly idle clients. The database pool stays bounded (DB_POOL_SIZE),
+  so greenlets queue for a connection instead of opening one each.
+
+Every worker has its own database pool, and together they stay within
+DB_MAX_CONNECTIONS (default 80, under PostgreSQL's default max_connections
+of 100, leaving room for `flask mail-worker`, `flask reminder-worker`,
+migrations and psql). A worker's pool holds a connection for each of its
+request and background threads (config.db_pool_size); with this many
+processes one mail and one image worker thread each are enough, so
+MAIL_QUEUE_WORKERS and IMAGE_WORKERS default to 1 here. The worker count is
+capped so that every pool fits: 8 cores give 10 gthread workers of 8
+connections. Explicit DB_POOL_SIZE and DB_MAX_OVERFLOW settings are left
+alone.
+
+GUNICORN_WORKERS overrides the derived worker count. The app is loaded
+once in the master before forking (GUNICORN_PRELOAD), so workers share its
+memory copy-on-write. Workers are replaced after about GUNICORN_MAX_REQUESTS
+requests to cap slow leaks. See scripts/bench_serving.py for a comparison
+of the profiles.
+"""
+import os
+import shutil
+import tempfile
+
+profile = os.environ.get('GUNICORN_PROFILE', 'gthread')
+if profile not in ('gthread', 'gevent'):
+    raise RuntimeError(f'Unknown GUNICORN_PROFILE {profile!r}; use gthread or gevent')
+
+if profile == 'gevent':
+    # Patch before the app (and its locks and sockets) is preloaded
+    from gevent import monkey
+    monkey.patch_all()
+
+def _cores():
+    try:
+        return len(os.sched_getaffinity(0))  # honours container CPU sets
+    except AttributeError:
+        return os.cpu_count() or 1
+
+bind = '0.0.0.0:5000'
+# Read by config.py and db_pool_size: background threads per worker
+os.environ.setdefault('MAIL_QUEUE_WORKERS', '1')
+os.environ.setdefault('IMAGE_WORKERS', '1')
+if profile == 'gevent':
+    worker_class = 'gevent'
+    workers = int(os.environ.get('GUNICORN_WORKERS') or _cores() + 1)
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+else:
+    worker_class = 'gthread'
+    workers = int(os.environ.get('GUNICORN_WORKERS') or 2 * _cores() + 1)
+    # Read by config.py too, to size each worker's database pool
+    threads = int(os.environ.setdefault('GUNICORN_THREADS', '4'))
+
+# Imported once the thread counts above are in the environment
+from config import db_pool_size  # noqa: E402
+pool_size = db_pool_size(4 if profile == 'gevent' else threads)  # gevent: greenlets queue for these
+
+db_max_connections = int(os.environ.get('DB_MAX_CONNECTIONS', '80'))
+if 'GUNICORN_WORKERS' not in os.environ:
+    workers = max(1, min(workers, db_max_connections // pool_size))
+# Read by config.py: the workers' pools together never exceed the budget
+per_worker = max(1, db_max_connections // workers)
+os.environ.setdefault('DB_POOL_SIZE', str(min(pool_size, per_worker)))
+os.environ.setdefault('DB_MAX_OVERFLOW', str(max(0, per_worker - int(os.environ['DB_POOL_SIZE']))))
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ['true', 'on', '1']
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = max_requests // 10  # so workers are not all recycled at once
+timeout = 30  # seconds a worker may be silent before it is killed
+graceful_timeout = 30  # seconds a recycled or stopping worker gets to finish its requests
+keepalive = 5  # seconds, behind nginx
+
+# Prometheus metrics of all workers are aggregated through files in this
+# directory; it must be set before the app (and prometheus_client) is imported
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                      os.path.join(tempfile.gettempdir(), 'volleyball-metrics'))
+
+def on_starting(server):
+    # Samples left by a previous run would be added to this one's
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+def post_fork(server, worker):
+    if profile == 'gevent':
+        # psycopg2 would otherwise block the whole worker while a query runs
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,7 +1,6 @@
 import os
 from app import create_app, db
 from app.auth.models import Role, User
-from werkzeug.security import generate_password_hash
 
 def init_db():
     """Initialize the database with required roles and admin user."""
@@ -35,12 +34,12 @@ def init_db():
             admin_user = User(
                 username='admin',
                 email='admin@example.com',
-                password_hash=generate_password_hash('adminpassword'),
                 first_name='Admin',
                 last_name='User',
                 role=admin_role,
                 is_active=True
             )
+            admin_user.password = 'adminpassword'
             db.session.add(admin_user)
             
             try:
@@ -1,13 +1,16 @@
 import os
+import time
+import click
 from app import create_app, db
 from app.auth.models import User, Role
-from flask_migrate import upgrade
 
 app = create_app(os.getenv('FLASK_CONFIG') or 'default')
 
 @app.cli.command()
 def deploy():
     """Run deployment tasks."""
+    from flask_migrate import upgrade
+
     # Migrate database to latest revision
     upgrade()
 
@@ -42,6 +45,130 @@ def deploy():
             db.session.rollback()
             raise
 
+@app.cli.command('import-stats')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--key', help='Idempotency key; defaults to a hash of the file.')
+def import_stats(path, key):
+    """Bulk import a CSV, JSON or JSON Lines stat sheet."""
+    import hashlib
+    from app.analytics.ingest import import_stat_sheet, StatSheetError, ImportConflict
+    ext = os.path.splitext(path)[1].lower()
+    fmt = {'.csv': 'csv', '.json': 'json', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}.get(ext)
+    if fmt is None:
+        raise click.UsageError('Stat sheets must be .csv, .json, .jsonl or .ndjson files.')
+    if key is None:
+        with open(path, 'rb') as f:
+            key = hashlib.sha256(f.read()).hexdigest()
+    try:
+        with open(path, 'rb') as f:
+            record, replayed, elapsed = import_stat_sheet(f, fmt, key=key)
+    except StatSheetError as e:
+        for error in e.errors:
+            click.echo(error, err=True)
+        raise click.ClickException(str(e))
+    except (ImportConflict, ValueError) as e:
+        raise click.ClickException(str(e))
+    if replayed:
+        print(f'Already imported as {record.key} ({record.rows} rows); nothing to do')
+    else:
+        print(f'Imported {record.rows} rows for {record.games} games in {elapsed:.2f}s '
+              f'({record.rows / elapsed:.0f} rows/sec)')
+
+@app.cli.command('recompute-stats')
+def recompute_stats():
+    """Rebuild the cached landing page statistics."""
+    from app.main.stats import recompute_site_stats
+    for name, value in recompute_site_stats().items():
+        print(f'{name}: {value}')
+
+@app.cli.command('cache-stats')
+def cache_stats():
+    """Show hit/miss counters for this process's caches."""
+    from app.utils.cache import caches
+    for name, cache in sorted(caches.items()):
+        stats = cache.stats()
+        print(f"{name}: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['hit_ratio']:.1%} hit ratio, {stats['size']} entries")
+
+@app.cli.command('process-images')
+def process_images():
+    """Process profile pictures left in the upload spool."""
+    from app.utils.images import image_pipeline
+    print(f'Processed {image_pipeline.drain()} images')
+
+@app.cli.command('mail-worker')
+@click.option('--once', is_flag=True, help='Drain the queue once and exit.')
+def mail_worker(once):
+    """Deliver queued email."""
+    from app.utils.mail_queue import mail_queue
+    if not once:
+        mail_queue.run_worker()
+        return
+    start = time.perf_counter()
+    sent = mail_queue.drain()
+    elapsed = time.perf_counter() - start
+    print(f'Sent {sent} messages in {elapsed:.2f}s '
+          f'({sent / elapsed if elapsed else 0:.1f} messages/sec)')
+
+@app.cli.command('purge-mail')
+def purge_mail():
+    """Delete sent and failed email older than MAIL_RETENTION_DAYS."""
+    from app.utils.mail_queue import mail_queue
+    print(f'Deleted {mail_queue.purge()} messages')
+
+@app.cli.command('purge-uploads')
+def purge_uploads():
+    """Delete attachment uploads left unfinished for UPLOAD_EXPIRY seconds."""
+    from app.uploads.storage import purge_stale_uploads
+    print(f'Deleted {purge_stale_uploads()} unfinished uploads')
+
+@app.cli.command('reminder-worker')
+@click.option('--once', is_flag=True, help='Run one scheduler step and exit.')
+def reminder_worker(once):
+    """Send game and practice reminders as they fall due."""
+    from app.schedule.reminders import reminder_scheduler
+    if not once:
+        reminder_scheduler.run()
+        return
+    sent, wait = reminder_scheduler.run_once()
+    print(f'Sent {sent} reminders; next step in {wait:.0f}s')
+
+@app.cli.command('rebuild-analytics')
+@click.option('--season', help='Only rebuild this season.')
+@click.option('--team', 'team_id', type=int, help='Only rebuild this team.')
+def rebuild_analytics(season, team_id):
+    """Recompute the analytics rollups from finalized stat lines."""
+    from app.analytics.engine import rebuild
+    start = time.perf_counter()
+    players, teams = rebuild(season=season, team_id=team_id)
+    print(f'Rebuilt {players} player and {teams} team rollups '
+          f'in {time.perf_counter() - start:.2f}s')
+
+@app.cli.command('materialize-practices')
+def materialize_practices():
+    """Store the next weeks of recurring practices as practice rows; run daily."""
+    from app.practice.calendar import materialize
+    start = time.perf_counter()
+    created = materialize()
+    print(f'Materialized {created} practices in {time.perf_counter() - start:.2f}s')
+
+@app.cli.command('profile-startup')
+@click.option('--config', 'config_name', default=lambda: os.getenv('FLASK_CONFIG') or 'default',
+              help='Configuration to build the app with.')
+@click.option('--top', default=20, help='Number of modules to list.')
+def profile_startup_command(config_name, top):
+    """Report what importing the app and create_app cost, per module."""
+    from app.utils.startup import profile_startup
+    profile = profile_startup(config_name)
+    print(f'import {profile.import_time * 1000:.0f} ms, create_app '
+          f'{profile.create_app_time * 1000:.0f} ms, peak RSS {profile.rss_mb:.0f} MB')
+    print('\nBy package (self time):')
+    for package, seconds in profile.by_package()[:top]:
+        print(f'  {seconds * 1000:8.1f} ms  {package}')
+    print('\nSlowest imports (including what they import):')
+    for name, _, cumulative in profile.slowest_modules(top):
+        print(f'  {cumulative * 1000:8.1f} ms  {name}')
+
 @app.shell_context_processor
 def make_shell_context():
     """Configure Flask shell context."""
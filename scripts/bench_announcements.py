@@ -0,0 +1,150 @@
+"""Time announcement fan-out and acknowledgment lookups for a large club.
+
+Creates one team of ``--members`` members in a scratch SQLite database and
+posts ``--announcements`` announcements to it, timing the bulk feed
+fan-out. About ``--ack-rate`` of the deliveries are then acknowledged, and
+the bitmap-backed lookups are timed against the join over team members and
+feed entries they replace: one announcement's outstanding members, the
+outstanding counts of every announcement, and one member's unread count.
+
+Usage: python scripts/bench_announcements.py [--members 5000] [--announcements 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def best_of(n, fn):
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=5000)
+    parser.add_argument('--announcements', type=int, default=50)
+    parser.add_argument('--ack-rate', type=float, default=0.6)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    import numpy as np
+    from sqlalchemy import and_, exists, func, insert, select, update
+    from app import create_app, db
+    from app.auth.models import User, TeamMember
+    from app.communication.feeds import (post_announcement, acknowledge, outstanding_user_ids,
+                                         unread_announcements)
+    from app.communication.models import Announcement, FeedEntry, MailboxCounter
+
+    app = create_app('default')
+    rng = np.random.default_rng(7)
+    team = 1
+    coach = 1
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [
+            {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com',
+             'password_hash': '-', 'first_name': 'User', 'last_name': str(i)}
+            for i in range(1, args.members + 1)])
+        db.session.execute(insert(TeamMember), [
+            {'user_id': i, 'team_id': team, 'role': 'coach' if i == coach else 'player'}
+            for i in range(1, args.members + 1)])
+        db.session.commit()
+
+        start = time.perf_counter()
+        ids = [post_announcement(team, coach, f'Announcement {i}', 'Details', notify=False).id
+               for i in range(args.announcements)]
+        elapsed = time.perf_counter() - start
+        print(f'fan-out: {args.announcements} announcements to {args.members - 1:,} members, '
+              f'{elapsed / args.announcements * 1000:.1f} ms each')
+
+        # The first announcement is acknowledged one member at a time...
+        recipients = outstanding_user_ids(db.session.get(Announcement, ids[0]))
+        sample = [int(u) for u in rng.choice(recipients, int(len(recipients) * args.ack_rate),
+                                             replace=False)]
+        start = time.perf_counter()
+        for user_id in sample:
+            acknowledge(user_id, ids[0])
+        elapsed = time.perf_counter() - start
+        print(f'acknowledge: {elapsed / len(sample) * 1000:.2f} ms each')
+
+        # ...the rest are filled in directly, the way acknowledge() leaves them
+        now = db.func.current_timestamp()
+        for announcement_id in ids[1:]:
+            announcement = db.session.get(Announcement, announcement_id)
+            mask = rng.random(announcement.recipient_count) < args.ack_rate
+            slots = np.flatnonzero(mask).tolist()
+            for start in range(0, len(slots), 500):
+                db.session.execute(update(FeedEntry).where(
+                    FeedEntry.announcement_id == announcement_id,
+                    FeedEntry.slot.in_(slots[start:start + 500])).values(acknowledged_at=now))
+            announcement.acknowledged = np.packbits(mask, bitorder='little').tobytes()
+            announcement.acknowledged_count = len(slots)
+        db.session.execute(update(MailboxCounter).values(announcements=select(func.count()).where(
+            FeedEntry.user_id == MailboxCounter.user_id,
+            FeedEntry.acknowledged_at.is_(None)).scalar_subquery()))
+        db.session.commit()
+
+        announcement_id = ids[len(ids) // 2]
+        member = sample[0]
+        acked = and_(FeedEntry.user_id == TeamMember.user_id,
+                     FeedEntry.announcement_id == Announcement.id,
+                     FeedEntry.acknowledged_at.isnot(None))
+
+        def join_outstanding():
+            return db.session.scalars(
+                select(TeamMember.user_id).join(Announcement, Announcement.team_id == TeamMember.team_id)
+                .where(Announcement.id == announcement_id, TeamMember.user_id != Announcement.author_id,
+                       ~exists().where(acked))
+                .order_by(TeamMember.id)).all()
+
+        def bitmap_outstanding():
+            db.session.expire_all()
+            return outstanding_user_ids(db.session.get(Announcement, announcement_id))
+
+        def join_counts():
+            return dict(db.session.execute(
+                select(Announcement.id, func.count(TeamMember.id))
+                .join(TeamMember, TeamMember.team_id == Announcement.team_id)
+                .where(Announcement.team_id == team, TeamMember.user_id != Announcement.author_id,
+                       ~exists().where(acked))
+                .group_by(Announcement.id)).all())
+
+        def column_counts():
+            return dict(db.session.execute(
+                select(Announcement.id, Announcement.recipient_count - Announcement.acknowledged_count)
+                .where(Announcement.team_id == team)).all())
+
+        def join_unread():
+            return db.session.scalar(
+                select(func.count(Announcement.id))
+                .join(TeamMember, TeamMember.team_id == Announcement.team_id)
+                .where(TeamMember.user_id == member, Announcement.author_id != member,
+                       ~exists().where(acked)))
+
+        def counter_unread():
+            db.session.expire_all()
+            return unread_announcements(member)
+
+        print(f"{'lookup':<28}  {'join ms':>9}  {'feed ms':>9}")
+        for name, join, feed in (('outstanding members (one)', join_outstanding, bitmap_outstanding),
+                                 ('outstanding counts (all)', join_counts, column_counts),
+                                 ("member's unread count", join_unread, counter_unread)):
+            join_time, expected = best_of(5, join)
+            feed_time, result = best_of(5, feed)
+            assert result == expected, name
+            print(f'{name:<28}  {join_time * 1000:>9.2f}  {feed_time * 1000:>9.2f}')
+
+    os.close(db_fd)
+    os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Benchmark attendance bitsets against one row per player per practice.
+
+Takes attendance for every practice of a season both ways, one request's
+worth of writes at a time, then compares the storage and the cost of
+reading a team's season attendance rates.
+
+Usage: python scripts/bench_attendance.py [--teams 100] [--players 15] [--sessions 40]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from datetime import time as clock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import Boolean, Column, Index, Integer, String, func, select
+from sqlalchemy.orm import declarative_base
+
+Base = declarative_base()
+
+class AttendanceRow(Base):
+    """The row-per-attendance layout the bitsets replace."""
+    __tablename__ = 'bench_attendance_rows'
+    practice_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    team_id = Column(Integer, nullable=False)
+    season = Column(String(16), nullable=False)
+    present = Column(Boolean, nullable=False)
+    __table_args__ = (Index('ix_bench_rows_team_season', 'team_id', 'season'),)
+
+def seed(teams, players, sessions):
+    from app import db
+    from app.auth.models import User, TeamMember
+    from app.practice.models import Practice
+    from app.team.models import Team
+
+    db.session.execute(Team.__table__.insert(), [{'name': f'Team {i}'} for i in range(teams)])
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x',
+         'first_name': 'Bench', 'last_name': str(i), 'is_active': True}
+        for i in range(teams * players)])
+    db.session.execute(TeamMember.__table__.insert(), [
+        {'team_id': team, 'user_id': (team - 1) * players + i + 1, 'role': 'player'}
+        for team in range(1, teams + 1) for i in range(players)])
+    first = date(2024, 9, 2)
+    db.session.execute(Practice.__table__.insert(), [
+        {'team_id': team, 'title': 'Practice', 'date': first + timedelta(days=3 * i),
+         'time': clock(18), 'duration': 90}
+        for team in range(1, teams + 1) for i in range(sessions)])
+    db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--teams', type=int, default=100)
+    parser.add_argument('--players', type=int, default=15, help='roster size')
+    parser.add_argument('--sessions', type=int, default=40, help='practices per team')
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app, db
+    from app.auth.models import TeamMember
+    from app.practice.attendance import attendance_rates, record_attendance
+    from app.practice.models import Attendance, Practice
+
+    app = create_app('default')
+    rng = random.Random(1)
+    try:
+        with app.app_context():
+            db.create_all()
+            Base.metadata.create_all(db.engine)
+            seed(args.teams, args.players, args.sessions)
+            rosters = {}
+            for team_id, user_id in db.session.execute(
+                    select(TeamMember.team_id, TeamMember.user_id).order_by(TeamMember.id)):
+                rosters.setdefault(team_id, []).append(user_id)
+            # Plain rows: thousands of ORM objects would be expired by every commit
+            practices = db.session.execute(select(Practice.id, Practice.team_id)).all()
+            came = {p.id: [u for u in rosters[p.team_id] if rng.random() < 0.8] for p in practices}
+
+            start = time.perf_counter()
+            for practice in practices:
+                present = set(came[practice.id])
+                db.session.add_all([
+                    AttendanceRow(practice_id=practice.id, user_id=user_id,
+                                  team_id=practice.team_id, season='2024',
+                                  present=user_id in present)
+                    for user_id in rosters[practice.team_id]])
+                db.session.commit()
+            rows_time = time.perf_counter() - start
+            start = time.perf_counter()
+            for practice in practices:
+                record_attendance(practice, present=came[practice.id], season='2024')
+            bits_time = time.perf_counter() - start
+            n = len(practices)
+            print(f'Taking attendance ({n} practices x {args.players} players): '
+                  f'rows {n / rows_time:,.0f}/s, bitsets {n / bits_time:,.0f}/s')
+            row_count = db.session.scalar(select(func.count()).select_from(AttendanceRow))
+            bit_bytes = db.session.scalar(select(func.sum(func.length(Attendance.present))))
+            print(f'Stored: {row_count:,} rows vs {n:,} rows holding {bit_bytes:,} bytes of bits')
+
+            def by_rows(team_id):
+                return db.session.execute(
+                    select(AttendanceRow.user_id,
+                           func.sum(func.cast(AttendanceRow.present, Integer)), func.count())
+                    .where(AttendanceRow.team_id == team_id, AttendanceRow.season == '2024')
+                    .group_by(AttendanceRow.user_id)).all()
+
+            teams = [rng.randrange(1, args.teams + 1) for _ in range(500)]
+            for label, report in (('rows GROUP BY', by_rows),
+                                  ('bitsets + popcount', lambda t: attendance_rates(t, '2024'))):
+                start = time.perf_counter()
+                for team_id in teams:
+                    report(team_id)
+                elapsed = (time.perf_counter() - start) / len(teams) * 1000
+                print(f'Season rates of a team, {label}: {elapsed:.2f} ms')
+
+            # Both layouts agree
+            team_id = teams[0]
+            expected = {user_id: (attended, total) for user_id, attended, total in by_rows(team_id)}
+            assert expected == {row['user_id']: (row['attended'], row['sessions'])
+                                for row in attendance_rates(team_id, '2024')['players']}
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Compare the in-memory stat cube with SQL aggregates over many stat lines.
+
+Generates ``--rows`` finalized stat lines (12 players of a random team
+per game, random seasons) in a scratch SQLite database, then times the same
+comparisons done as SQLAlchemy GROUP BY queries and as cube queries:
+per-player totals for a season, team-by-season totals for a list of
+teams, and percentiles of hitting percentage across qualified players.
+
+Usage: python scripts/bench_cube.py [--rows 1000000] [--teams 300] [--seasons 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def best_of(n, fn):
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--teams', type=int, default=300)
+    parser.add_argument('--seasons', type=int, default=5)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    import numpy as np
+    from sqlalchemy import and_, func, insert, select
+    from app import create_app, db
+    from app.analytics.cube import stat_cube
+    from app.analytics.models import STAT_COLUMNS, StatLine, GameResult
+
+    app = create_app('default')
+    rng = np.random.default_rng(7)
+    seasons = [str(2020 + i) for i in range(args.seasons)]
+    lines_per_game = 12
+    games = args.rows // lines_per_game
+
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        game_team = rng.integers(1, args.teams + 1, games)
+        game_season = rng.integers(0, args.seasons, games)
+        sets_won = rng.integers(0, 4, games)
+        db.session.execute(insert(GameResult), [
+            {'game_id': g + 1, 'team_id': int(game_team[g]), 'season': seasons[game_season[g]],
+             'sets_won': int(sets_won[g]), 'sets_lost': 3 - int(sets_won[g]) if sets_won[g] < 3 else 1}
+            for g in range(games)])
+        stats = {column: rng.integers(0, 12, args.rows) for column in STAT_COLUMNS}
+        stats['attack_attempts'] = stats['kills'] + stats['attack_errors'] + rng.integers(0, 15, args.rows)
+        chunk = 50000
+        for offset in range(0, games * lines_per_game, chunk):
+            db.session.execute(insert(StatLine), [
+                dict({column: int(stats[column][i]) for column in STAT_COLUMNS},
+                     game_id=i // lines_per_game + 1,
+                     team_id=int(game_team[i // lines_per_game]),
+                     user_id=int(game_team[i // lines_per_game]) * 100 + i % lines_per_game,
+                     season=seasons[game_season[i // lines_per_game]])
+                for i in range(offset, min(offset + chunk, games * lines_per_game))])
+        db.session.commit()
+        print(f'generated {games * lines_per_game:,} stat lines in {time.perf_counter() - start:.1f}s')
+
+        finalized = and_(StatLine.game_id == GameResult.game_id,
+                         StatLine.team_id == GameResult.team_id)
+        sums = [func.sum(getattr(StatLine, column)) for column in STAT_COLUMNS]
+        season = seasons[-1]
+        teams = list(range(1, 21))
+
+        def sql_players():
+            return db.session.execute(
+                select(StatLine.user_id, func.count(), *sums).join(GameResult, finalized)
+                .where(StatLine.season == season).group_by(StatLine.user_id)).all()
+
+        def sql_teams():
+            return db.session.execute(
+                select(StatLine.team_id, StatLine.season, func.count(), *sums)
+                .join(GameResult, finalized).where(StatLine.team_id.in_(teams))
+                .group_by(StatLine.team_id, StatLine.season)).all()
+
+        def sql_percentiles():
+            rows = db.session.execute(
+                select(func.sum(StatLine.kills), func.sum(StatLine.attack_errors),
+                       func.sum(StatLine.attack_attempts))
+                .join(GameResult, finalized).where(StatLine.season == season)
+                .group_by(StatLine.user_id)
+                .having(func.sum(StatLine.sets_played) >= 20)).all()
+            pct = [(k - e) / a for k, e, a in rows if a]
+            return np.percentile(pct, [25, 50, 75, 90])
+
+        load, loaded = best_of(1, stat_cube.refresh)
+        print(f'cube load: {loaded:,} rows in {load:.2f}s')
+        stat_cube.refresh_interval = float('inf')
+
+        queries = (
+            ('players in a season', sql_players,
+             lambda: stat_cube.group_by(('user_id',), season=season)),
+            ('20 teams x seasons', sql_teams,
+             lambda: stat_cube.group_by(('team_id', 'season'), team_id=teams)),
+            ('hitting % percentiles', sql_percentiles,
+             lambda: stat_cube.percentiles('hitting_pct', season=season, min_sets=20)),
+        )
+        for name, sql, cube in queries:
+            sql_time, sql_result = best_of(3, sql)
+            cube_time, cube_result = best_of(3, cube)
+            print(f'{name:>22}: SQL {sql_time * 1000:8.1f} ms  cube {cube_time * 1000:7.1f} ms  '
+                  f'({sql_time / cube_time:.0f}x, {len(cube_result)} groups)')
+
+    os.close(db_fd)
+    os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
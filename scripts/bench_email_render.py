@@ -0,0 +1,54 @@
+"""Benchmark rendering personalized reminder emails.
+
+Compares rendering the .txt and .html templates once per recipient with
+rendering them once per send and substituting the recipient fields.
+
+Usage: python scripts/bench_email_render.py [--recipients 10000]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipients', type=int, default=10000)
+    args = parser.parse_args()
+
+    from flask import render_template
+    from app import create_app
+    from app.utils.email_render import prepare_email
+
+    app = create_app('default')
+    practice = SimpleNamespace(
+        title='Serve receive drills',
+        date=datetime(2024, 3, 4), time=datetime(2024, 3, 4, 18, 0),
+        location='Main Gym, Court 2',
+        team=SimpleNamespace(name='U16 Girls')
+    )
+    recipients = [SimpleNamespace(first_name=f'Parent{i}', email=f'parent{i}@example.com')
+                  for i in range(args.recipients)]
+
+    with app.test_request_context():
+        start = time.perf_counter()
+        for user in recipients:
+            render_template('email/practice_reminder.txt', practice=practice, recipient=user)
+            render_template('email/practice_reminder.html', practice=practice, recipient=user)
+        before = time.perf_counter() - start
+
+        start = time.perf_counter()
+        prepared = prepare_email('practice_reminder', practice=practice)
+        for user in recipients:
+            prepared.personalize(user)
+        after = time.perf_counter() - start
+
+    print(f'recipients: {args.recipients}')
+    print(f'render per recipient: {before:6.2f}s ({args.recipients / before:8.0f} emails/sec)')
+    print(f'render once + fill:   {after:6.2f}s ({args.recipients / after:8.0f} emails/sec)')
+
+if __name__ == '__main__':
+    main()
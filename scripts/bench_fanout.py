@@ -0,0 +1,194 @@
+"""Load test the live update fan-out server with many SSE subscribers.
+
+Starts the fan-out server in a subprocess pinned to a single CPU, opens
+``--subscribers`` Server-Sent Events connections spread over ``--matches``
+matches from ``--clients`` client processes, then publishes ``--rate``
+score updates per second to every match. Reports delivered frames/sec,
+end-to-end latency (publish to client), dropped subscribers and the
+server's CPU use. Raise ``ulimit -n`` above the subscriber count first.
+
+Usage: python scripts/bench_fanout.py [--subscribers 10000] [--matches 20] [--rate 20] [--duration 10]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+def serve(port):
+    """Run the fan-out server on one CPU with a publisher for the benchmark."""
+    from aiohttp import web
+    from config import Config
+    from app.broadcast.fanout import create_server, HUB
+
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {min(os.sched_getaffinity(0))})
+    raise_fd_limit()
+    app = create_server(Config, redis_url='')
+    state = {'cpu_start': 0}
+
+    async def publish(hub, matches, rate, duration):
+        start = time.monotonic()
+        n = 0
+        while n < duration * rate:
+            n += 1
+            for match_id in range(matches):
+                hub.publish(match_id, 'score', {'home': n, 'ts': time.time()})
+            await asyncio.sleep(max(0, start + n / rate - time.monotonic()))
+
+    async def start(request):
+        params = await request.json()
+        state['cpu_start'] = time.process_time()
+        state['publisher'] = asyncio.ensure_future(publish(
+            request.app[HUB], params['matches'], params['rate'], params['duration']))
+        return web.json_response({'started': True})
+
+    async def stats(request):
+        hub = request.app[HUB]
+        return web.json_response({
+            'subscribers': hub.subscriber_count, 'published': hub.published,
+            'frames': hub.frames, 'dropped': hub.dropped,
+            'cpu': time.process_time() - state['cpu_start'],
+            'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024,
+        })
+
+    app.router.add_post('/bench/start', start)
+    app.router.add_get('/bench/stats', stats)
+    web.run_app(app, host='127.0.0.1', port=port, print=None, access_log=None)
+
+async def subscribe_many(url, match_ids, stop, results):
+    import aiohttp
+
+    latencies = []
+    counts = {'frames': 0, 'connected': 0, 'errors': 0}
+
+    async def listen(session, match_id, sample):
+        try:
+            async with session.get(f'{url}/live/{match_id}/events') as response:
+                counts['connected'] += 1
+                async for line in response.content:
+                    if line.startswith(b'data: '):
+                        counts['frames'] += 1
+                        if sample:
+                            # Parsing every frame would make the clients the bottleneck
+                            ts = json.loads(line[6:])['score'].get('ts')
+                            if ts:
+                                latencies.append(time.time() - ts)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            counts['errors'] += 1
+
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        tasks = []
+        for i, match_id in enumerate(match_ids):
+            tasks.append(asyncio.ensure_future(listen(session, match_id, i % 50 == 0)))
+            if len(tasks) % 200 == 0:
+                await asyncio.sleep(0)  # let the handshakes progress
+        while not stop.is_set():
+            await asyncio.sleep(0.2)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    results.put((counts, latencies))
+
+def client_process(url, match_ids, stop, results):
+    raise_fd_limit()
+    asyncio.run(subscribe_many(url, match_ids, stop, results))
+
+def wait_for_subscribers(url, expected, timeout=120):
+    import urllib.request
+
+    deadline = time.monotonic() + timeout
+    stats = {}
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'{url}/bench/stats') as response:
+                stats = json.load(response)
+            if stats['subscribers'] >= expected:
+                break
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return stats
+
+def main():
+    import urllib.request
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=10000)
+    parser.add_argument('--matches', type=int, default=20)
+    parser.add_argument('--rate', type=float, default=20, help='updates/sec per match')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=4, help='client processes')
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port)
+        return
+
+    url = f'http://127.0.0.1:{args.port}'
+    server = subprocess.Popen([sys.executable, __file__, '--serve', '--port', str(args.port)])
+    try:
+        match_ids = [i % args.matches for i in range(args.subscribers)]
+        results = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        clients = [multiprocessing.Process(
+            target=client_process,
+            args=(url, match_ids[i::args.clients], stop, results))
+            for i in range(args.clients)]
+        wait_for_subscribers(url, 0)
+        for client in clients:
+            client.start()
+
+        connected = wait_for_subscribers(url, args.subscribers)['subscribers']
+        print(f'subscribers connected: {connected}')
+        request = urllib.request.Request(
+            f'{url}/bench/start', method='POST',
+            data=json.dumps({'matches': args.matches, 'rate': args.rate,
+                             'duration': args.duration}).encode(),
+            headers={'Content-Type': 'application/json'})
+        urllib.request.urlopen(request).close()
+        time.sleep(args.duration + 2)
+        stats = wait_for_subscribers(url, 0)
+        stop.set()
+
+        frames, errors, latencies = 0, 0, []
+        for _ in clients:
+            counts, samples = results.get(timeout=60)
+            frames += counts['frames']
+            errors += counts['errors']
+            latencies.extend(samples)
+        for client in clients:
+            client.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+
+    print(f"events published: {stats['published']} ({args.matches} matches x {args.rate:g}/s)")
+    print(f"frames flushed: {stats['frames']}, delivered: {frames} "
+          f"({frames / args.duration:,.0f} frames/s)")
+    print(f'latency ms: p50 {pct(0.5):.0f}  p99 {pct(0.99):.0f}  max {pct(1):.0f}')
+    print(f"dropped subscribers: {stats['dropped']}, client errors: {errors}")
+    print(f"server CPU: {stats['cpu']:.1f}s over {args.duration:g}s "
+          f"({stats['cpu'] / args.duration:.0%} of one core), peak RSS {stats['rss_mb']} MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark profile picture processing on large uploads.
+
+Compares the old synchronous path (one 150px thumbnail in the upload's
+format, done inside the request) with the pipeline: what the request
+still pays (spooling the upload), and the background throughput for
+every configured size in WebP and JPEG on a pool of worker threads.
+
+Usage: python scripts/bench_images.py [--images 40] [--workers 4]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+def make_images(folder, count):
+    paths = []
+    for i in range(count):
+        # Gradients compress realistically, unlike flat colour or noise
+        image = Image.linear_gradient('L').resize((4000, 3000)).convert('RGB')
+        image.putpixel((i, i), (i % 256, 0, 0))  # keep the content hashes distinct
+        path = os.path.join(folder, f'upload{i}.jpg')
+        image.save(path, 'JPEG', quality=92)
+        paths.append(path)
+    return paths
+
+def legacy(path, out_folder):
+    image = Image.open(path)
+    image.thumbnail((150, 150))
+    image.save(os.path.join(out_folder, os.path.basename(path)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    from app import create_app
+    from app.utils.images import image_pipeline
+
+    work = tempfile.mkdtemp()
+    try:
+        uploads = make_images(work, args.images)
+        legacy_out = os.path.join(work, 'legacy')
+        os.makedirs(legacy_out)
+
+        start = time.perf_counter()
+        for path in uploads:
+            legacy(path, legacy_out)
+        before = time.perf_counter() - start
+
+        spool = os.path.join(work, 'spool')
+        os.makedirs(spool)
+        start = time.perf_counter()
+        for path in uploads:
+            shutil.copy(path, spool)
+        spooled = time.perf_counter() - start
+
+        app = create_app('default')
+        image_pipeline.init_app(app)
+        image_pipeline.output_folder = os.path.join(work, 'processed')
+        os.makedirs(image_pipeline.output_folder)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            list(pool.map(image_pipeline.render, uploads))
+        after = time.perf_counter() - start
+    finally:
+        shutil.rmtree(work)
+
+    print(f'images: {args.images} x 4000x3000 JPEG, pipeline workers: {args.workers}')
+    print(f'request time per upload, synchronous: {before / args.images * 1000:7.1f} ms')
+    print(f'request time per upload, spooled:     {spooled / args.images * 1000:7.1f} ms')
+    print(f'background throughput, {len(image_pipeline.sizes)} sizes x 2 formats: '
+          f'{args.images / after:.1f} images/sec')
+
+if __name__ == '__main__':
+    main()
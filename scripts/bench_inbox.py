@@ -0,0 +1,97 @@
+"""Compare keyset and OFFSET pagination of a large message inbox.
+
+Generates ``--messages`` messages between ``--users`` users in a scratch
+SQLite database, a ``--share`` of them received by one busy user, then
+times fetching a page of that user's inbox at increasing depths: with
+LIMIT/OFFSET, and with the keyset cursor the inbox API hands out.
+
+Usage: python scripts/bench_inbox.py [--messages 1000000] [--users 50] [--share 0.2]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def best_of(n, fn):
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--share', type=float, default=0.2)
+    parser.add_argument('--page', type=int, default=20)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    import numpy as np
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert
+    from sqlalchemy.orm import joinedload
+    from app import create_app, db
+    from app.auth.models import User
+    from app.communication.mailbox import MESSAGE_ORDER, inbox_page
+    from app.communication.models import Message
+    from app.utils.pagination import encode_cursor
+
+    app = create_app('default')
+    rng = np.random.default_rng(7)
+
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        db.session.execute(insert(User), [
+            {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com',
+             'password_hash': '-', 'first_name': 'User', 'last_name': str(i)}
+            for i in range(1, args.users + 1)])
+        busy = 1
+        recipients = np.where(rng.random(args.messages) < args.share, busy,
+                              rng.integers(2, args.users + 1, args.messages))
+        senders = rng.integers(2, args.users + 1, args.messages)
+        # A few messages per second, so many share a timestamp
+        offsets = np.sort(rng.integers(0, args.messages // 3, args.messages))
+        first = datetime(2020, 1, 1)
+        chunk = 50000
+        for offset in range(0, args.messages, chunk):
+            db.session.execute(insert(Message), [
+                {'conversation_id': i // 10 + 1, 'sender_id': int(senders[i]),
+                 'recipient_id': int(recipients[i]), 'body': f'message {i}',
+                 'created_at': first + timedelta(seconds=int(offsets[i]))}
+                for i in range(offset, min(offset + chunk, args.messages))])
+        db.session.commit()
+        received = Message.query.filter_by(recipient_id=busy).count()
+        print(f'generated {args.messages:,} messages in {time.perf_counter() - start:.1f}s; '
+              f'user {busy} received {received:,}')
+
+        query = Message.query.options(joinedload(Message.sender)).filter_by(recipient_id=busy) \
+            .order_by(*[column.desc() for column in MESSAGE_ORDER])
+        print(f"{'depth':>8}  {'OFFSET ms':>10}  {'keyset ms':>10}")
+        for depth in (0, 1000, 10000, 50000, 100000, received - args.page):
+            if depth < 0 or depth > received - args.page:
+                continue
+            offset_time, offset_items = best_of(
+                5, lambda: query.offset(depth).limit(args.page).all())
+            cursor = None
+            if depth:
+                last = query.offset(depth - 1).limit(1).one()
+                cursor = encode_cursor([getattr(last, column.key) for column in MESSAGE_ORDER])
+            keyset_time, (keyset_items, _) = best_of(
+                5, lambda: inbox_page(busy, cursor, args.page))
+            assert [m.id for m in keyset_items] == [m.id for m in offset_items]
+            print(f'{depth:>8,}  {offset_time * 1000:>10.2f}  {keyset_time * 1000:>10.2f}')
+
+    os.close(db_fd)
+    os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
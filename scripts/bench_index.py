@@ -0,0 +1,89 @@
+"""Benchmark requests/sec on the landing page with a large user table.
+
+Compares the four COUNT queries the index route used to run on every hit
+against the cached site statistics.
+
+Usage: python scripts/bench_index.py [--users 100000] [--requests 2000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def seed(users):
+    from app import db
+    from app.auth.models import User, Role
+
+    roles = [Role(name=name) for name in ('admin', 'coach', 'player', 'parent')]
+    db.session.add_all(roles)
+    db.session.commit()
+    role_ids = [role.id for role in roles]
+
+    rows = [{
+        'email': f'user{i}@example.com',
+        'username': f'user{i}',
+        'password_hash': 'x',
+        'first_name': 'Bench',
+        'last_name': str(i),
+        'role_id': role_ids[i % len(role_ids)],
+        'is_active': True
+    } for i in range(users)]
+    db.session.execute(User.__table__.insert(), rows)
+    db.session.commit()
+
+def legacy_stats():
+    from app import db
+    from app.auth.models import User, Role, TeamMember
+    return {
+        'total_users': User.query.count(),
+        'total_teams': db.session.query(db.func.count(db.distinct(TeamMember.team_id))).scalar(),
+        'total_coaches': User.query.join(Role).filter(Role.name == 'coach').count(),
+        'total_players': User.query.join(Role).filter(Role.name == 'player').count()
+    }
+
+def run(client, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        assert client.get('/').status_code == 200
+    return requests / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app, db
+    from app.main import routes
+
+    app = create_app('default')
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        seed(args.users)
+
+    client = app.test_client()
+    cached = routes.get_site_stats
+    try:
+        routes.get_site_stats = legacy_stats
+        before = run(client, args.requests)
+        routes.get_site_stats = cached
+        client.get('/')  # warm the counters table and cache
+        after = run(client, args.requests)
+    finally:
+        routes.get_site_stats = cached
+        os.close(db_fd)
+        os.unlink(db_path)
+
+    print(f'users: {args.users}, requests: {args.requests}')
+    print(f'before (4 COUNT queries): {before:10.1f} req/s')
+    print(f'after  (cached counters): {after:10.1f} req/s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Load benchmark for concurrent logins.
+
+Fires a burst of logins from many threads while a probe thread keeps
+requesting the landing page, then reports login throughput, how many
+requests were shed with 503, and the landing page latency during the
+burst. Run it with --workers 0 (inline hashing) and with the pool enabled.
+
+Usage: python scripts/bench_logins.py [--logins 200] [--threads 16] [--workers 2]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--queue-limit', type=int, default=8)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app, db, hasher
+    from app.auth.models import User
+
+    app = create_app('default')
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False,
+                      PASSWORD_HASH_WORKERS=args.workers,
+                      PASSWORD_HASH_QUEUE_LIMIT=args.queue_limit)
+    hasher.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com',
+                    first_name='Bench', last_name='User')
+        user.password = 'password123'
+        db.session.add(user)
+        db.session.commit()
+
+    def login(_):
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post('/auth/login', data={
+            'email': 'bench@example.com', 'password': 'password123'})
+        return response.status_code, time.perf_counter() - start
+
+    probe_latencies = []
+    done = threading.Event()
+
+    def probe():
+        client = app.test_client()
+        while not done.is_set():
+            start = time.perf_counter()
+            client.get('/')
+            probe_latencies.append(time.perf_counter() - start)
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(login, range(args.logins)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    prober.join()
+
+    os.close(db_fd)
+    os.unlink(db_path)
+
+    ok = [latency for status, latency in results if status == 302]
+    shed = sum(1 for status, _ in results if status == 503)
+    print(f'hash workers: {args.workers}, queue limit: {args.queue_limit}, '
+          f'client threads: {args.threads}')
+    print(f'logins: {len(ok)} ok, {shed} shed (503) in {elapsed:.2f}s '
+          f'-> {len(ok) / elapsed:.1f} logins/s')
+    if ok:
+        print(f'login latency p50: {statistics.median(ok) * 1000:.1f} ms')
+    if len(probe_latencies) > 1:
+        p99 = statistics.quantiles(probe_latencies, n=100)[98]
+        print(f'/ latency during burst p50: {statistics.median(probe_latencies) * 1000:.1f} ms, '
+              f'p99: {p99 * 1000:.1f} ms')
+
+if __name__ == '__main__':
+    main()
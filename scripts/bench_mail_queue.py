@@ -0,0 +1,93 @@
+"""Measure mail queue throughput against a local SMTP stand-in.
+
+Starts an aiosmtpd server on localhost, queues one announcement to N
+recipients and drains the queue with the configured number of workers,
+reporting messages/sec. Requires ``pip install aiosmtpd``.
+
+Usage: python scripts/bench_mail_queue.py [--recipients 5000] [--workers 4] [--batch-size 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiosmtpd.controller import Controller
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+        self.lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope):
+        with self.lock:
+            self.received += 1
+        return '250 Message accepted for delivery'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipients', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--rate-limit', type=float, default=0)
+    parser.add_argument('--port', type=int, default=8025)
+    args = parser.parse_args()
+
+    handler = CountingHandler()
+    smtpd = Controller(handler, hostname='127.0.0.1', port=args.port)
+    smtpd.start()
+
+    db_fd, db_path = tempfile.mkstemp()
+    os.environ.update({
+        'DATABASE_URL': f'sqlite:///{db_path}',
+        'MAIL_SERVER': '127.0.0.1',
+        'MAIL_PORT': str(args.port),
+        'MAIL_USE_TLS': 'false',
+        'MAIL_QUEUE_WORKERS': '0'
+    })
+
+    from app import create_app, db
+    from app.utils.mail_queue import mail_queue
+
+    app = create_app('default')
+    app.config.update(MAIL_BATCH_SIZE=args.batch_size,
+                      MAIL_RATE_LIMIT=args.rate_limit,
+                      MAIL_QUEUE_EAGER=False)
+    mail_queue.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        mail_queue.enqueue('[Volleyball System] Benchmark', 'bench@example.com',
+                           [f'parent{i}@example.com' for i in range(args.recipients)],
+                           'Practice moved to 6pm.', '<p>Practice moved to 6pm.</p>')
+        enqueued = time.perf_counter() - start
+
+    stop = threading.Event()
+    workers = [threading.Thread(target=mail_queue.run_worker, args=(stop,))
+               for _ in range(args.workers)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    while handler.received < args.recipients:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    mail_queue._wakeup.set()
+    for worker in workers:
+        worker.join()
+
+    smtpd.stop()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+    print(f'recipients: {args.recipients}, workers: {args.workers}, '
+          f'batch size: {args.batch_size}')
+    print(f'enqueue: {enqueued:.2f}s ({args.recipients / enqueued:.0f} messages/sec)')
+    print(f'deliver: {elapsed:.2f}s ({args.recipients / elapsed:.0f} messages/sec)')
+
+if __name__ == '__main__':
+    main()
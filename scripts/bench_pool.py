@@ -0,0 +1,110 @@
+"""Drive concurrent requests through the connection pool and report pool waits.
+
+Each pool size runs in a fresh interpreter. Every request holds a database
+connection for --hold-ms, the way a view does while its queries run, and
+--threads request threads share one worker's pool. Against an undersized
+pool requests queue for a connection; with DB_POOL_SIZE sized for the
+threads they do not. Uses DATABASE_URL when set (e.g. PostgreSQL, or
+PgBouncer with DB_PGBOUNCER=1), a temporary SQLite file otherwise.
+
+Usage: python scripts/bench_pool.py [--threads 8] [--requests 400] [--sizes 2,8]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+def run(pool_size, threads, requests, hold):
+    db_path = None
+    if 'DATABASE_URL' not in os.environ:
+        db_fd, db_path = tempfile.mkstemp()
+        os.close(db_fd)
+        os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ.update(DB_POOL_SIZE=str(pool_size), DB_MAX_OVERFLOW='0', METRICS_ENABLED='false')
+
+    from sqlalchemy import text
+    from app import create_app, db
+    from app.utils import database
+
+    waits = []
+    observe = database.DB_POOL_WAIT.observe
+
+    class Recorder:
+        def observe(self, seconds):
+            waits.append(seconds)
+            observe(seconds)
+
+    database.DB_POOL_WAIT = Recorder()
+    app = create_app('default')
+    app.config.update(TESTING=True, DB_POOL_TIMEOUT=60)
+
+    @app.route('/bench-pool')
+    def hold_connection():
+        db.session.execute(text('SELECT 1'))
+        time.sleep(hold)
+        db.session.commit()
+        return 'ok'
+
+    with app.app_context():
+        db.session.execute(text('SELECT 1'))  # open the first connection up front
+    waits.clear()
+
+    remaining = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            assert client.get('/bench-pool').status_code == 200
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    print(f'{requests / elapsed:.0f} {percentile(waits, 0.5) * 1000:.2f} '
+          f'{percentile(waits, 0.99) * 1000:.2f} {max(waits) * 1000:.2f}')
+    if db_path:
+        os.unlink(db_path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--hold-ms', type=float, default=10.0)
+    parser.add_argument('--sizes', default='2,8', help='comma-separated pool sizes')
+    parser.add_argument('--pool-size', type=int)
+    args = parser.parse_args()
+
+    if args.pool_size:
+        run(args.pool_size, args.threads, args.requests, args.hold_ms / 1000)
+        return
+
+    print(f'{args.threads} threads, {args.requests} requests holding a connection '
+          f'for {args.hold_ms:g} ms')
+    print(f"{'pool':>5} {'req/s':>7} {'wait p50':>9} {'wait p99':>9} {'wait max':>9}")
+    for size in args.sizes.split(','):
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--pool-size', size, '--threads', str(args.threads),
+             '--requests', str(args.requests), '--hold-ms', str(args.hold_ms)], text=True)
+        rate, p50, p99, worst = output.strip().splitlines()[-1].split()
+        print(f'{size:>5} {rate:>7} {p50:>7}ms {p99:>7}ms {worst:>7}ms')
+
+if __name__ == '__main__':
+    main()
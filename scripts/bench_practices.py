@@ -0,0 +1,106 @@
+"""Benchmark calendar range queries over recurring practices for a large club.
+
+Every team gets two recurring practices for a season. Compares storing
+every occurrence with storing only the materialized window, and answering
+calendars by expanding every series on each view with the indexed range
+scan plus lazy generation.
+
+Usage: python scripts/bench_practices.py [--teams 500] [--weeks 40] [--views 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from datetime import time as clock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def seed(teams, weeks, today):
+    from app import db
+    from app.practice.models import PracticeSeries
+    from app.team.models import Team
+
+    db.session.execute(Team.__table__.insert(), [{'name': f'Team {i}'} for i in range(teams)])
+    db.session.commit()
+    until = today + timedelta(weeks=weeks)
+    db.session.add_all([
+        PracticeSeries(team_id=team, title='Practice', starts_on=today, time=clock(17 + team % 4),
+                       rule=f'FREQ=WEEKLY;BYDAY={days};UNTIL={until:%Y%m%d}', ends_on=until,
+                       location='Main gym')
+        for team in range(1, teams + 1) for days in ('MO,WE', 'TU,TH')])
+    db.session.commit()
+
+def expand_everything(start, end, team_ids):
+    """The calendar without an index: generate every series from its first day."""
+    from app.practice.models import PracticeSeries
+    found = []
+    for series in PracticeSeries.query.all():
+        if series.team_id not in team_ids:
+            continue
+        for day in series.recurrence:
+            if day > end:
+                break
+            if day >= start:
+                found.append((day, series.time, series.team_id))
+    return sorted(found)
+
+def timed(function, *args, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function(*args)
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--teams', type=int, default=500)
+    parser.add_argument('--weeks', type=int, default=40, help='length of the season')
+    parser.add_argument('--views', type=int, default=200, help='calendar requests per case')
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import create_app, db
+    from app.practice.calendar import calendar, materialize
+    from app.practice.models import Practice
+
+    app = create_app('default')
+    today = date.today() - timedelta(days=date.today().weekday())
+    try:
+        with app.app_context():
+            db.create_all()
+            seed(args.teams, args.weeks, today)
+            created, elapsed = timed(materialize, today)
+            season = args.teams * 4 * args.weeks
+            print(f'Materialized {created} rows of a {season}-occurrence season '
+                  f'({created / season:.0%}) in {elapsed:.0f} ms')
+            added, elapsed = timed(materialize, today + timedelta(days=1))
+            print(f'Next day\'s run: {added} rows in {elapsed:.1f} ms')
+            plan = db.session.execute(db.text(
+                'EXPLAIN QUERY PLAN SELECT * FROM practices WHERE team_id IN (1, 2) '
+                'AND date >= :start AND date <= :end'), {'start': today, 'end': today}).all()
+            print('Range query plan:', '; '.join(row[-1] for row in plan))
+
+            one_team = {args.teams // 2}
+            cases = [
+                ('one team, week 2 (stored)', one_team, today + timedelta(weeks=1), 6),
+                ('one team, week 30 (generated)', one_team, today + timedelta(weeks=29), 6),
+                ('whole club, week 2', set(range(1, args.teams + 1)), today + timedelta(weeks=1), 6),
+            ]
+            for label, team_ids, start, days in cases:
+                end = start + timedelta(days=days)
+                repeat = args.views if len(team_ids) == 1 else max(1, args.views // 20)
+                naive, slow = timed(expand_everything, start, end, team_ids, repeat=repeat)
+                found, fast = timed(calendar, team_ids, start, end, repeat=repeat)
+                assert [(o.date, o.time, o.team_id) for o in found] == naive
+                print(f'{label}: expand every series {slow:.2f} ms, '
+                      f'indexed calendar {fast:.2f} ms ({slow / fast:.0f}x, {len(found)} practices)')
+            assert Practice.query.count() == created + added
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Measure sustained reaction throughput with and without write-behind.
+
+Several threads tap reactions on a handful of matches for a fixed time.
+'row' stores every tap as its own row with an ORM insert and commit, the
+way a naive endpoint would; 'buffer' goes through the write-behind buffer
+with its background flusher. Reports taps/sec, database statements issued
+and how far the stored totals lag once tapping stops.
+
+Usage: python scripts/bench_reactions.py [--threads 8] [--duration 5] [--matches 4]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--matches', type=int, default=4)
+    parser.add_argument('--flush-interval', type=float, default=1.0)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from sqlalchemy import event, func
+    from app import create_app, db
+    from app.broadcast.buffer import write_buffer
+    from app.broadcast.models import ReactionCount
+
+    app = create_app('default')
+    app.config.update(BROADCAST_BUFFER_EAGER=False, BROADCAST_FLUSH_INTERVAL=args.flush_interval)
+    write_buffer.init_app(app)
+    reactions = app.config['BROADCAST_REACTIONS']
+
+    class ReactionTap(db.Model):
+        """One row per tap, for comparison."""
+        __tablename__ = 'bench_reaction_taps'
+        id = db.Column(db.Integer, primary_key=True)
+        match_id = db.Column(db.Integer, nullable=False)
+        reaction = db.Column(db.String(16), nullable=False)
+
+    with app.app_context():
+        db.create_all()
+        statements = [0]
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda *a: statements.__setitem__(0, statements[0] + 1))
+
+    def tap_rows(stop, counts):
+        with app.app_context():
+            while not stop.is_set():
+                db.session.add(ReactionTap(match_id=random.randrange(args.matches),
+                                           reaction=random.choice(reactions)))
+                db.session.commit()
+                counts.append(1)
+            db.session.remove()
+
+    def tap_buffer(stop, counts):
+        n = 0
+        while not stop.is_set():
+            write_buffer.add_reaction(random.randrange(args.matches), random.choice(reactions))
+            n += 1
+        counts.append(n)
+
+    def stored_total(mode):
+        with app.app_context():
+            if mode == 'row':
+                return ReactionTap.query.count()
+            return db.session.query(func.coalesce(func.sum(ReactionCount.count), 0)).scalar()
+
+    print(f'{args.threads} threads, {args.duration:g}s, {args.matches} matches')
+    for mode, target in (('row', tap_rows), ('buffer', tap_buffer)):
+        stop = threading.Event()
+        counts = []
+        statements[0] = 0
+        threads = [threading.Thread(target=target, args=(stop, counts))
+                   for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        taps = sum(counts)
+        stopped = time.perf_counter()
+        while stored_total(mode) < taps:
+            time.sleep(0.01)
+        lag = time.perf_counter() - stopped
+        print(f'{mode:>7}: {taps / args.duration:>12,.0f} taps/s  '
+              f'{statements[0]:>7} statements  totals current after {lag:.2f}s')
+
+    os.close(db_fd)
+    os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
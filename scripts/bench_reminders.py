@@ -0,0 +1,111 @@
+"""Benchmark the reminder queue against a once-a-minute scan of all events.
+
+Simulates one day of a season's schedule with a fake clock. The cron-style
+baseline wakes every minute and looks for events whose reminder time fell
+in the last minute; the scheduler sleeps until the next reminder is due.
+Reports wake-ups, database time and how late reminders went out. The
+scheduler also wakes every third of ``--lease`` seconds to renew its lease;
+a long lease shows the wake-ups that reminders themselves cause.
+
+Usage: python scripts/bench_reminders.py [--teams 200] [--days 120] [--lease 30]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as clock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def seed(teams, days, rng):
+    from app import db
+    from app.game.models import Game
+    from app.practice.models import Practice
+    from app.team.models import Team
+
+    db.session.execute(Team.__table__.insert(), [{'name': f'Team {i}'} for i in range(teams)])
+    first = date(2024, 9, 2)
+    events = [(first + timedelta(days=day), clock(rng.randrange(8, 21), rng.choice((0, 15, 30, 45))))
+              for team in range(teams) for day in range(0, days, 3)]
+    db.session.execute(Practice.__table__.insert(), [
+        {'team_id': i % teams + 1, 'title': 'Practice', 'date': day, 'time': at, 'duration': 90}
+        for i, (day, at) in enumerate(events)])
+    db.session.execute(Game.__table__.insert(), [
+        {'team_id': i % teams + 1, 'opponent_team_id': (i + 1) % teams + 1, 'title': 'Game',
+         'opponent': 'Rival', 'date': day + timedelta(days=1), 'time': at}
+        for i, (day, at) in enumerate(events[::2])])
+    db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--teams', type=int, default=200)
+    parser.add_argument('--days', type=int, default=120, help='length of the season')
+    parser.add_argument('--lease', type=int, default=30, help='leader lease in seconds')
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['REMINDER_THREAD'] = 'false'
+
+    from sqlalchemy import select
+    from app import create_app, db
+    from app.game.models import Game
+    from app.practice.models import Practice
+    from app.schedule.reminders import reminder_scheduler
+
+    app = create_app('default')
+    start_day = datetime(2024, 10, 1)
+    try:
+        with app.app_context():
+            db.create_all()
+            seed(args.teams, args.days, random.Random(1))
+            lead = reminder_scheduler.leads[0]
+
+            # Baseline: every minute, scan the events of the days a reminder could fall due
+            now, wakeups, found, started = start_day, 0, 0, time.perf_counter()
+            while now < start_day + timedelta(days=1):
+                window = (now - timedelta(minutes=1) + lead, now + lead)
+                for model in (Game, Practice):
+                    for day, at in db.session.execute(
+                            select(model.date, model.time)
+                            .where(model.date >= window[0].date(), model.date <= window[1].date())):
+                        if window[0] < datetime.combine(day, at) <= window[1]:
+                            found += 1
+                wakeups += 1
+                now += timedelta(minutes=1)
+            scan_time = time.perf_counter() - started
+            print(f'Per-minute scan: {wakeups:,} wake-ups, {scan_time * 1000:,.0f} ms, '
+                  f'{found:,} events due, up to 60 s late')
+
+            # The scheduler: sleep until the next reminder is due
+            fake = reminder_scheduler.clock = FakeClock(start_day)
+            reminder_scheduler.lease_duration = timedelta(seconds=args.lease)
+            reminder_scheduler.refill(start_day)  # the backlog of the first horizon, not timed
+            lags, wakeups, sent, started = [], 0, 0, time.perf_counter()
+            while fake.now < start_day + timedelta(days=1):
+                due = reminder_scheduler.next_due()
+                step_sent, wait = reminder_scheduler.run_once()
+                if step_sent:
+                    lags.append((fake.now - due).total_seconds())
+                sent += step_sent
+                wakeups += 1
+                fake.now += timedelta(seconds=wait)
+            queue_time = time.perf_counter() - started
+            print(f'Reminder queue: {wakeups:,} wake-ups, {queue_time * 1000:,.0f} ms, '
+                  f'{sent:,} reminders sent, at most {max(lags, default=0):.0f} s late')
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
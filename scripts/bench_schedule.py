@@ -0,0 +1,103 @@
+"""Benchmark conflict checks, free-slot search and season generation.
+
+Builds a club of 200 teams with weekly practices, generates a full
+round-robin season on top of them, then compares conflict checks against
+the interval indexes with a linear scan over every event.
+
+Usage: python scripts/bench_schedule.py [--teams 200] [--division 10] [--checks 20000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as clock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.schedule.engine import ScheduleIndex
+from app.schedule.generator import schedule_season
+
+FIRST_DAY = date(2024, 9, 2)  # a Monday
+PRACTICE = timedelta(minutes=90)
+GAME = timedelta(minutes=120)
+
+def build_index(teams, venues, courts):
+    """A ScheduleIndex with two weekly practices per team for the season."""
+    venue_rows = [{'id': v, 'name': f'Venue {v}', 'courts': courts,
+                   'opens_at': clock(8), 'closes_at': clock(22)} for v in range(1, venues + 1)]
+    # Coaches look after two teams each, so coach conflicts matter
+    coaches = {team: [team // 2] for team in range(teams)}
+    index = ScheduleIndex(venue_rows, coaches)
+    weeks = teams // venues + 2
+    for team in range(teams):
+        for week in range(weeks):
+            for day in (0, 2) if team % 2 else (1, 3):
+                start = datetime.combine(FIRST_DAY, clock(17 + (team // 2) % 3 * 2)) + \
+                    timedelta(weeks=week, days=day)
+                index.add(('practice', team, week, day), start, start + PRACTICE, (team,))
+    return index
+
+def linear_conflicts(events, coaches, start, end, team_ids, court):
+    """What the checks cost without an index: compare against every event."""
+    people = {coach for team in team_ids for coach in coaches.get(team, ())}
+    found = []
+    for key, (other_start, other_end, other_court, other_teams) in events.items():
+        if other_start < end and start < other_end and (
+                court is not None and court == other_court
+                or set(team_ids) & set(other_teams)
+                or people & {coach for team in other_teams for coach in coaches.get(team, ())}):
+            found.append(key)
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--teams', type=int, default=200)
+    parser.add_argument('--division', type=int, default=10, help='teams per division')
+    parser.add_argument('--venues', type=int, default=10)
+    parser.add_argument('--courts', type=int, default=2)
+    parser.add_argument('--checks', type=int, default=20000)
+    args = parser.parse_args()
+
+    index = build_index(args.teams, args.venues, args.courts)
+    divisions = [list(range(i, min(i + args.division, args.teams)))
+                 for i in range(0, args.teams, args.division)]
+    started = time.perf_counter()
+    fixtures, unplaced = schedule_season(index, divisions, FIRST_DAY, GAME, weekdays={5, 6})
+    season = time.perf_counter() - started
+    print(f'Season: {len(fixtures)} games placed, {len(unplaced)} unplaced '
+          f'in {season * 1000:.0f} ms ({len(index)} events booked)')
+
+    rng = random.Random(1)
+    span = (max(start for start, _, _, _ in index.events.values()) -
+            datetime.combine(FIRST_DAY, clock()))
+    courts = index.courts_of()
+    queries = []
+    for _ in range(args.checks):
+        start = datetime.combine(FIRST_DAY, clock(8)) + \
+            timedelta(minutes=15 * rng.randrange(int(span.total_seconds()) // 900))
+        queries.append((start, start + GAME, rng.sample(range(args.teams), 2), rng.choice(courts)))
+
+    started = time.perf_counter()
+    indexed = [len(index.conflicts(*query)) > 0 for query in queries]
+    fast = time.perf_counter() - started
+    linear_count = max(1, args.checks // 50)
+    started = time.perf_counter()
+    linear = [bool(linear_conflicts(index.events, index.coaches_by_team, *query))
+              for query in queries[:linear_count]]
+    slow = (time.perf_counter() - started) * args.checks / linear_count
+    assert linear == indexed[:linear_count]
+    print(f'Conflict checks: linear scan {args.checks / slow:,.0f}/s, '
+          f'interval index {args.checks / fast:,.0f}/s ({slow / fast:.0f}x)')
+
+    searches = 200
+    started = time.perf_counter()
+    for i in range(searches):
+        team = rng.randrange(args.teams)
+        index.free_slots(PRACTICE, datetime.combine(FIRST_DAY, clock(8)), team_ids=(team,), n=5)
+    elapsed = time.perf_counter() - started
+    print(f'Free-slot search (5 slots, all courts): {elapsed / searches * 1000:.2f} ms each')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Compare throughput and p99 latency of the gunicorn worker profiles.
+
+Each profile starts gunicorn with gunicorn.conf.py on a fresh SQLite
+database. The load generator then keeps --concurrency connections busy
+against each route for --duration seconds. 'previous' is the old fixed
+setup of 4 workers x 2 threads; 'gthread' and 'gevent' are the profiles of
+gunicorn.conf.py, with worker counts derived from the cores.
+
+Pass --wrk to drive the load with wrk and scripts/load/routes.lua instead.
+wrk is more accurate on a many-core machine; this script's generator
+shares the CPU with the server. For mixed, signed-in traffic, see
+scripts/load/locustfile.py.
+
+Usage: python scripts/bench_serving.py [--profiles previous,gthread,gevent]
+                                       [--concurrency 64] [--duration 10]
+"""
+import argparse
+import http.client
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PROFILES = {
+    'previous': {'GUNICORN_PROFILE': 'gthread', 'GUNICORN_WORKERS': '4',
+                 'GUNICORN_THREADS': '2', 'GUNICORN_PRELOAD': 'false'},
+    'gthread': {'GUNICORN_PROFILE': 'gthread'},
+    'gevent': {'GUNICORN_PROFILE': 'gevent'},
+}
+ROUTES = ('/', '/broadcast/1/reactions', '/health')
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def seed(database_url):
+    """Tables and a little data, created once before the server forks."""
+    os.environ['DATABASE_URL'] = database_url
+    from app import create_app, db
+    from app.broadcast.models import ReactionCount
+    app = create_app('default')
+    with app.app_context():
+        db.create_all()
+        db.session.add(ReactionCount(match_id=1, reaction='like', count=42))
+        db.session.commit()
+
+def start_server(profile, port, database_url, work):
+    env = dict(os.environ, DATABASE_URL=database_url, FLASK_CONFIG='production',
+               PROMETHEUS_MULTIPROC_DIR=os.path.join(work, 'metrics'),
+               MAIL_QUEUE_WORKERS='0', **PROFILES[profile])
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '--bind', f'127.0.0.1:{port}', '--chdir', work, '--pythonpath', ROOT,
+         '--log-level', 'warning', 'run:app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/health')
+            if connection.getresponse().status < 500:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f'gunicorn did not start: {server.stderr.read().decode()[-2000:]}')
+
+def load(port, path, concurrency, duration):
+    """Requests/second, p50 and p99 ms and errors, from ``concurrency`` keep-alive clients."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        mine = []
+        failed = 0
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 500:
+                    failed += 1
+            except (ConnectionError, http.client.RemoteDisconnected):
+                # A recycled worker closed the keep-alive connection; browsers retry too
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    if not latencies:
+        return 0, 0.0, 0.0, sum(errors)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    return len(latencies) / elapsed, p50, p99, sum(errors)
+
+def load_wrk(port, path, concurrency, duration):
+    output = subprocess.check_output(
+        ['wrk', '-t', str(min(concurrency, os.cpu_count() or 1)), '-c', str(concurrency),
+         '-d', f'{duration}s', '--latency', '-s', os.path.join(ROOT, 'scripts', 'load', 'routes.lua'),
+         f'http://127.0.0.1:{port}', '--', path], text=True)
+    values = dict(line.split(': ', 1) for line in output.splitlines() if ': ' in line)
+    return (float(values['requests/s']), float(values['p50'].split()[0]),
+            float(values['p99'].split()[0]), int(values['errors']))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', default='previous,gthread,gevent')
+    parser.add_argument('--routes', default=','.join(ROUTES))
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--wrk', action='store_true', help='generate the load with wrk')
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp()
+    os.makedirs(os.path.join(work, 'logs'))
+    database_url = f"sqlite:///{os.path.join(work, 'bench.db')}"
+    seed(database_url)
+    run = load_wrk if args.wrk else load
+
+    print(f'{os.cpu_count()} cores, {args.concurrency} connections, {args.duration:g} s per route')
+    print(f"{'profile':>9} {'route':<24} {'req/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    try:
+        for profile in args.profiles.split(','):
+            os.makedirs(os.path.join(work, 'metrics'), exist_ok=True)
+            port = free_port()
+            server = start_server(profile, port, database_url, work)
+            try:
+                for path in args.routes.split(','):
+                    run(port, path, min(4, args.concurrency), 1)  # warm up every worker
+                    rate, p50, p99, errors = run(port, path, args.concurrency, args.duration)
+                    print(f'{profile:>9} {path:<24} {rate:>7.0f} {p50:>8.1f} {p99:>8.1f} {errors:>6}')
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        shutil.rmtree(work)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Check that importing the app and create_app stay within a time and memory budget.
+
+Every run starts a fresh interpreter, as a gunicorn worker boot, CLI command
+or test session does. The median time and the largest peak RSS over the runs
+are compared with the budget, and the script exits with status 1 when
+either is over it, so CI can run it after the tests.
+
+Usage: python scripts/bench_startup.py [--runs 5] [--max-seconds 1.0] [--max-rss-mb 80]
+"""
+import argparse
+import os
+import statistics
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--config', default='default')
+    parser.add_argument('--max-seconds', type=float, default=1.0,
+                        help='budget for import + create_app (median)')
+    parser.add_argument('--max-rss-mb', type=float, default=80,
+                        help='budget for peak RSS after create_app')
+    args = parser.parse_args()
+
+    from app.utils.startup import profile_startup
+    profiles = [profile_startup(args.config, importtime=False) for _ in range(args.runs)]
+    imports = statistics.median(p.import_time for p in profiles)
+    creates = statistics.median(p.create_app_time for p in profiles)
+    total = statistics.median(p.total_time for p in profiles)
+    rss = max(p.rss_mb for p in profiles)
+
+    print(f'{args.runs} runs, median: import {imports * 1000:.0f} ms, '
+          f'create_app {creates * 1000:.0f} ms, total {total * 1000:.0f} ms; '
+          f'peak RSS {rss:.0f} MB')
+    over = []
+    if total > args.max_seconds:
+        over.append(f'startup {total:.2f}s > {args.max_seconds:.2f}s')
+    if rss > args.max_rss_mb:
+        over.append(f'RSS {rss:.0f} MB > {args.max_rss_mb:.0f} MB')
+    if over:
+        print('over budget: ' + ', '.join(over))
+        sys.exit(1)
+    print('within budget')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Measure stat sheet import throughput for a season-sized CSV.
+
+Writes a CSV of ``--rows`` stat lines (12 players per game, every game
+finalized) and imports it with the bulk importer, then once more under
+the same idempotency key to show a retry is a no-op. With ``--compare``
+the same rows are also loaded one ORM object at a time for reference.
+
+Usage: python scripts/bench_stat_import.py [--rows 100000] [--teams 300] [--compare]
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--teams', type=int, default=300)
+    parser.add_argument('--compare', action='store_true')
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from datetime import date, time
+    from sqlalchemy import insert
+    from app import create_app, db
+    from app.auth.models import User
+    from app.game.models import Game
+    from app.team.models import Team
+    from app.analytics.ingest import import_stat_sheet, LINE_COLUMNS, RESULT_COLUMNS
+    from app.analytics.models import STAT_COLUMNS, StatLine, GameResult
+
+    app = create_app('default')
+    random.seed(7)
+    players_per_game = 12
+    sheet_fd, sheet_path = tempfile.mkstemp(suffix='.csv')
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Team), [{'id': team, 'name': f'Team {team}'}
+                                          for team in range(1, args.teams + 1)])
+        db.session.execute(insert(User), [
+            {'id': team * 100 + slot, 'username': f'p{team}-{slot}', 'email': f'p{team}-{slot}@example.com',
+             'password_hash': '!', 'first_name': 'P', 'last_name': str(team)}
+            for team in range(1, args.teams + 1) for slot in range(players_per_game)])
+        db.session.commit()
+
+    rows = []
+    for i in range(args.rows):
+        game = i // players_per_game + 1
+        team = random.Random(game).randint(1, args.teams)
+        won = random.Random(-game).randint(0, 3)
+        kills, errors = random.randint(0, 15), random.randint(0, 5)
+        row = {column: random.randint(0, 10) for column in STAT_COLUMNS}
+        row.update(game_id=game, team_id=team, user_id=team * 100 + i % players_per_game,
+                   season='2024', kills=kills, attack_errors=errors,
+                   attack_attempts=kills + errors + random.randint(0, 15),
+                   sets_won=won, sets_lost=3 if won < 3 else 1)
+        rows.append(row)
+    with app.app_context():
+        db.session.execute(insert(Game), [
+            {'id': game, 'team_id': team, 'title': 'Game', 'opponent': 'Rival',
+             'date': date(2024, 10, 1), 'time': time(18)}
+            for game, team in {(row['game_id'], row['team_id']) for row in rows}])
+        db.session.commit()
+    with os.fdopen(sheet_fd, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=LINE_COLUMNS + RESULT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    size_mb = os.path.getsize(sheet_path) / 1024 / 1024
+
+    with app.app_context():
+        with open(sheet_path, 'rb') as f:
+            record, _, elapsed = import_stat_sheet(f, 'csv', key='bench')
+        print(f'{record.rows:,} rows, {record.games:,} games, {size_mb:.1f} MB CSV')
+        print(f'bulk import: {elapsed:.2f}s ({record.rows / elapsed:,.0f} rows/s, '
+              f'including validation and rollup rebuild)')
+        with open(sheet_path, 'rb') as f:
+            _, replayed, elapsed = import_stat_sheet(f, 'csv', key='bench')
+        print(f'retry with same key: replayed={replayed} in {elapsed:.2f}s, '
+              f'{StatLine.query.count():,} lines stored')
+
+        if args.compare:
+            db.session.query(StatLine).delete()
+            db.session.query(GameResult).delete()
+            db.session.commit()
+            start = time.perf_counter()
+            results = set()
+            for row in rows:
+                db.session.add(StatLine(**{column: row[column] for column in LINE_COLUMNS}))
+                if (row['game_id'], row['team_id']) not in results:
+                    results.add((row['game_id'], row['team_id']))
+                    db.session.add(GameResult(game_id=row['game_id'], team_id=row['team_id'],
+                                              season=row['season'], sets_won=row['sets_won'],
+                                              sets_lost=row['sets_lost']))
+                db.session.flush()  # autoflush before each query in a real form handler
+            db.session.commit()
+            elapsed = time.perf_counter() - start
+            print(f'ORM row by row: {elapsed:.2f}s ({len(rows) / elapsed:,.0f} rows/s, '
+                  f'no validation or rollups)')
+
+    os.unlink(sheet_path)
+    os.close(db_fd)
+    os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
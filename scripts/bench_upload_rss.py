@@ -0,0 +1,96 @@
+"""Measure peak RSS growth of a worker handling one large upload.
+
+Each mode runs in a fresh interpreter. 'multipart' posts the file as a form
+field and reads it the way a form handler does; 'streaming' sends it to the
+chunked upload endpoint. The request body is streamed from disk in both
+cases so the test client itself does not hold it in memory.
+
+Usage: python scripts/bench_upload_rss.py [--size-mb 16]
+"""
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def run(mode, size):
+    db_fd, db_path = tempfile.mkstemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    work = tempfile.mkdtemp()
+
+    from flask import request
+    from app import create_app, db
+    from app.auth.models import User
+
+    app = create_app('default')
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False,
+                      ATTACHMENT_FOLDER=os.path.join(work, 'attachments'),
+                      ATTACHMENT_MAX_SIZE=size + 1024, MAX_CONTENT_LENGTH=size + 1024 * 1024)
+
+    @app.route('/bench-multipart', methods=['POST'])
+    def multipart_upload():
+        data = request.files['file'].read()
+        return str(len(data))
+
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com',
+                    first_name='Bench', last_name='User')
+        user.password = 'password123'
+        db.session.add(user)
+        db.session.commit()
+
+    source = os.path.join(work, 'upload.pdf')
+    with open(source, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+        for _ in range(size // (1024 * 1024)):
+            f.write(os.urandom(1024 * 1024))
+    length = os.path.getsize(source)
+
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'bench@example.com', 'password': 'password123'})
+    baseline = peak_rss_kb()
+
+    with open(source, 'rb') as f:
+        if mode == 'multipart':
+            response = client.post('/bench-multipart', data={'file': (f, 'upload.pdf')})
+        else:
+            upload = client.post('/uploads/', headers={
+                'Upload-Filename': 'upload.pdf', 'Upload-Length': str(length)}).json
+            response = client.patch(f"/uploads/{upload['id']}", input_stream=f,
+                                    content_length=length, headers={'Upload-Offset': '0'})
+    assert response.status_code == 200, response.data
+
+    print((peak_rss_kb() - baseline) // 1024)
+    shutil.rmtree(work)
+    os.close(db_fd)
+    os.unlink(db_path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=16)
+    parser.add_argument('--mode', choices=['multipart', 'streaming'])
+    args = parser.parse_args()
+    size = args.size_mb * 1024 * 1024
+
+    if args.mode:
+        run(args.mode, size)
+        return
+
+    print(f'upload size: {args.size_mb} MB')
+    for mode in ('multipart', 'streaming'):
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--mode', mode, '--size-mb', str(args.size_mb)],
+            text=True)
+        print(f'{mode:>10}: peak RSS +{output.strip().splitlines()[-1]} MB')
+
+if __name__ == '__main__':
+    main()
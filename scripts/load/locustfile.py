@@ -0,0 +1,54 @@
+"""Locust load profile for the read-heavy routes.
+
+Anonymous visitors load the homepage and follow live match reactions;
+signed-in members (LOAD_TEST_EMAIL/LOAD_TEST_PASSWORD) open their
+dashboard, schedules and inbox. Example:
+
+    locust -f scripts/load/locustfile.py --host http://localhost:5000 \
+        --users 200 --spawn-rate 20 --run-time 2m --headless
+"""
+import os
+from locust import HttpUser, between, task
+
+class Visitor(HttpUser):
+    weight = 3
+    wait_time = between(1, 3)
+
+    @task(3)
+    def homepage(self):
+        self.client.get('/')
+
+    @task(5)
+    def match_reactions(self):
+        self.client.get('/broadcast/1/reactions', name='/broadcast/[id]/reactions')
+
+    @task(1)
+    def health(self):
+        self.client.get('/health')
+
+class Member(HttpUser):
+    weight = 1
+    wait_time = between(2, 5)
+
+    def on_start(self):
+        self.client.post('/auth/login', data={
+            'email': os.environ.get('LOAD_TEST_EMAIL', 'load@example.com'),
+            'password': os.environ.get('LOAD_TEST_PASSWORD', 'password123'),
+        })
+
+    @task(4)
+    def dashboard(self):
+        self.client.get('/')
+
+    @task(2)
+    def schedule(self):
+        self.client.get('/game/')
+        self.client.get('/practice/')
+
+    @task(2)
+    def inbox(self):
+        self.client.get('/communication/messages/inbox')
+
+    @task(1)
+    def unread(self):
+        self.client.get('/communication/messages/unread')
@@ -0,0 +1,26 @@
+-- wrk script cycling through the read-heavy routes, e.g.
+--   wrk -t4 -c200 -d60s --latency -s scripts/load/routes.lua http://localhost:5000
+-- Pass routes as arguments to narrow it down:
+--   wrk ... -s scripts/load/routes.lua http://localhost:5000 -- / /health
+
+local paths = {'/', '/broadcast/1/reactions', '/health'}
+local counter = 0
+
+function init(args)
+   if #args > 0 then
+      paths = args
+   end
+end
+
+function request()
+   counter = counter + 1
+   return wrk.format('GET', paths[(counter % #paths) + 1])
+end
+
+function done(summary, latency, requests)
+   io.write(string.format('requests/s: %.0f\n', summary.requests / (summary.duration / 1e6)))
+   for _, p in ipairs({50, 90, 99}) do
+      io.write(string.format('p%d: %.2f ms\n', p, latency:percentile(p) / 1000))
+   end
+   io.write(string.format('errors: %d\n', summary.errors.status + summary.errors.timeout))
+end
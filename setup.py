@@ -43,12 +43,14 @@ setup(
             'flake8>=3.9',
             'mypy>=0.900',
             'isort>=5.9',
+            'aiosmtpd>=1.4',
         ],
         'test': [
             'pytest>=6.0',
             'pytest-cov>=2.0',
             'pytest-flask>=1.2',
             'pytest-env>=0.6',
+            'aiosmtpd>=1.4',
         ],
         'prod': [
             'gunicorn>=20.0',
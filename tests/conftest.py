@@ -4,6 +4,8 @@ import pytest
 from app import create_app, db
 from app.auth.models import User, Role
 
+pytest_plugins = ['app.utils.pytest_plugin']
+
 @pytest.fixture
 def app():
     """Create and configure a new app instance for each test."""
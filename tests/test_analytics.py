@@ -0,0 +1,254 @@
+import io
+import json
+from datetime import date, datetime, time
+import pytest
+from app import db
+from app.analytics.cube import stat_cube
+from app.analytics.engine import record_game, rebuild
+from app.analytics import ingest
+from app.analytics.ingest import StatSheetError, import_stat_sheet
+from app.analytics.models import STAT_COLUMNS, StatLine, GameResult, PlayerSeasonStats, \
+    TeamSeasonStats
+from app.auth.models import User, TeamMember
+from app.game.models import Game
+from app.team.models import Team
+
+def box_score(player_id, kills, errors, attempts, sets=3):
+    return {'user_id': player_id, 'sets_played': sets, 'kills': kills,
+            'attack_errors': errors, 'attack_attempts': attempts, 'digs': 6,
+            'block_solos': 1, 'block_assists': 2, 'service_aces': 1}
+
+def coach_team(team_id):
+    """Make the test coach the coach of a new team ``team_id``."""
+    coach = User.query.filter_by(username='testcoach').first().id
+    db.session.add(Team(id=team_id, name=f'Team {team_id}'))
+    db.session.add(TeamMember(team_id=team_id, user_id=coach, role='coach'))
+    db.session.commit()
+
+def join_team(team_id, *user_ids):
+    """Add ``user_ids`` to team ``team_id`` as players, adding the team if needed."""
+    if db.session.get(Team, team_id) is None:
+        db.session.add(Team(id=team_id, name=f'Team {team_id}'))
+    db.session.add_all(TeamMember(team_id=team_id, user_id=user_id, role='player')
+                       for user_id in user_ids)
+    db.session.commit()
+
+def add_games(team_id, *game_ids):
+    """Schedule games ``game_ids`` for team ``team_id``, adding the team if needed."""
+    if db.session.get(Team, team_id) is None:
+        db.session.add(Team(id=team_id, name=f'Team {team_id}'))
+    db.session.add_all(Game(id=game_id, team_id=team_id, title='Game', opponent='Rival',
+                            date=date(2024, 10, 1), time=time(18)) for game_id in game_ids)
+    db.session.commit()
+
+def rollups():
+    players = {(row.user_id, row.season): row.to_dict() for row in PlayerSeasonStats.query}
+    teams = {(row.team_id, row.season): row.to_dict() for row in TeamSeasonStats.query}
+    return players, teams
+
+def test_rollups_updated_on_finalize(app):
+    """Test that finalizing games adds them to the season rollups."""
+    with app.app_context():
+        player = User.query.filter_by(username='testplayer').first().id
+        join_team(1, player)
+        record_game(1, 1, '2024', 3, 1, [box_score(player, 10, 2, 30, sets=4)])
+        record_game(2, 1, '2024', 1, 3, [box_score(player, 5, 3, 20)])
+
+        stats = db.session.get(PlayerSeasonStats, (player, 1, '2024'))
+        assert stats.games == 2
+        assert stats.kills == 15
+        assert stats.hitting_pct == pytest.approx((15 - 5) / 50)
+        assert stats.kills_per_set == pytest.approx(15 / 7, abs=0.01)
+        assert stats.blocks_per_set == pytest.approx(4 / 7, abs=0.01)
+        assert stats.points == 15 + 2 + 4
+
+        team = db.session.get(TeamSeasonStats, (1, '2024'))
+        assert (team.games, team.wins, team.losses) == (2, 1, 1)
+        assert team.sets_played == 8
+
+def test_corrections_match_rebuild(app):
+    """Test that a corrected box score and a full rebuild give the same rollups."""
+    with app.app_context():
+        player = User.query.filter_by(username='testplayer').first().id
+        coach = User.query.filter_by(username='testcoach').first().id
+        join_team(1, player, coach)
+        join_team(2, coach)
+        record_game(1, 1, '2024', 3, 0, [box_score(player, 12, 1, 25), box_score(coach, 2, 0, 4)])
+        record_game(2, 1, '2024', 2, 3, [box_score(player, 7, 4, 30, sets=5)])
+        record_game(3, 2, '2025', 3, 2, [box_score(coach, 4, 4, 12, sets=5)])
+
+        # The first game's stats are corrected after it was finalized
+        record_game(1, 1, '2024', 3, 0, [box_score(player, 11, 1, 25), box_score(coach, 2, 0, 4)])
+        assert db.session.get(PlayerSeasonStats, (player, 1, '2024')).kills == 18
+
+        incremental = rollups()
+        assert rebuild() == (3, 2)
+        assert rollups() == incremental
+
+def test_submit_game_stats(client, auth, app):
+    """Test that coaches submit box scores and anyone signed in reads rollups."""
+    with app.app_context():
+        player = User.query.filter_by(username='testplayer').first().id
+        outsider = User.query.filter_by(username='testadmin').first().id
+        coach_team(4)
+        join_team(4, player)
+    score = {'team_id': 4, 'season': '2024', 'sets_won': 3, 'sets_lost': 2,
+             'lines': [box_score(player, 9, 3, 24, sets=5)]}
+
+    auth.login(email='player@test.com')
+    assert client.post('/analytics/games/9/stats', json=score).status_code == 403
+    auth.logout()
+
+    auth.login(email='coach@test.com')
+    assert client.post('/analytics/games/9/stats', json=score).status_code == 204
+    assert client.post('/analytics/games/9/stats', json={'team_id': 4}).status_code == 400
+    # Lines are only taken for the team's own members
+    response = client.post('/analytics/games/9/stats',
+                           json=dict(score, lines=[box_score(outsider, 1, 0, 2)]))
+    assert response.status_code == 400
+    # Coaches only submit stats for the teams they coach
+    assert client.post('/analytics/games/9/stats', json=dict(score, team_id=6)).status_code == 403
+
+    response = client.get('/analytics/teams/4/players?season=2024')
+    assert response.json[0]['user_id'] == player
+    assert response.json[0]['hitting_pct'] == 0.25
+
+def test_cube_matches_rollups(app):
+    """Test that cube group-bys agree with the rollups, also after a correction."""
+    with app.app_context():
+        stat_cube.reset()
+        player = User.query.filter_by(username='testplayer').first().id
+        coach = User.query.filter_by(username='testcoach').first().id
+        join_team(1, player, coach)
+        record_game(1, 1, '2024', 3, 1, [box_score(player, 10, 2, 30), box_score(coach, 3, 1, 9)])
+        record_game(2, 1, '2024', 3, 0, [box_score(player, 8, 0, 20)])
+        assert stat_cube.refresh() == 3
+
+        def compare():
+            cube = {(row['user_id'], row['season']): row
+                    for row in stat_cube.group_by(('user_id', 'team_id', 'season'))}
+            for stats in PlayerSeasonStats.query:
+                row = cube[stats.user_id, stats.season]
+                assert row['games'] == stats.games
+                assert all(row[column] == getattr(stats, column) for column in STAT_COLUMNS)
+                assert row['hitting_pct'] == stats.hitting_pct
+            assert len(cube) == PlayerSeasonStats.query.count()
+
+        compare()
+        record_game(1, 1, '2024', 3, 1, [box_score(player, 12, 2, 30), box_score(coach, 3, 1, 9)])
+        stat_cube.refresh()
+        compare()
+
+        assert stat_cube.group_by(('user_id',), user_id=[coach])[0]['kills'] == 3
+        assert stat_cube.percentiles('kills', q=(0, 100)) == {0: 3.0, 100: 20.0}
+
+def test_cube_queries_use_the_snapshot_dictionary_sizes(app, monkeypatch):
+    """Test that group keys stay decodable while a refresh grows the dictionaries."""
+    from app.analytics.cube import Dictionary
+    with app.app_context():
+        stat_cube.reset()
+        player = User.query.filter_by(username='testplayer').first().id
+        coach = User.query.filter_by(username='testcoach').first().id
+        join_team(1, player, coach)
+        join_team(2, coach)
+        record_game(1, 1, '2024', 3, 0, [box_score(player, 12, 1, 25), box_score(coach, 2, 0, 4)])
+        record_game(2, 2, '2025', 3, 2, [box_score(coach, 4, 4, 12, sets=5)])
+        expected = stat_cube.group_by(('user_id', 'season'))
+
+        # As if another refresh encoded a new value between any two reads
+        monkeypatch.setattr(Dictionary, '__len__',
+                            lambda self: self.values.append(None) or len(self.values))
+        assert stat_cube.group_by(('user_id', 'season')) == expected
+
+def test_stat_sheet_import(client, auth, app):
+    """Test bulk stat sheet imports, including retries and invalid sheets."""
+    with app.app_context():
+        player = User.query.filter_by(username='testplayer').first().id
+        coach = User.query.filter_by(username='testcoach').first().id
+        coach_team(5)
+        add_games(5, 1, 2, 3)
+    header = 'game_id,team_id,user_id,season,sets_played,kills,attack_errors,attack_attempts,sets_won,sets_lost\n'
+    sheet = header + (f'1,5,{player},2024,4,10,2,30,3,1\n'
+                      f'1,5,{coach},2024,4,2,1,8,3,1\n'
+                      f'2,5,{player},2024,3,6,1,15,0,3\n')
+    csv_headers = {'Content-Type': 'text/csv', 'Idempotency-Key': 'week-1'}
+
+    auth.login(email='coach@test.com')
+    response = client.post('/analytics/stat-sheets', data=sheet, headers=csv_headers)
+    assert response.status_code == 201
+    assert (response.json['rows'], response.json['games']) == (3, 2)
+
+    # A retry is answered from the first import; reusing the key for other data is refused
+    response = client.post('/analytics/stat-sheets', data=sheet, headers=csv_headers)
+    assert response.status_code == 200 and response.json['replayed']
+    response = client.post('/analytics/stat-sheets', data=sheet + sheet.splitlines()[1],
+                           headers=csv_headers)
+    assert response.status_code == 409
+
+    bad = header + f'3,5,{player},2024,3,9,2,5,3,0\n3,5,999,2024,3,1,0,1,3,0\n'
+    response = client.post('/analytics/stat-sheets', data=bad, headers={'Content-Type': 'text/csv'})
+    assert response.status_code == 400
+    assert len(response.json['errors']) == 2
+    other_team = header + f'3,6,{player},2024,3,9,2,15,3,0\n'
+    response = client.post('/analytics/stat-sheets', data=other_team,
+                           headers={'Content-Type': 'text/csv'})
+    assert response.status_code == 400
+    assert response.json['errors'] == ['line 2: not allowed to import team 6']
+    unknown_game = header + f'99,5,{player},2024,3,9,2,15,3,0\n'
+    response = client.post('/analytics/stat-sheets', data=unknown_game,
+                           headers={'Content-Type': 'text/csv'})
+    assert response.status_code == 400
+    assert response.json['errors'] == ['unknown game_id 99']
+
+    with app.app_context():
+        stats = db.session.get(PlayerSeasonStats, (player, 5, '2024'))
+        assert (stats.games, stats.kills) == (2, 16)
+        assert db.session.get(TeamSeasonStats, (5, '2024')).wins == 1
+        assert StatLine.query.count() == 3
+
+    # Keys are per user, and no longer than the column that stores them
+    auth.logout()
+    auth.login()
+    response = client.post('/analytics/stat-sheets', data=header + f'3,5,{player},2024,3,9,2,15,3,0\n',
+                           headers=csv_headers)
+    assert response.status_code == 201
+    response = client.post('/analytics/stat-sheets', data=sheet,
+                           headers={'Content-Type': 'text/csv', 'Idempotency-Key': 'k' * 65})
+    assert response.status_code == 400
+
+def test_reimport_refreshes_cube(app):
+    """Test that re-importing lines of a finalized game reaches the stat cube."""
+    with app.app_context():
+        stat_cube.reset()
+        add_games(5, 1)
+        player = User.query.filter_by(username='testplayer').first().id
+        header = 'game_id,team_id,user_id,season,sets_played,kills,attack_errors,attack_attempts'
+        import_stat_sheet(io.BytesIO(f'{header},sets_won,sets_lost\n'
+                                     f'1,5,{player},2024,4,10,2,30,3,1\n'.encode()), 'csv')
+        stat_cube.refresh()
+        assert stat_cube.group_by(('user_id',))[0]['kills'] == 10
+        # The game was finalized well before the last refresh
+        GameResult.query.update({'finalized_at': datetime(2024, 1, 1)})
+        db.session.commit()
+
+        # A correction without result columns still replaces the cube's lines
+        import_stat_sheet(io.BytesIO(f'{header}\n1,5,{player},2024,4,12,2,30\n'.encode()), 'csv')
+        assert stat_cube.refresh() == 1
+        assert stat_cube.group_by(('user_id',))[0]['kills'] == 12
+
+def test_json_array_sheet_is_read_incrementally(app, monkeypatch):
+    """Test that a JSON array sheet parses across read boundaries, one row at a time."""
+    monkeypatch.setattr(ingest, 'JSON_READ_SIZE', 16)
+    with app.app_context():
+        add_games(5, 1)
+        player = User.query.filter_by(username='testplayer').first().id
+        coach = User.query.filter_by(username='testcoach').first().id
+        lines = [{'game_id': 1, 'team_id': 5, 'user_id': user, 'season': '2024',
+                  'sets_played': 3, 'kills': kills, 'attack_attempts': 20,
+                  'sets_won': 3, 'sets_lost': 0} for user, kills in ((player, 12), (coach, 4))]
+        record, _, _ = import_stat_sheet(io.BytesIO(json.dumps(lines, indent=2).encode()), 'json')
+        assert record.rows == 2
+        assert db.session.get(PlayerSeasonStats, (player, 5, '2024')).kills == 12
+
+        with pytest.raises(StatSheetError):
+            import_stat_sheet(io.BytesIO(json.dumps(lines)[:-1].encode()), 'json')
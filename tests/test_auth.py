@@ -1,4 +1,5 @@
 import pytest
+from unittest.mock import patch
 from flask import session, g
 from app.auth.models import User, Role
 from app import db
@@ -143,6 +144,24 @@ def test_profile(client, auth):
     assert b'Updated' in response.data
     assert b'9876543210' in response.data
 
+def test_user_loader_cache(client, auth, app):
+    """Test that the user loader serves cached snapshots and drops them on update."""
+    from app.auth.session import load_user, user_cache
+
+    with app.test_request_context():
+        user_id = User.query.filter_by(email='admin@test.com').first().id
+        first = load_user(str(user_id))
+        hits = user_cache.hits
+        second = load_user(str(user_id))
+        assert user_cache.hits == hits + 1
+        assert second.username == first.username == 'testadmin'
+        assert second.role.name == 'admin'
+
+        user = User.query.get(user_id)
+        user.first_name = 'Changed'
+        db.session.commit()
+        assert load_user(str(user_id)).first_name == 'Changed'
+
 def test_role_based_access(client, auth, app):
     """Test role-based access control."""
     # Create a test route that requires admin role
@@ -182,6 +201,62 @@ def test_user_model(app):
         # Test full name property
         assert user.get_full_name() == 'Test User'
 
+def test_password_rehash_on_login(client, auth, app):
+    """Test that outdated password hashes are upgraded on login."""
+    from werkzeug.security import generate_password_hash
+    from app import hasher
+
+    with app.app_context():
+        user = User.query.filter_by(email='admin@test.com').first()
+        user.password_hash = generate_password_hash('password123', 'pbkdf2:sha256:1000')
+        db.session.commit()
+
+    assert auth.login().headers['Location'] == '/'
+
+    with app.app_context():
+        user = User.query.filter_by(email='admin@test.com').first()
+        assert not hasher.needs_rehash(user.password_hash)
+        assert user.verify_password('password123')
+
+@pytest.mark.parametrize('method', ['scrypt', 'pbkdf2:sha256', 'pbkdf2:sha256:1000'])
+def test_short_hash_methods_need_no_rehash(method):
+    """Test that hashes match methods whose parameters are left to werkzeug's defaults."""
+    from werkzeug.security import generate_password_hash
+    from app.utils.hashing import PasswordHasher
+
+    hasher = PasswordHasher()
+    hasher.method = method
+    assert not hasher.needs_rehash(generate_password_hash('password123', method))
+    assert hasher.needs_rehash(generate_password_hash('password123', 'pbkdf2:sha256:2000'))
+    assert not hasher.needs_rehash(hasher.hash('password123'))
+
+def test_login_shed_when_hasher_busy(client, auth, app):
+    """Test that logins get a 503 with Retry-After when hashing is saturated."""
+    from app.utils.hashing import HashingBusy
+
+    with patch('app.utils.hashing.PasswordHasher.verify', side_effect=HashingBusy(2)):
+        response = auth.login()
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '2'
+
+def test_hashing_timeout_is_busy():
+    """Test that a hash outlasting PASSWORD_HASH_TIMEOUT is shed like a full queue."""
+    from concurrent.futures import Future
+    import threading
+    from app.utils.hashing import HashingBusy, PasswordHasher
+
+    hasher = PasswordHasher()
+    hasher.workers, hasher.timeout, hasher.retry_after = 1, 0.01, 3
+    hasher._slots = threading.BoundedSemaphore(1)
+    future = Future()
+    with patch.object(hasher, '_executor') as executor:
+        executor.return_value.submit.return_value = future
+        with pytest.raises(HashingBusy) as busy:
+            hasher.verify('pbkdf2:sha256:1$salt$hash', 'password123')
+    assert busy.value.retry_after == 3
+    assert future.cancelled()
+    assert hasher._slots.acquire(blocking=False)
+
 def test_unauthorized_access(client):
     """Test unauthorized access to protected routes."""
     protected_routes = [
@@ -0,0 +1,124 @@
+import asyncio
+import json
+from unittest.mock import patch
+from app.broadcast.buffer import write_buffer
+from app.broadcast.hub import Hub
+from app.broadcast.models import ReactionCount, ChatMessage
+
+def test_hub_coalesces_updates():
+    """Test that rapid updates reach subscribers as one merged frame."""
+    async def scenario():
+        hub = Hub(coalesce_interval=0.01)
+        queue = hub.subscribe(1)
+        other = hub.subscribe(2)
+        hub.publish(1, 'score', {'home': 1, 'away': 0})
+        hub.publish(1, 'score', {'home': 2})
+        hub.publish(1, 'chat', {'user': 'fan', 'message': 'Go!'})
+        frame = await asyncio.wait_for(queue.get(), 1)
+
+        # A late subscriber starts from the full scoreboard
+        late = hub.subscribe(1)
+        snapshot = late.get_nowait()
+        return json.loads(frame[0]), json.loads(snapshot[0]), other.empty(), hub.frames
+
+    update, snapshot, other_empty, frames = asyncio.run(scenario())
+    assert update['type'] == 'update'
+    assert update['score'] == {'home': 2, 'away': 0}
+    assert update['events'] == [{'type': 'chat', 'data': {'user': 'fan', 'message': 'Go!'}}]
+    assert snapshot['type'] == 'snapshot'
+    assert snapshot['score'] == {'home': 2, 'away': 0}
+    assert other_empty
+    assert frames == 1
+
+def test_hub_drops_slow_subscriber():
+    """Test that a subscriber that stops reading is cut off."""
+    async def scenario():
+        hub = Hub(coalesce_interval=0, queue_size=2)
+        queue = hub.subscribe(1)
+        for home in range(3):
+            hub.publish(1, 'score', {'home': home})
+            await asyncio.sleep(0.01)
+        return queue.get_nowait(), hub.subscriber_count, hub.dropped
+
+    frame, subscribers, dropped = asyncio.run(scenario())
+    assert frame is None
+    assert subscribers == 0
+    assert dropped == 1
+
+def test_score_update_published(client, auth):
+    """Test that coaches can push score updates and players cannot."""
+    with patch('app.broadcast.routes.publish_event') as publish:
+        auth.login(email='coach@test.com')
+        response = client.post('/broadcast/7/score', json={'home': 3, 'away': 1})
+        assert response.status_code == 204
+        publish.assert_called_once_with(7, 'score', {'home': 3, 'away': 1})
+
+        auth.logout()
+        auth.login(email='player@test.com')
+        response = client.post('/broadcast/7/score', json={'home': 4})
+        assert response.status_code == 403
+        response = client.post('/broadcast/7/chat', json={'message': 'Nice serve'})
+        assert response.status_code == 204
+        publish.assert_called_with(7, 'chat', {'user': 'testplayer', 'message': 'Nice serve'})
+
+def test_reactions_written_behind(client, auth, app, monkeypatch):
+    """Test that reactions are counted in memory and flushed as totals."""
+    monkeypatch.setattr(write_buffer, 'eager', False)
+    monkeypatch.setattr(write_buffer, '_ensure_thread', lambda: None)
+    auth.login(email='player@test.com')
+    for reaction in ('clap', 'clap', 'fire'):
+        assert client.post('/broadcast/3/react', json={'reaction': reaction}).status_code == 202
+    assert client.post('/broadcast/3/react', json={'reaction': 'boo'}).status_code == 400
+
+    with app.app_context():
+        assert ReactionCount.query.count() == 0
+        assert client.get('/broadcast/3/reactions').json['clap'] == 2
+
+        assert write_buffer.flush() == (2, 0)
+        write_buffer.add_reaction(3, 'clap', 5)
+        write_buffer.flush()
+        totals = {row.reaction: row.count for row in ReactionCount.query.filter_by(match_id=3)}
+    assert totals == {'clap': 7, 'fire': 1}
+
+def test_chat_messages_saved(client, auth, app):
+    """Test that chat messages are stored through the write buffer."""
+    auth.login(email='player@test.com')
+    with patch('app.broadcast.routes.publish_event'):
+        client.post('/broadcast/3/chat', json={'message': 'Great dig'})
+        client.post('/broadcast/3/chat', json={'message': 'Ace!'})
+    with app.app_context():
+        messages = ChatMessage.query.filter_by(match_id=3).order_by(ChatMessage.id).all()
+        assert [m.body for m in messages] == ['Great dig', 'Ace!']
+
+def test_chat_buffer_is_capped_while_writes_fail(app, monkeypatch):
+    """Test that failed flushes keep only the newest chat, counting the drops."""
+    import pytest
+    from app.auth.models import User
+    from app.utils.metrics import BROADCAST_CHAT_DROPPED
+    monkeypatch.setattr(write_buffer, 'eager', False)
+    monkeypatch.setattr(write_buffer, '_ensure_thread', lambda: None)
+    monkeypatch.setattr(write_buffer, 'max_chat', 3)
+    monkeypatch.setattr(write_buffer, '_write', lambda reactions, chat: 1 / 0)
+    dropped = BROADCAST_CHAT_DROPPED._value.get()
+    with app.app_context():
+        fan = User.query.filter_by(username='testplayer').first().id
+        for i in range(2):
+            write_buffer.add_chat(3, fan, f'before {i}')
+        with pytest.raises(ZeroDivisionError):
+            write_buffer.flush()
+        for i in range(2):
+            write_buffer.add_chat(3, fan, f'after {i}')
+        assert [m['body'] for m in write_buffer._chat] == ['before 1', 'after 0', 'after 1']
+        assert BROADCAST_CHAT_DROPPED._value.get() - dropped == 1
+        monkeypatch.undo()
+        assert write_buffer.flush() == (0, 3)
+
+def test_events_use_the_shared_redis_client(app, monkeypatch):
+    """Test that events are published through the app's Redis client when there is one."""
+    from unittest.mock import Mock
+    from app.broadcast.events import publish_event
+    client = Mock()
+    monkeypatch.setitem(app.extensions, 'redis', client)
+    with app.app_context():
+        publish_event(7, 'score', {'home': 1})
+    client.publish.assert_called_once_with('broadcast:7', json.dumps({'type': 'score', 'data': {'home': 1}}))
@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+from app import db
+from app.auth.models import User, TeamMember
+from app.communication.feeds import (post_announcement, acknowledge, outstanding_user_ids,
+                                     unread_announcements, feed_page)
+from app.communication.mailbox import (send_message, mark_read, unread_count, inbox_page,
+                                       conversation_page, conversations_page)
+from app.communication.models import Message, Announcement
+from app.utils.pagination import encode_cursor
+
+def user_ids():
+    return [User.query.filter_by(username=name).first().id
+            for name in ('testadmin', 'testcoach', 'testplayer')]
+
+def test_keyset_pages_cover_inbox(app):
+    """Test that cursor pages walk the whole inbox once, newest first, despite equal timestamps."""
+    with app.app_context():
+        admin, coach, player = user_ids()
+        sent_at = datetime(2024, 5, 1)
+        db.session.add_all([
+            Message(conversation_id=1, sender_id=coach, recipient_id=player, body=str(i),
+                    created_at=sent_at + timedelta(minutes=i // 3))
+            for i in range(25)])
+        db.session.commit()
+
+        seen, cursor = [], None
+        while True:
+            items, cursor = inbox_page(player, cursor, limit=4)
+            seen.extend(items)
+            if cursor is None:
+                break
+        expected = sorted(Message.query.filter_by(recipient_id=player),
+                          key=lambda m: (m.created_at, m.id), reverse=True)
+        assert [m.id for m in seen] == [m.id for m in expected]
+        assert inbox_page(admin)[0] == []
+
+def test_unread_counters_and_threads(app):
+    """Test that unread counts follow sends and reads, and threads stay private."""
+    with app.app_context():
+        admin, coach, player = user_ids()
+        first = send_message(coach, player, 'Practice moved to 6pm', subject='Practice')
+        send_message(player, coach, 'Thanks!', conversation_id=first.conversation_id)
+        send_message(coach, player, 'See you there', conversation_id=first.conversation_id)
+        other = send_message(admin, player, 'Welcome to the club')
+        assert unread_count(player) == 3
+        assert unread_count(coach) == 1
+
+        conversations, _ = conversations_page(player)
+        assert [c.conversation_id for c in conversations] == \
+            [other.conversation_id, first.conversation_id]
+        assert conversations[1].unread == 2
+        assert conversations[1].last_message.body == 'See you there'
+
+        assert mark_read(player, first.conversation_id) == 2
+        assert mark_read(player, first.conversation_id) == 0
+        assert unread_count(player) == 1
+
+        thread, _ = conversation_page(player, first.conversation_id)
+        assert [m.body for m in thread] == ['See you there', 'Thanks!', 'Practice moved to 6pm']
+        assert conversation_page(admin, first.conversation_id)[0] == []
+
+def test_message_routes(client, auth, app):
+    """Test sending, paging and reading messages over HTTP."""
+    with app.app_context():
+        admin, coach, player = user_ids()
+    auth.login(email='coach@test.com')
+    conversation_id = None
+    for i in range(3):
+        response = client.post('/communication/messages', json={
+            'recipient_id': player, 'body': f'Drill {i}', 'conversation_id': conversation_id})
+        assert response.status_code == 201
+        conversation_id = response.json['conversation_id']
+    assert client.post('/communication/messages', json={
+        'recipient_id': admin, 'body': 'Hi', 'conversation_id': conversation_id}).status_code == 404
+    assert client.post('/communication/messages', json={'recipient_id': player}).status_code == 400
+    auth.logout()
+
+    auth.login(email='player@test.com')
+    assert client.get('/communication/messages/unread').json == {'unread': 3}
+    page = client.get('/communication/messages/inbox?limit=2').json
+    assert [m['body'] for m in page['items']] == ['Drill 2', 'Drill 1']
+    page = client.get(f"/communication/messages/inbox?limit=2&cursor={page['next_cursor']}").json
+    assert [m['body'] for m in page['items']] == ['Drill 0']
+    assert page['next_cursor'] is None
+    assert client.get('/communication/messages/inbox?cursor=bogus').status_code == 400
+    # Well-formed cursors with a bad timestamp are refused the same way
+    for values in ([1, 2], ['yesterday', 2], ['2024-09-02T18:00:00', [2]]):
+        cursor = encode_cursor(values)
+        assert client.get(f'/communication/messages/inbox?cursor={cursor}').status_code == 400
+
+    response = client.get('/communication/messages')
+    assert response.status_code == 200
+    assert b'Drill 2' in response.data
+    response = client.post(f'/communication/conversations/{conversation_id}/read')
+    assert response.json == {'marked': 3, 'unread': 0}
+    auth.logout()
+
+    auth.login(email='admin@test.com')
+    assert client.get(f'/communication/conversations/{conversation_id}').status_code == 404
+
+def join_team(team_id, *members):
+    db.session.add_all([TeamMember(team_id=team_id, user_id=user_id, role=role)
+                        for user_id, role in members])
+    db.session.commit()
+
+def test_announcement_fan_out_and_acknowledgments(app):
+    """Test that posting fills member feeds and acknowledgments flip their bits."""
+    with app.app_context():
+        admin, coach, player = user_ids()
+        join_team(1, (coach, 'coach'), (player, 'player'), (admin, 'parent'))
+        first = post_announcement(1, coach, 'Tournament', 'Bus leaves at 7', notify=False)
+        second = post_announcement(1, coach, 'Jerseys', 'Bring both sets', notify=False)
+        assert first.recipient_count == 2
+        assert unread_announcements(player) == 2
+        assert unread_announcements(coach) == 0
+        assert [e.announcement_id for e in feed_page(player)[0]] == [second.id, first.id]
+
+        assert acknowledge(player, first.id) is True
+        assert acknowledge(player, first.id) is False
+        assert unread_announcements(player) == 1
+        assert [e.announcement_id for e in feed_page(player, unread_only=True)[0]] == [second.id]
+
+        db.session.expire_all()
+        first = db.session.get(Announcement, first.id)
+        assert first.acknowledged_count == 1
+        assert outstanding_user_ids(first) == [admin]
+        assert outstanding_user_ids(db.session.get(Announcement, second.id)) == [player, admin]
+
+def test_announcement_routes(client, auth, app):
+    """Test that coaches post to their teams and see who has not acknowledged."""
+    with app.app_context():
+        admin, coach, player = user_ids()
+        join_team(3, (coach, 'coach'), (player, 'player'))
+    auth.login(email='coach@test.com')
+    response = client.post('/communication/announcements', json={
+        'team_id': 3, 'title': 'Practice', 'content': 'Moved to gym B', 'notify': False})
+    assert response.status_code == 201
+    announcement_id = response.json['id']
+    assert client.post('/communication/announcements', json={
+        'team_id': 4, 'title': 'Practice', 'content': 'Not my team'}).status_code == 403
+    auth.logout()
+
+    auth.login(email='player@test.com')
+    assert client.post('/communication/announcements', json={
+        'team_id': 3, 'title': 'Hi', 'content': 'Players cannot post'}).status_code == 403
+    feed = client.get('/communication/announcements/feed?unread=1').json
+    assert [a['id'] for a in feed['items']] == [announcement_id]
+    assert b'Moved to gym B' in client.get(f'/communication/announcements/{announcement_id}').data
+    response = client.post(f'/communication/announcements/{announcement_id}/acknowledge')
+    assert response.json == {'acknowledged': True, 'unread': 0}
+    assert client.get(f'/communication/announcements/{announcement_id}/outstanding').status_code == 403
+    auth.logout()
+
+    auth.login(email='coach@test.com')
+    response = client.get(f'/communication/announcements/{announcement_id}/outstanding')
+    assert response.json == {'outstanding': [], 'recipients': 1, 'acknowledged': 1}
+    auth.logout()
+
+    auth.login(email='admin@test.com')
+    assert client.post(f'/communication/announcements/{announcement_id}/acknowledge').status_code == 404
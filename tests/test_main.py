@@ -146,3 +146,141 @@ def test_navigation_menu(client, auth):
     assert b'Announcements' in response.data
     assert b'Profile' in response.data
     assert b'Logout' in response.data
+
+def test_stats_updated_on_registration(client, auth, app):
+    """Test that cached statistics are refreshed when a user registers."""
+    client.get('/')
+    with app.app_context():
+        from app.main.stats import get_site_stats
+        before = get_site_stats()
+
+    auth.register(username='statsuser', email='stats@test.com', role='coach')
+
+    with app.app_context():
+        after = get_site_stats()
+        assert after['total_users'] == before['total_users'] + 1
+        assert after['total_coaches'] == before['total_coaches'] + 1
+        assert after['total_players'] == before['total_players']
+
+def test_stale_stats_are_served_while_recounting(app):
+    """Test that stale counters are served and recounted once, off the request."""
+    import threading
+    from datetime import datetime
+    from app.main.models import SiteStat
+    from app.main.stats import get_site_stats, invalidate_site_stats, recompute_site_stats
+
+    with app.app_context():
+        recompute_site_stats()
+        SiteStat.query.update({'value': 0, 'computed_at': datetime(2024, 1, 1)})
+        db.session.commit()
+        invalidate_site_stats()
+
+        app.testing = False
+        try:
+            assert get_site_stats()['total_users'] == 0
+        finally:
+            app.testing = True
+        for thread in threading.enumerate():
+            if thread.name == 'site-stats-recount':
+                thread.join()
+        db.session.expire_all()
+        assert db.session.get(SiteStat, 'total_users').value == 3
+        assert get_site_stats()['total_users'] == 3
+
+def test_dashboard_query_count(app):
+    """Test that the dashboard takes the same number of queries for one team or many."""
+    from datetime import date, time, timedelta
+    from app.auth.models import TeamMember
+    from app.communication.models import Announcement
+    from app.game.models import Game
+    from app.main.dashboard import load_dashboard
+    from app.practice.models import Practice
+    from app.team.models import Team
+    from app.utils.profiling import query_profiler
+
+    def count_queries(user_id):
+        with query_profiler.capture() as profile:
+            dashboard = load_dashboard(user_id)
+        return profile.count, dashboard
+
+    with app.app_context():
+        player = User.query.filter_by(username='testplayer').first()
+        coach = User.query.filter_by(username='testcoach').first()
+        tomorrow = date.today() + timedelta(days=1)
+
+        def add_team(n):
+            team = Team(name=f'Team {n}')
+            db.session.add_all([
+                TeamMember(team=team, user=player, role='player'),
+                TeamMember(team=team, user=coach, role='coach'),
+                Game(team=team, title=f'Game {n}', opponent='Rivals', date=tomorrow,
+                     time=time(18), location='Gym'),
+                Practice(team=team, title=f'Practice {n}', date=tomorrow, time=time(17)),
+            ])
+            db.session.flush()
+            db.session.add(Announcement(team_id=team.id, author_id=coach.id,
+                                        title=f'News {n}', content='...'))
+            db.session.commit()
+
+        add_team(0)
+        one_team, dashboard = count_queries(player.id)
+        assert dashboard['user_teams'][0]['team']['member_count'] == 2
+        assert dashboard['upcoming_games'][0]['team']['name'] == 'Team 0'
+
+        for n in range(1, 8):
+            add_team(n)
+        many_teams, dashboard = count_queries(player.id)
+        assert len(dashboard['user_teams']) == 8
+        assert len(dashboard['recent_announcements']) == 5
+        assert many_teams == one_team == 4
+
+@pytest.mark.query_budget(15)
+def test_dashboard_query_budget(client, auth):
+    """Test that rendering the dashboard stays within its query budget.
+
+    The first page view also recomputes the site statistics (10 queries).
+    """
+    auth.login(email='coach@test.com')
+    response = client.get('/')
+    assert response.status_code == 200
+
+def test_health_check(client, app):
+    """Test that the readiness check reports the database and mail queue."""
+    response = client.get('/health')
+    assert response.status_code == 200
+    assert response.json['status'] == 'ok'
+    assert response.json['checks']['database'] == 'ok'
+    assert response.json['checks']['mail_queue'] == {'depth': 0}
+
+    app.config['HEALTH_MAIL_QUEUE_LIMIT'] = -1
+    assert client.get('/health').json['status'] == 'degraded'
+
+def test_health_and_metrics_reuse_shared_state(client, app):
+    """Test that probes ping the shared Redis client and scrapes reuse recent queue counts."""
+    from unittest.mock import Mock, patch
+    from app.utils.mail_queue import mail_queue
+
+    app.extensions['redis'] = Mock()
+    assert client.get('/health').json['checks']['redis'] == 'ok'
+    client.get('/health')
+    assert app.extensions['redis'].ping.call_count == 2
+
+    assert 'mail_queue_depth 0.0' in client.get('/metrics').data.decode()
+    with patch.object(mail_queue, 'depth', return_value=7) as depth:
+        assert 'mail_queue_depth 0.0' in client.get('/metrics').data.decode()
+        assert depth.call_count == 0
+
+def test_metrics_endpoint(client):
+    """Test that request latencies and counts are exported per endpoint."""
+    client.get('/')
+    client.get('/no-such-page')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    text = response.data.decode()
+    assert 'http_request_duration_seconds_count{blueprint="main",endpoint="main.index",method="GET"}' in text
+    assert 'http_requests_total{blueprint="",endpoint="unmatched",method="GET",status="404"}' in text
+    assert 'http_requests_in_progress{blueprint="main"} 1.0' in text
+    assert 'cache_requests_total{cache="site_stats",result="miss"}' in text
+    assert 'db_pool_connections{state="checked_out"}' in text
+    assert 'mail_queue_depth 0.0' in text
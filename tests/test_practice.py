@@ -0,0 +1,162 @@
+from datetime import date, time, timedelta
+import pytest
+from app import db
+from app.auth.models import User, TeamMember
+from app.practice.attendance import attendance_rates, attendees, record_attendance
+from app.practice.calendar import calendar, change_occurrence, create_series, materialize
+from app.practice.models import Practice, PracticeSeries
+from app.practice.recurrence import Recurrence
+from app.team.models import Team
+
+def test_recurrence_rules():
+    """Test weekly, interval and count rules and that ranges start mid-series."""
+    rule = Recurrence.parse('RRULE:FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=20241215', date(2024, 9, 4))
+    days = list(rule)
+    assert days[:3] == [date(2024, 9, 4), date(2024, 9, 9), date(2024, 9, 11)]
+    assert days[-1] == rule.last() == date(2024, 12, 11)
+    assert str(rule) == 'FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=20241215'
+
+    fortnightly = Recurrence.parse('FREQ=WEEKLY;INTERVAL=2;BYDAY=TU;COUNT=3', date(2024, 9, 2))
+    assert list(fortnightly) == [date(2024, 9, 3), date(2024, 9, 17), date(2024, 10, 1)]
+    assert list(fortnightly.between(date(2024, 9, 10), date(2024, 9, 30))) == [date(2024, 9, 17)]
+
+    open_ended = Recurrence.parse('FREQ=WEEKLY;BYDAY=TH', date(2024, 9, 2))
+    assert open_ended.last() is None
+    assert list(open_ended.between(date(2034, 1, 1), date(2034, 1, 10))) == \
+        [date(2034, 1, 5)]
+
+    for text in ('FREQ=MONTHLY', 'FREQ=WEEKLY;BYDAY=XX', 'FREQ=DAILY;BYDAY=MO',
+                 'FREQ=WEEKLY;BYDAY=MO;UNTIL=20240903'):
+        with pytest.raises(ValueError):
+            Recurrence.parse(text, date(2024, 9, 4))
+
+def test_materialized_window_and_exceptions(app):
+    """Test that only the window is stored, the rest is generated, and exceptions apply to both."""
+    with app.app_context():
+        app.config['PRACTICE_WINDOW_WEEKS'] = 2
+        team = Team(name='Falcons')
+        db.session.add(team)
+        db.session.commit()
+        monday = date.today() - timedelta(days=date.today().weekday()) + timedelta(weeks=1)
+        series = create_series(team.id, 'Practice', monday, time(18), 'FREQ=WEEKLY;BYDAY=MO,WE',
+                               location='Main gym')
+        # Mondays and Wednesdays up to two weeks from today
+        stored = Practice.query.filter_by(series_id=series.id).count()
+        assert stored == len(list(series.recurrence.between(monday, series.materialized_through)))
+        assert materialize() == 0
+
+        later = monday + timedelta(weeks=6)
+        change_occurrence(series, monday + timedelta(days=2), cancelled=True)
+        change_occurrence(series, later, date=later + timedelta(days=1), time=time(19),
+                          location='Gym B')
+        with pytest.raises(ValueError):
+            change_occurrence(series, monday + timedelta(days=1), cancelled=True)
+
+        week = calendar([team.id], monday, monday + timedelta(days=6))
+        assert [(o.date, o.practice_id is not None) for o in week] == [(monday, True)]
+        moved = calendar([team.id], later, later + timedelta(days=2))
+        assert [(o.date, o.time, o.location) for o in moved] == \
+            [(later + timedelta(days=1), time(19), 'Gym B'), (later + timedelta(days=2), time(18),
+                                                              'Main gym')]
+        assert all(o.practice_id is None for o in moved)
+
+        # Once the window reaches it, the moved occurrence is stored as moved
+        materialize(today=later)
+        stored = calendar([team.id], later, later + timedelta(days=2))
+        assert [(o.date, o.time) for o in stored] == [(o.date, o.time) for o in moved]
+        assert all(o.practice_id is not None for o in stored)
+        assert db.session.get(PracticeSeries, series.id).materialized_through == \
+            later + timedelta(weeks=2)
+
+def test_series_routes(app, client, auth):
+    """Test that coaches create series for their teams and read them back on the calendar."""
+    with app.app_context():
+        team = Team(name='Falcons')
+        db.session.add(team)
+        db.session.flush()
+        coach = User.query.filter_by(username='testcoach').first()
+        db.session.add(TeamMember(team_id=team.id, user_id=coach.id, role='coach'))
+        db.session.commit()
+        team_id = team.id
+
+    payload = {'team_id': team_id, 'title': 'Practice', 'starts_on': '2030-01-07',
+               'time': '18:00', 'rule': 'FREQ=WEEKLY;BYDAY=MO,WE;COUNT=4'}
+    auth.login(email='player@test.com')
+    assert client.post('/practice/series', json=payload).status_code == 403
+    auth.logout()
+
+    auth.login(email='coach@test.com')
+    assert client.post('/practice/series', json=dict(payload, rule='FREQ=YEARLY')).status_code == 400
+    response = client.post('/practice/series', json=payload)
+    assert response.status_code == 201
+    series = response.get_json()
+    assert series['ends_on'] == '2030-01-16'
+
+    response = client.put(f"/practice/series/{series['id']}/occurrences/2030-01-09",
+                          json={'cancelled': True})
+    assert response.status_code == 200
+    days = client.get('/practice/calendar?start=2030-01-01&end=2030-01-31').get_json()
+    assert [day['date'] for day in days] == ['2030-01-07', '2030-01-14', '2030-01-16']
+    assert client.get('/practice/calendar?start=2030-01-31&end=2030-01-01').status_code == 400
+
+def test_attendance_bitsets_follow_roster_versions(app):
+    """Test that rates count only the practices a player was on the roster for."""
+    with app.app_context():
+        team = Team(name='Falcons')
+        players = [User(username=f'player{i}', email=f'p{i}@test.com', first_name='P',
+                        last_name=str(i)) for i in range(4)]
+        db.session.add_all([team] + players)
+        db.session.flush()
+        ids = [player.id for player in players]
+        db.session.add_all([TeamMember(team_id=team.id, user_id=user_id, role='player')
+                            for user_id in ids[:3]])
+        practices = [Practice(team_id=team.id, title='Practice', date=date(2024, 9, day),
+                              time=time(18)) for day in (2, 4, 9)]
+        db.session.add_all(practices)
+        db.session.commit()
+
+        record_attendance(practices[0], present=ids[:2], season='2024')
+        with pytest.raises(ValueError):
+            record_attendance(practices[1], present=[ids[3]], season='2024')
+        # Player 0 leaves and player 3 joins: a new roster version, same slots for the rest
+        TeamMember.query.filter_by(team_id=team.id, user_id=ids[0]).delete()
+        db.session.add(TeamMember(team_id=team.id, user_id=ids[3], role='player'))
+        db.session.commit()
+        record_attendance(practices[1], absent=[ids[1]], season='2024')
+        second = record_attendance(practices[2], present=[ids[3]], season='2024')
+        assert second.roster.version == 2
+        assert attendees(second) == ([ids[3]], [ids[1], ids[2]])
+
+        report = attendance_rates(team.id, '2024')
+        assert report['sessions'] == 3
+        assert {row['user_id']: (row['attended'], row['sessions']) for row in report['players']} \
+            == {ids[0]: (1, 1), ids[1]: (1, 3), ids[2]: (1, 3), ids[3]: (2, 2)}
+        assert report['rate'] == pytest.approx(5 / 9)
+        assert attendance_rates(team.id, '2023')['sessions'] == 0
+
+def test_take_attendance_route(app, client, auth):
+    """Test that the coach takes attendance in one request and players cannot."""
+    with app.app_context():
+        team = Team(name='Falcons')
+        db.session.add(team)
+        db.session.flush()
+        coach = User.query.filter_by(username='testcoach').first()
+        player = User.query.filter_by(username='testplayer').first()
+        db.session.add_all([TeamMember(team_id=team.id, user_id=coach.id, role='coach'),
+                            TeamMember(team_id=team.id, user_id=player.id, role='player')])
+        practice = Practice(team_id=team.id, title='Practice', date=date(2024, 9, 2), time=time(18))
+        db.session.add(practice)
+        db.session.commit()
+        practice_id, player_id, team_id = practice.id, player.id, team.id
+
+    auth.login(email='player@test.com')
+    assert client.put(f'/practice/{practice_id}/attendance',
+                      json={'present': [player_id]}).status_code == 403
+    auth.logout()
+    auth.login(email='coach@test.com')
+    response = client.put(f'/practice/{practice_id}/attendance', json={'present': [player_id]})
+    assert response.get_json() == {'practice_id': practice_id, 'present_count': 1,
+                                   'roster_version': 1}
+    assert client.get(f'/practice/{practice_id}/attendance').get_json()['present'] == [player_id]
+    report = client.get(f'/practice/attendance/teams/{team_id}').get_json()
+    assert report['rate'] == 1.0
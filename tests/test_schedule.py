@@ -0,0 +1,206 @@
+from datetime import datetime, time, timedelta
+from itertools import combinations
+from app import db, mail
+from app.auth.models import User, TeamMember
+from app.game.models import Game
+from app.practice.models import Practice
+from app.schedule.engine import ScheduleIndex
+from app.schedule.generator import round_robin
+from app.schedule.intervals import IntervalIndex
+from app.schedule.models import Reminder, Venue
+from app.schedule.reminders import ReminderScheduler, reminder_scheduler
+from app.team.models import Team
+
+MONDAY = datetime(2024, 9, 2)
+
+def at(hour, minute=0, day=0):
+    return MONDAY + timedelta(days=day, hours=hour, minutes=minute)
+
+def test_interval_index_merges_and_splits_blocks():
+    """Test that overlapping intervals share a busy block until one is removed."""
+    index = IntervalIndex()
+    index.add(at(18), at(20), 'a')
+    index.add(at(19), at(21), 'b')
+    index.add(at(22), at(23), 'c')
+    assert not index.is_free(at(20, 30), at(20, 45))
+    assert index.is_free(at(21), at(22))
+    assert index.busy_until(at(18, 30)) == at(21)
+    assert [key for _, _, key in index.overlapping(at(20), at(22, 30))] == ['b', 'c']
+
+    index.remove(at(19), at(21), 'b')
+    assert index.is_free(at(20), at(22))
+    assert index.next_busy(at(20)) == at(22)
+    assert index.overlapping(at(20), at(22)) == []
+
+def test_conflicts_cover_courts_teams_and_coaches():
+    """Test that an event clashes on its court, its teams and the teams' coaches."""
+    venues = [{'id': 1, 'name': 'Gym', 'courts': 2, 'opens_at': time(8), 'closes_at': time(22)}]
+    index = ScheduleIndex(venues, coaches_by_team={1: [7], 2: [7], 3: [8]})
+    index.add(('game', 1), at(18), at(20), (1, 3), court=(1, 1))
+
+    assert index.is_free(at(18), at(20), team_ids=(4,), court=(1, 2))
+    assert index.conflicts(at(19), at(21), team_ids=(4,), court=(1, 1)) == \
+        [('court', (1, 1), ('game', 1))]
+    # Team 2 shares coach 7 with team 1
+    assert index.conflicts(at(19), at(21), team_ids=(2,)) == [('coach', 7, ('game', 1))]
+    assert index.conflicts(at(19), at(21), team_ids=(3,), ignore=('game', 1)) == []
+
+def test_free_slots_skip_busy_courts_and_closed_hours():
+    """Test that free slots work around bookings, opening hours and weekdays."""
+    venues = [{'id': 1, 'name': 'Gym', 'courts': 1, 'opens_at': time(17), 'closes_at': time(22)}]
+    index = ScheduleIndex(venues)
+    index.add(('game', 1), at(17), at(19), (1,), court=(1, 1))
+    index.add(('practice', 1), at(19), at(20, 10), (2,), court=(1, 1))
+
+    slots = index.free_slots(timedelta(minutes=90), at(9), n=3)
+    assert slots == [(at(20, 15), (1, 1)), (at(17, day=1), (1, 1)), (at(18, 30, day=1), (1, 1))]
+    # Team 2 is busy until 20:10 wherever it plays, and 90 minutes no longer fit in Monday
+    assert index.free_slots(timedelta(minutes=120), at(9), team_ids=(2,), n=1) == \
+        [(at(17, day=1), (1, 1))]
+    assert index.free_slots(timedelta(minutes=90), at(9), n=1, weekdays={5}) == \
+        [(at(17, day=5), (1, 1))]
+
+def test_round_robin_pairs_every_team_once():
+    """Test that every pair of teams meets exactly once and nobody plays twice in a round."""
+    for size in (4, 5):
+        rounds = round_robin(range(1, size + 1))
+        games = [frozenset(pair) for pairs in rounds for pair in pairs]
+        assert sorted(games, key=sorted) == \
+            sorted(map(frozenset, combinations(range(1, size + 1), 2)), key=sorted)
+        for pairs in rounds:
+            teams = [team for pair in pairs for team in pair]
+            assert len(teams) == len(set(teams))
+
+def test_generate_season(app, logged_in_admin, client):
+    """Test that a generated season creates non-overlapping games and checks roles."""
+    with app.app_context():
+        teams = [Team(name=f'Team {i}') for i in range(4)]
+        venue = Venue(name='Gym', courts=1, opens_at=time(18), closes_at=time(22))
+        db.session.add_all(teams + [venue])
+        db.session.flush()
+        coach = User.query.filter_by(username='testcoach').first()
+        db.session.add(TeamMember(team_id=teams[0].id, user_id=coach.id, role='coach'))
+        db.session.commit()
+        team_ids, venue_id = [team.id for team in teams], venue.id
+
+    payload = {'divisions': [team_ids], 'first_day': '2024-09-02', 'duration': 120,
+               'venue_ids': [venue_id], 'weekdays': [0]}
+    # Two two-hour games fit on one court each Monday evening
+    response = logged_in_admin.post('/schedule/season', json=payload)
+    assert response.status_code == 201
+    assert response.get_json() == {'created': 6, 'unplaced': []}
+
+    with app.app_context():
+        games = Game.query.order_by(Game.date, Game.time).all()
+        assert all(game.date.weekday() == 0 and game.venue_id == venue_id for game in games)
+        starts = [datetime.combine(game.date, game.time) for game in games]
+        assert all(b - a >= timedelta(minutes=120) for a, b in zip(starts, starts[1:]))
+
+    response = client.get('/schedule/conflicts', query_string={
+        'start': starts[0].isoformat(), 'duration': 60, 'venue_id': venue_id, 'court': 1})
+    assert response.get_json()['free'] is False
+
+    # Another season on the same evenings cannot fit
+    response = logged_in_admin.post('/schedule/season', json=payload)
+    assert response.status_code == 409
+    assert len(response.get_json()['unplaced']) == 6
+
+    client.get('/auth/logout')
+    client.post('/auth/login', data={'email': 'coach@test.com', 'password': 'password123'})
+    assert client.post('/schedule/season', json=payload).status_code == 403
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_reminders_go_out_once_per_team(app, monkeypatch):
+    """Test that reminders wait for their due time, reach both teams once and move with events."""
+    clock = FakeClock(datetime(2024, 9, 2, 12, 0))
+    monkeypatch.setattr(reminder_scheduler, 'clock', clock)
+    monkeypatch.setitem(app.config, 'MAIL_USERNAME', 'club@test.com')
+    with app.app_context():
+        home, away = Team(name='Falcons'), Team(name='Hawks')
+        db.session.add_all([home, away])
+        db.session.flush()
+        coach = User.query.filter_by(username='testcoach').first()
+        player = User.query.filter_by(username='testplayer').first()
+        admin = User.query.filter_by(username='testadmin').first()
+        db.session.add_all([TeamMember(team_id=home.id, user_id=coach.id, role='coach'),
+                            TeamMember(team_id=home.id, user_id=player.id, role='player'),
+                            TeamMember(team_id=away.id, user_id=admin.id, role='player')])
+        # The game is inside the lookahead and queued right away; the practice is not yet
+        game = Game(team_id=home.id, opponent_team_id=away.id, title='Falcons vs Hawks',
+                    opponent='Hawks', date=datetime(2024, 9, 3).date(), time=time(18))
+        practice = Practice(team_id=home.id, title='Practice', date=datetime(2024, 9, 4).date(),
+                            time=time(16))
+        db.session.add_all([game, practice])
+        db.session.commit()
+        assert Reminder.query.count() == 2
+
+        with mail.record_messages() as outbox:
+            sent, wait = reminder_scheduler.run_once()
+            assert (sent, wait) == (0, 10.0)
+            assert Reminder.query.filter_by(kind='practice').count() == 0
+
+            # Due: the game goes out, and the practice entered the lookahead
+            clock.now = datetime(2024, 9, 2, 18, 0)
+            assert reminder_scheduler.run_once()[0] == 2
+            assert Reminder.query.filter_by(kind='practice').count() == 1
+            assert sorted(m.recipients[0] for m in outbox) == \
+                ['admin@test.com', 'coach@test.com', 'player@test.com']
+            assert all(m.subject.endswith('Game Reminder: Falcons vs Hawks') for m in outbox)
+            assert reminder_scheduler.run_once()[0] == 0
+            assert len(outbox) == 3
+
+        # Moving the practice moves its pending reminder
+        practice.time = time(17)
+        db.session.commit()
+        assert Reminder.query.filter_by(kind='practice').one().due_at == datetime(2024, 9, 3, 17)
+        assert reminder_scheduler.overdue_seconds() == 0
+
+def test_reminder_lease_has_one_leader(app, monkeypatch):
+    """Test that a second scheduler only dispatches once the leader's lease lapses."""
+    clock = FakeClock(datetime(2024, 9, 2, 12, 0))
+    monkeypatch.setattr(reminder_scheduler, 'clock', clock)
+    standby = ReminderScheduler(clock=clock)
+    standby.init_app(app)
+    with app.app_context():
+        assert reminder_scheduler.acquire_lease()
+        assert not standby.acquire_lease()
+        assert standby.run_once() == (0, 10.0)
+
+        clock.now += timedelta(seconds=20)
+        assert reminder_scheduler.acquire_lease()
+        clock.now += timedelta(seconds=31)
+        assert standby.acquire_lease()
+        assert not reminder_scheduler.acquire_lease()
+
+def test_postponed_event_is_reminded_again(app, monkeypatch):
+    """Test that moving an event whose reminder went out queues one for the new time."""
+    clock = FakeClock(datetime(2024, 9, 2, 18, 0))
+    monkeypatch.setattr(reminder_scheduler, 'clock', clock)
+    monkeypatch.setitem(app.config, 'MAIL_USERNAME', 'club@test.com')
+    with app.app_context():
+        team = Team(name='Falcons')
+        db.session.add(team)
+        db.session.flush()
+        player = User.query.filter_by(username='testplayer').first()
+        db.session.add(TeamMember(team_id=team.id, user_id=player.id, role='player'))
+        game = Game(team_id=team.id, title='Falcons vs Hawks', opponent='Hawks',
+                    date=datetime(2024, 9, 3).date(), time=time(18))
+        db.session.add(game)
+        db.session.commit()
+        assert reminder_scheduler.run_once()[0] == 1
+
+        game.date, game.time = datetime(2024, 9, 4).date(), time(12)
+        db.session.commit()
+        reminder = Reminder.query.filter_by(event_id=game.id).one()
+        assert (reminder.status, reminder.due_at) == ('pending', datetime(2024, 9, 3, 12))
+
+        clock.now = datetime(2024, 9, 3, 12, 0)
+        with mail.record_messages() as outbox:
+            assert reminder_scheduler.run_once()[0] == 1
+            assert [m.recipients[0] for m in outbox] == ['player@test.com']
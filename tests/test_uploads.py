@@ -0,0 +1,120 @@
+import hashlib
+import os
+import pytest
+from app.uploads.models import Upload
+
+@pytest.fixture
+def uploads_dir(app, tmp_path):
+    app.config['ATTACHMENT_FOLDER'] = str(tmp_path)
+    return tmp_path
+
+def start_upload(client, filename, length):
+    return client.post('/uploads/', headers={
+        'Upload-Filename': filename,
+        'Upload-Length': str(length)
+    })
+
+def test_resumable_upload(client, auth, app, uploads_dir):
+    """Test a chunked upload that is resumed from the reported offset."""
+    auth.login()
+    body = b'%PDF-1.4\n' + b'x' * 100000
+
+    response = start_upload(client, 'schedule.pdf', len(body))
+    assert response.status_code == 201
+    upload_id = response.json['id']
+
+    response = client.patch(f'/uploads/{upload_id}', data=body[:40000],
+                            headers={'Upload-Offset': '0'})
+    assert response.json['offset'] == 40000
+    assert not response.json['complete']
+
+    # A stale offset is rejected; the client asks where to resume
+    response = client.patch(f'/uploads/{upload_id}', data=body,
+                            headers={'Upload-Offset': '0'})
+    assert response.status_code == 409
+    offset = client.head(f'/uploads/{upload_id}').headers['Upload-Offset']
+    assert offset == '40000'
+
+    response = client.patch(f'/uploads/{upload_id}', data=body[40000:],
+                            headers={'Upload-Offset': offset})
+    assert response.json['complete']
+    assert response.json['content_type'] == 'application/pdf'
+    assert response.json['sha256'] == hashlib.sha256(body).hexdigest()
+
+    response = client.get(f'/uploads/{upload_id}/file')
+    assert response.data == body
+
+    app.config['USE_X_ACCEL_REDIRECT'] = True
+    response = client.get(f'/uploads/{upload_id}/file')
+    assert response.headers['X-Accel-Redirect'].startswith('/protected-uploads/')
+    assert response.data == b''
+
+def test_upload_rejected_by_magic_bytes(client, auth, app, uploads_dir):
+    """Test that uploads whose contents do not match their type are aborted."""
+    auth.login()
+    body = b'MZ\x90\x00' + b'\x00' * 1000
+
+    upload_id = start_upload(client, 'notes.pdf', len(body)).json['id']
+    response = client.patch(f'/uploads/{upload_id}', data=body,
+                            headers={'Upload-Offset': '0'})
+    assert response.status_code == 415
+
+    with app.app_context():
+        assert Upload.query.get(upload_id) is None
+
+def test_upload_extension_not_allowed(client, auth, uploads_dir):
+    """Test that disallowed extensions are refused before any body is sent."""
+    auth.login()
+    assert start_upload(client, 'script.exe', 100).status_code == 415
+
+def test_download_is_limited_to_the_uploader(client, auth, uploads_dir):
+    """Test that other users cannot fetch an upload by its id."""
+    auth.login()
+    body = b'%PDF-1.4\n' + b'x' * 100
+    upload_id = start_upload(client, 'roster.pdf', len(body)).json['id']
+    client.patch(f'/uploads/{upload_id}', data=body, headers={'Upload-Offset': '0'})
+    assert client.get(f'/uploads/{upload_id}/file').status_code == 200
+    auth.logout()
+
+    auth.login(email='player@test.com')
+    assert client.get(f'/uploads/{upload_id}/file').status_code == 404
+
+def test_concurrent_patch_is_refused(client, auth, app, uploads_dir):
+    """Test that a PATCH at an offset another request is writing gets a 409."""
+    from datetime import datetime, timedelta
+    from app import db
+    auth.login()
+    body = b'%PDF-1.4\n' + b'x' * 100
+    upload_id = start_upload(client, 'minutes.pdf', len(body)).json['id']
+    with app.app_context():
+        db.session.get(Upload, upload_id).locked_at = datetime.utcnow()
+        db.session.commit()
+    response = client.patch(f'/uploads/{upload_id}', data=body, headers={'Upload-Offset': '0'})
+    assert response.status_code == 409
+
+    # A lock left by a request that died does not block the upload for good
+    with app.app_context():
+        db.session.get(Upload, upload_id).locked_at = \
+            datetime.utcnow() - timedelta(seconds=app.config['UPLOAD_LOCK_TIMEOUT'] + 1)
+        db.session.commit()
+    response = client.patch(f'/uploads/{upload_id}', data=body, headers={'Upload-Offset': '0'})
+    assert response.json['complete']
+
+def test_stale_partial_uploads_are_purged(client, auth, app, uploads_dir):
+    """Test that unfinished uploads expire with their partial files."""
+    from datetime import datetime, timedelta
+    from app import db
+    from app.uploads.storage import partial_path, purge_stale_uploads
+    auth.login()
+    body = b'%PDF-1.4\n' + b'x' * 100
+    ids = [start_upload(client, f'draft{i}.pdf', len(body)).json['id'] for i in range(2)]
+    for upload_id in ids:
+        client.patch(f'/uploads/{upload_id}', data=body[:50], headers={'Upload-Offset': '0'})
+    with app.app_context():
+        db.session.get(Upload, ids[0]).created_at = \
+            datetime.utcnow() - timedelta(seconds=app.config['UPLOAD_EXPIRY'] + 1)
+        db.session.commit()
+        assert purge_stale_uploads() == 1
+        assert db.session.get(Upload, ids[0]) is None
+        assert db.session.get(Upload, ids[1]) is not None
+        assert [os.path.exists(partial_path(upload_id)) for upload_id in ids] == [False, True]
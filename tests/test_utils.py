@@ -1,13 +1,15 @@
 import pytest
 from flask import current_app
+from app import db
 from app.utils.email import send_email, send_password_reset_email
+from app.utils.mail_queue import mail_queue, OutboundEmail
 from app.auth.models import User, Role
 from unittest.mock import patch
 
 def test_send_email(app):
     """Test the send_email function."""
     with app.app_context():
-        with patch('flask_mail.Mail.send') as mock_send:
+        with patch('flask_mail.Connection.send') as mock_send:
             send_email(
                 subject='Test Subject',
                 sender='test@example.com',
@@ -15,6 +17,7 @@ def test_send_email(app):
                 text_body='Test body',
                 html_body='<p>Test body</p>'
             )
+            db.session.commit()
             
             # Verify that send was called
             assert mock_send.called
@@ -43,7 +46,7 @@ def test_send_password_reset_email(app):
         )
         user.password = 'password123'
         
-        with patch('flask_mail.Mail.send') as mock_send:
+        with patch('flask_mail.Connection.send') as mock_send:
             # Generate a test token
             token = 'test-token'
             
@@ -98,25 +101,87 @@ def test_email_templates_exist(app, template_name):
         assert len(rendered) > 0
         assert token in rendered
 
-def test_async_email_sending(app):
-    """Test asynchronous email sending."""
+def test_queued_email_sending(app):
+    """Test that email is queued per recipient and delivered by the queue."""
     with app.app_context():
-        with patch('threading.Thread.start') as mock_start:
+        with patch.object(mail_queue, 'eager', False), patch.object(mail_queue, 'workers', 0):
             send_email(
-                subject='Async Test',
+                subject='Queue Test',
                 sender='test@example.com',
-                recipients=['async@example.com'],
-                text_body='Async test',
-                html_body='<p>Async test</p>'
+                recipients=['one@example.com', 'two@example.com'],
+                text_body='Queue test',
+                html_body='<p>Queue test</p>'
             )
-            
-            # Verify that a thread was started
-            assert mock_start.called
+            assert mail_queue.depth() == 2
+
+            with patch('flask_mail.Connection.send') as mock_send:
+                assert mail_queue.drain() == 2
+
+            # Each recipient gets an individual message
+            assert mock_send.call_count == 2
+            assert [call[0][0].recipients for call in mock_send.call_args_list] == \
+                [['one@example.com'], ['two@example.com']]
+            assert mail_queue.depth() == 0
+
+def test_queued_email_waits_for_the_callers_commit(app):
+    """Test that queued email is part of the caller's transaction."""
+    with app.app_context():
+        with patch('flask_mail.Connection.send') as mock_send:
+            send_email(subject='Rolled back', sender='test@example.com',
+                       recipients=['gone@example.com'],
+                       text_body='Gone', html_body='<p>Gone</p>')
+            db.session.rollback()
+            assert not mock_send.called
+            assert OutboundEmail.query.count() == 0
+
+            send_email(subject='Committed', sender='test@example.com',
+                       recipients=['kept@example.com'],
+                       text_body='Kept', html_body='<p>Kept</p>')
+            assert not mock_send.called
+            db.session.commit()
+            assert mock_send.call_count == 1
+        assert OutboundEmail.query.one().status == 'sent'
+
+def test_settled_email_is_purged_after_retention(app):
+    """Test that old sent and failed email is deleted, and pending email kept."""
+    from datetime import datetime, timedelta
+    old = datetime.utcnow() - timedelta(days=app.config['MAIL_RETENTION_DAYS'] + 1)
+    with app.app_context():
+        db.session.add_all([
+            OutboundEmail(subject='s', recipient='sent@example.com', status='sent', created_at=old),
+            OutboundEmail(subject='s', recipient='failed@example.com', status='failed', created_at=old),
+            OutboundEmail(subject='s', recipient='queued@example.com', status='queued', created_at=old),
+            OutboundEmail(subject='s', recipient='recent@example.com', status='sent'),
+        ])
+        db.session.commit()
+
+        assert mail_queue.purge() == 2
+        assert sorted(e.recipient for e in OutboundEmail.query) == \
+            ['queued@example.com', 'recent@example.com']
+
+def test_send_rate_is_shared_between_workers(app):
+    """Test that batches claimed by different workers get consecutive send slots."""
+    from datetime import timedelta
+    from app.utils.mail_queue import MailThrottle
+    with app.app_context():
+        with patch.object(mail_queue, 'eager', False), patch.object(mail_queue, 'workers', 0), \
+                patch.object(mail_queue, 'batch_size', 2), \
+                patch.object(mail_queue, 'send_interval', timedelta(seconds=0.1)):
+            send_email(subject='Rate', sender='test@example.com',
+                       recipients=[f'r{i}@example.com' for i in range(4)],
+                       text_body='Rate', html_body='<p>Rate</p>')
+            # The schedule lives in the database, so these could be two processes
+            first, first_slot = mail_queue._claim_batch()
+            second, second_slot = mail_queue._claim_batch()
+            assert len(first) == len(second) == 2
+            assert second_slot >= first_slot + timedelta(seconds=0.2)
+            assert db.session.get(MailThrottle, 'smtp').next_send_at == \
+                second_slot + timedelta(seconds=0.2)
 
 def test_email_error_handling(app):
     """Test email error handling."""
     with app.app_context():
-        with patch('flask_mail.Mail.send', side_effect=Exception('Test error')):
+        with patch('flask_mail.Connection.send', side_effect=Exception('Test error')):
             # The email function should not raise an exception
             # even if sending fails
             send_email(
@@ -126,11 +191,18 @@ def test_email_error_handling(app):
                 text_body='Error test',
                 html_body='<p>Error test</p>'
             )
+            db.session.commit()
+
+        # The message is kept for a later retry
+        queued = OutboundEmail.query.filter_by(recipient='error@example.com').one()
+        assert queued.status == 'queued'
+        assert queued.attempts == 1
+        assert queued.next_attempt_at > queued.created_at
 
 def test_email_content_security(app):
     """Test email content security measures."""
     with app.app_context():
-        with patch('flask_mail.Mail.send') as mock_send:
+        with patch('flask_mail.Connection.send') as mock_send:
             # Test with potentially malicious content
             malicious_content = '<script>alert("xss")</script>'
             
@@ -141,6 +213,7 @@ def test_email_content_security(app):
                 text_body='Security test',
                 html_body=f'<p>{malicious_content}</p>'
             )
+            db.session.commit()
             
             msg = mock_send.call_args[0][0]
             
@@ -151,7 +224,7 @@ def test_email_content_security(app):
 def test_email_rate_limiting(app):
     """Test email rate limiting if implemented."""
     with app.app_context():
-        with patch('flask_mail.Mail.send') as mock_send:
+        with patch('flask_mail.Connection.send') as mock_send:
             # Send multiple emails in quick succession
             for i in range(10):
                 send_email(
@@ -161,6 +234,7 @@ def test_email_rate_limiting(app):
                     text_body=f'Rate test {i}',
                     html_body=f'<p>Rate test {i}</p>'
                 )
+            db.session.commit()
             
             # Verify that all emails were queued
             assert mock_send.call_count == 10
@@ -189,3 +263,196 @@ def test_email_template_inheritance(app):
         assert 'style' in rendered.lower()
         assert 'font-family' in rendered.lower()
         assert 'color' in rendered.lower()
+
+def test_bulk_email_personalized(app):
+    """Test that bulk email renders once and personalizes each copy."""
+    from types import SimpleNamespace
+    from datetime import datetime
+    from app.utils.email import send_announcement_email
+
+    announcement = SimpleNamespace(
+        title='Tournament Update',
+        content='Pool play starts at 9am.',
+        author=SimpleNamespace(get_full_name=lambda: 'Test Coach'),
+        created_at=datetime.utcnow()
+    )
+    recipients = [
+        SimpleNamespace(first_name='Ann', email='ann@example.com'),
+        SimpleNamespace(first_name='<Bo>', email='bo@example.com')
+    ]
+
+    with app.test_request_context():
+        with patch('flask_mail.Connection.send') as mock_send:
+            send_announcement_email(announcement, recipients)
+            db.session.commit()
+
+        messages = [call[0][0] for call in mock_send.call_args_list]
+        assert [msg.recipients for msg in messages] == [['ann@example.com'], ['bo@example.com']]
+        assert 'Dear Ann,' in messages[0].body
+        assert 'Dear <Bo>,' in messages[1].body
+        assert 'Dear &lt;Bo&gt;,' in messages[1].html
+        assert 'Pool play starts at 9am.' in messages[1].html
+
+def test_profile_picture_pipeline(app, tmp_path):
+    """Test that uploads are resized into content-addressed files and deduplicated."""
+    import io
+    from PIL import Image
+    from werkzeug.datastructures import FileStorage
+    from app.utils.images import image_pipeline
+
+    def upload():
+        data = io.BytesIO()
+        Image.new('RGBA', (1200, 800), (255, 0, 0, 128)).save(data, 'PNG')
+        data.seek(0)
+        return FileStorage(data, filename='picture.png')
+
+    with app.app_context():
+        user = User.query.filter_by(email='player@test.com').first()
+        with patch.object(image_pipeline, 'output_folder', str(tmp_path)):
+            image_pipeline.submit(user.id, upload())
+            files = sorted(path.name for path in tmp_path.iterdir())
+            image_pipeline.submit(user.id, upload())
+
+        digest = user.profile_image.split('-')[0]
+        assert user.profile_image == f'{digest}-150.jpg'
+        assert files == sorted(f'{digest}-{size}.{fmt}'
+                               for size in (40, 150, 300) for fmt in ('jpg', 'webp'))
+        assert sorted(path.name for path in tmp_path.iterdir()) == files
+        with Image.open(tmp_path / f'{digest}-300.webp') as image:
+            assert image.size == (300, 200)
+
+def test_query_profiler_flags_repeated_queries(app, client):
+    """Test that profiled responses carry query headers and N+1 loops are detected."""
+    from app import db
+    from app.team.models import Team
+    from app.utils.profiling import query_profiler, normalize_statement
+
+    @app.route('/test-teams')
+    def list_team_sizes():
+        # Lazy-loads the members of every team, one query each
+        return {team.name: len(team.members) for team in Team.query.all()}
+
+    with app.app_context():
+        db.session.add_all([Team(name=f'Team {n}') for n in range(6)])
+        db.session.commit()
+
+    profiles = []
+    query_profiler.enabled = True
+    try:
+        with query_profiler.observe(profiles.append):
+            response = client.get('/test-teams')
+    finally:
+        query_profiler.enabled = False
+    assert response.headers['X-Query-Count'] == '7'
+    assert response.headers['X-Query-Repeated'] == '1'
+    [(statement, count, _)] = profiles[0].repeated(query_profiler.repeat_threshold)
+    assert count == 6 and 'team_members' in statement
+
+    assert normalize_statement('SELECT * FROM t WHERE id IN (?, ?,\n ?)') == \
+        normalize_statement('SELECT * FROM t WHERE id IN (?)')
+    assert 'X-Query-Count' not in client.get('/test-teams').headers
+
+def test_database_engine_options(app):
+    """Test pool settings per database and the PgBouncer mode."""
+    from sqlalchemy.pool import NullPool
+    from app.utils.database import InstrumentedQueuePool, engine_options, statement_timeout
+
+    settings = dict(app.config, SQLALCHEMY_DATABASE_URI='postgresql://db/volleyball',
+                    DB_POOL_SIZE=6, DB_PGBOUNCER=False)
+    options = engine_options(settings)
+    assert options['poolclass'] is InstrumentedQueuePool
+    assert options['pool_size'] == 6 and options['pool_pre_ping']
+    assert options['pool_recycle'] == app.config['DB_POOL_RECYCLE']
+
+    settings.update(DB_PGBOUNCER=True, SQLALCHEMY_DATABASE_URI='postgresql+psycopg://db/volleyball')
+    options = engine_options(settings)
+    assert options['poolclass'] is NullPool
+    assert options['connect_args'] == {'prepare_threshold': None}
+    assert engine_options(dict(settings, SQLALCHEMY_DATABASE_URI='sqlite://')) == {}
+
+    @app.route('/test-slow-report')
+    @statement_timeout(120)
+    def slow_report():
+        from flask import g
+        return {'timeout': g.statement_timeout}
+
+    assert app.test_client().get('/test-slow-report').json == {'timeout': 120}
+
+def test_statement_timeout_covers_earlier_transactions(app, monkeypatch):
+    """Test that a view's timeout is in place before an outer decorator queries."""
+    from functools import wraps
+    from flask import g
+    from sqlalchemy import text
+    from app.utils.database import statement_timeout, statement_timeouts
+
+    begun = []
+    monkeypatch.setattr(statement_timeouts, 'apply',
+                        lambda connection: begun.append(g.get('statement_timeout')))
+
+    def loads_user(f):
+        # Like login_required, which loads the user before the view runs
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            db.session.execute(text('SELECT 1'))
+            return f(*args, **kwargs)
+        return decorated
+
+    @app.route('/test-slow-export')
+    @loads_user
+    @statement_timeout(120)
+    def slow_export():
+        db.session.execute(text('SELECT 1'))
+        return ''
+
+    assert app.test_client().get('/test-slow-export').status_code == 200
+    assert begun == [120]
+
+def test_read_replica_routing(app, client, tmp_path, monkeypatch):
+    """Test that read-only views read from a replica unless the user just wrote or it lags."""
+    from sqlalchemy import create_engine
+    from app import db
+    from app.broadcast.models import ReactionCount
+    from app.utils.database import ReplicaRouter, replicas
+
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    with app.app_context():
+        db.metadata.create_all(replica)
+        with replica.begin() as connection:
+            connection.execute(ReactionCount.__table__.insert(),
+                               {'match_id': 1, 'reaction': 'like', 'count': 7})
+        db.session.add(ReactionCount(match_id=1, reaction='like', count=3))
+        db.session.commit()
+
+    @app.route('/test-reactions')
+    def reactions_from_primary():
+        return {'like': ReactionCount.query.filter_by(match_id=1).one().count}
+
+    @app.route('/test-write', methods=['POST'])
+    def write():
+        return '', 204
+
+    monkeypatch.setattr(replicas, 'engines', [replica])
+    monkeypatch.setattr(replicas, '_lags', {})
+    assert client.get('/broadcast/1/reactions').json['like'] == 7
+    assert client.get('/test-reactions').json['like'] == 3
+
+    client.post('/test-write')
+    assert client.get('/broadcast/1/reactions').json['like'] == 3
+    with client.session_transaction() as session:
+        session['_primary_until'] = 0
+    assert client.get('/broadcast/1/reactions').json['like'] == 7
+
+    monkeypatch.setattr(replicas, '_lags', {})
+    monkeypatch.setattr(ReplicaRouter, '_query_lag', lambda self, engine: 60.0)
+    assert client.get('/broadcast/1/reactions').json['like'] == 3
+
+def test_lazy_module_imports_on_first_use():
+    """Test that a LazyModule only imports its module when an attribute is used."""
+    import sys
+    from app.utils.lazy import LazyModule
+
+    sys.modules.pop('colorsys', None)
+    colorsys = LazyModule('colorsys')
+    assert 'colorsys' not in sys.modules
+    assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert 'colorsys' in sys.modules